@@ -23,7 +23,6 @@ PyInstaller.__main__.run([
     '--hidden-import=pynput.keyboard._win32',
     '--hidden-import=pynput.mouse._win32',
     '--hidden-import=keyboard',
-    '--hidden-import=pyautogui',
     '--hidden-import=PIL',
     '--hidden-import=PIL._tkinter_finder',
     '--hidden-import=inputs',
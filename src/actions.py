@@ -1,72 +1,111 @@
-import keyboard
+import logging
 import platform
-import sys
-
-# Try to import pyautogui, but don't crash if no display is found (headless/linux test env)
-try:
-    import pyautogui
-except (ImportError, KeyError):
-    pyautogui = None
+import threading
+from . import tracing
+from .command_pool import CommandPool, DEFAULT_TIMEOUT
+from .injector import (
+    Injector, tap, combo, wheel,
+    VK_TAB, VK_CONTROL, VK_MENU, VK_RIGHT, VK_L, VK_LWIN,
+    VK_VOLUME_DOWN, VK_VOLUME_UP, VK_MEDIA_NEXT_TRACK, VK_MEDIA_PREV_TRACK, VK_MEDIA_PLAY_PAUSE,
+)
+
+logger = logging.getLogger(__name__)
+
+# Input events injected for each built-in action, submitted as one batch
+ACTION_EVENTS = {
+    "Play / Pause": tap(VK_MEDIA_PLAY_PAUSE),
+    "Scroll Down": wheel(-500),
+    # Quick Alt-Tab
+    "Alt + Tab": combo(VK_MENU, VK_TAB),
+    # Windows: Ctrl + Win + Right switches to the next virtual desktop
+    "Switch Desktop": combo(VK_CONTROL, VK_LWIN, VK_RIGHT),
+    "Volume Up": tap(VK_VOLUME_UP),
+    "Volume Down": tap(VK_VOLUME_DOWN),
+    "Next Track": tap(VK_MEDIA_NEXT_TRACK),
+    "Previous Track": tap(VK_MEDIA_PREV_TRACK),
+    # Windows + L
+    "Lock Screen": combo(VK_LWIN, VK_L),
+}
+
+# User-defined commands (see "commands" in config.json) show up as "Run: <name>"
+COMMAND_PREFIX = "Run: "
+
+# Actions that can repeat while the button is held, and how far one repeat scrolls
+REPEATABLE_ACTIONS = {"Scroll Down", "Volume Up", "Volume Down"}
+SCROLL_REPEAT_STEP = -120
 
 class ActionManager:
-    def __init__(self):
+    def __init__(self, injector=None):
         self.os_type = platform.system()
+        self.injector = injector or Injector()
+        self._warm = threading.Event()
+
+        # External commands, run on warm shells that are only started once needed
+        self.commands = {}
+        self.command_pool = CommandPool()
+
+    def configure_commands(self, commands):
+        # commands: {name: {"command": str, "timeout": seconds}}
+        self.commands = dict(commands)
+        if self.commands and self._warm.is_set():
+            self.command_pool.start()
+
+    def warm_up(self):
+        # Load the injection backend and pre-build every action's batch off the
+        # gesture path, so the first action doesn't pay for it.
+        threading.Thread(target=self._prepare_all, daemon=True).start()
+
+    def shutdown(self):
+        self.command_pool.stop()
+
+    def _prepare_all(self):
+        for action_name, events in ACTION_EVENTS.items():
+            self.injector.prepare(action_name, events)
+        self._warm.set()
+        if self.commands:
+            self.command_pool.start()
 
     def execute(self, action_name):
-        print(f"Executing action: {action_name}")
-
-        if pyautogui is None:
-            print("Warning: pyautogui not available (headless environment?)")
-
-        if action_name == "Play / Pause":
-            if pyautogui: pyautogui.press("playpause")
-
-        elif action_name == "Scroll Down":
-            # Scroll down
-            if pyautogui: pyautogui.scroll(-500)
-
-        elif action_name == "Alt + Tab":
-            # Quick Alt-Tab
-            with keyboard.pressed('alt'):
-                keyboard.press_and_release('tab')
-
-        elif action_name == "Switch Desktop":
-            # Windows: Ctrl + Win + Left/Right
-            # For this, let's toggle to the right
-            keyboard.send('ctrl+windows+right')
-
-        elif action_name == "Volume Up":
-            if pyautogui: pyautogui.press("volumeup")
-
-        elif action_name == "Volume Down":
-            if pyautogui: pyautogui.press("volumedown")
-
-        elif action_name == "Next Track":
-            if pyautogui: pyautogui.press("nexttrack")
-
-        elif action_name == "Previous Track":
-            if pyautogui: pyautogui.press("prevtrack")
-
-        elif action_name == "Lock Screen":
-            # Windows + L
-            keyboard.send('windows+l')
-
-        elif action_name == "None":
-            pass
-
+        with tracing.span("action.execute"):
+            logger.info("Executing action: %s", action_name)
+            with tracing.span("action.inject"):
+                self._inject(action_name)
+
+    def execute_repeat(self, action_name, count):
+        # One batch of `count` repeats, submitted in a single injection
+        with tracing.span("action.repeat"):
+            if action_name == "Scroll Down":
+                self.injector.send(wheel(SCROLL_REPEAT_STEP * count))
+            elif action_name in REPEATABLE_ACTIONS:
+                self.injector.send(ACTION_EVENTS[action_name] * count)
+
+    def is_repeatable(self, action_name):
+        return action_name in REPEATABLE_ACTIONS
+
+    def _inject(self, action_name):
+        if action_name == "None":
+            return
+
+        if action_name.startswith(COMMAND_PREFIX):
+            self._run_command(action_name[len(COMMAND_PREFIX):])
+            return
+
+        events = ACTION_EVENTS.get(action_name)
+        if events is None:
+            logger.warning("Unknown action: %s", action_name)
+            return
+
+        if self._warm.is_set():
+            self.injector.send_prepared(action_name)
         else:
-            print(f"Unknown action: {action_name}")
+            self.injector.send(events)
+
+    def _run_command(self, name):
+        spec = self.commands.get(name)
+        if not spec or not spec.get("command"):
+            logger.warning("Unknown command: %s", name)
+            return
+        self.command_pool.submit(name, spec["command"], spec.get("timeout", DEFAULT_TIMEOUT))
 
     def get_available_actions(self):
-        return [
-            "None",
-            "Play / Pause",
-            "Scroll Down",
-            "Alt + Tab",
-            "Switch Desktop",
-            "Volume Up",
-            "Volume Down",
-            "Next Track",
-            "Previous Track",
-            "Lock Screen"
-        ]
+        return ["None"] + list(ACTION_EVENTS) + [COMMAND_PREFIX + name for name in self.commands]
@@ -0,0 +1,179 @@
+import math
+
+# Safe bounds for the learned thresholds (seconds). The estimator may move the
+# windows around to fit the user, but never outside of these.
+MIN_MULTI_TAP_WINDOW = 0.2
+MAX_MULTI_TAP_WINDOW = 0.7
+MIN_LONG_PRESS_THRESHOLD = 0.3
+MAX_LONG_PRESS_THRESHOLD = 1.0
+
+# Samples required before a sketch is trusted to move a threshold
+MIN_SAMPLES = 20
+
+# Headroom added on top of the observed inter-tap quantile
+TAP_WINDOW_MARGIN = 1.25
+# Gaps this far past the current window still count as near-miss multi-taps
+# (seconds); anything later is taken for separate single taps
+NEAR_MISS_MARGIN = 0.08
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate using the P-square algorithm (Jain & Chlamtac).
+    Keeps five markers, so memory and per-sample cost are constant.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self._initial = []
+        self._q = []
+        self._n = []
+        self._desired = []
+        self._increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def add(self, x):
+        self.count += 1
+
+        if self._initial is not None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self._q = sorted(self._initial)
+                self._n = [1, 2, 3, 4, 5]
+                p = self.p
+                self._desired = [1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]
+                self._initial = None
+            return
+
+        q, n = self._q, self._n
+
+        # Find the cell x falls into, extending the extremes if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Nudge the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if q[i - 1] < candidate < q[i + 1]:
+                    q[i] = candidate
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self._q, self._n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        if self.count == 0:
+            return None
+        if self._initial is not None:
+            # Not enough samples for the markers yet, use the exact quantile
+            ordered = sorted(self._initial)
+            index = min(len(ordered) - 1, max(0, math.ceil(self.p * len(ordered)) - 1))
+            return ordered[index]
+        return self._q[2]
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class AdaptiveTiming:
+    """
+    Learns the user's multi-tap window and long press threshold from observed
+    inter-tap gaps and hold durations.
+    """
+
+    def __init__(self, multi_tap_window, long_press_threshold):
+        self.multi_tap_window = multi_tap_window
+        self.long_press_threshold = long_press_threshold
+
+        self.tap_gaps = P2Quantile(0.95)
+        self.tap_holds = P2Quantile(0.95)
+        self.long_holds = P2Quantile(0.10)
+
+    @classmethod
+    def from_dict(cls, data, multi_tap_window, long_press_threshold):
+        # Stored values are re-clamped so a hand-edited config can't break gestures
+        if isinstance(data, dict):
+            window = data.get("multi_tap_window")
+            if isinstance(window, (int, float)):
+                multi_tap_window = _clamp(window, MIN_MULTI_TAP_WINDOW, MAX_MULTI_TAP_WINDOW)
+            threshold = data.get("long_press_threshold")
+            if isinstance(threshold, (int, float)):
+                long_press_threshold = _clamp(threshold, MIN_LONG_PRESS_THRESHOLD, MAX_LONG_PRESS_THRESHOLD)
+        return cls(multi_tap_window, long_press_threshold)
+
+    def to_dict(self):
+        return {
+            "multi_tap_window": round(self.multi_tap_window, 3),
+            "long_press_threshold": round(self.long_press_threshold, 3),
+        }
+
+    def observe_gap(self, gap):
+        """
+        Records the time between releasing a tap and pressing again. Only
+        gaps that made a multi-tap, or just missed the current window, are
+        learned from: a later press is most likely a new single tap, and
+        learning from those would grow the window towards the user's tap rate.
+        Near misses still let the window stretch for slow tappers.
+        Returns True if the multi-tap window changed.
+        """
+        if gap < 0 or gap > min(self.multi_tap_window + NEAR_MISS_MARGIN, MAX_MULTI_TAP_WINDOW):
+            return False
+        self.tap_gaps.add(gap)
+        if self.tap_gaps.count < MIN_SAMPLES:
+            return False
+
+        window = _clamp(self.tap_gaps.value() * TAP_WINDOW_MARGIN, MIN_MULTI_TAP_WINDOW, MAX_MULTI_TAP_WINDOW)
+        changed = abs(window - self.multi_tap_window) >= 0.005
+        self.multi_tap_window = window
+        return changed
+
+    def observe_hold(self, duration, was_long_press):
+        """
+        Records how long a press was held. The threshold sits halfway between
+        slow taps and quick long presses once both have been seen, otherwise
+        it keeps a wide margin above the user's taps.
+        Returns True if the long press threshold changed.
+        """
+        if duration < 0:
+            return False
+        if was_long_press:
+            self.long_holds.add(duration)
+        else:
+            self.tap_holds.add(duration)
+
+        if self.tap_holds.count < MIN_SAMPLES:
+            return False
+
+        tap_edge = self.tap_holds.value()
+        if self.long_holds.count >= MIN_SAMPLES:
+            threshold = (tap_edge + self.long_holds.value()) / 2
+        else:
+            threshold = tap_edge * 2
+
+        threshold = _clamp(threshold, MIN_LONG_PRESS_THRESHOLD, MAX_LONG_PRESS_THRESHOLD)
+        changed = abs(threshold - self.long_press_threshold) >= 0.005
+        self.long_press_threshold = threshold
+        return changed
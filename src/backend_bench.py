@@ -0,0 +1,329 @@
+"""
+Compares the ways this app captures input: the `keyboard` hooks the gesture
+engine uses, pynput listeners (the input debugger) and the Raw Input monitor.
+Each backend gets the same synthetic key stream and is scored on delivery
+latency, jitter, missed events and CPU per 1k events:
+
+    python -m src.backend_bench [--events 2000] [--rate 1000] [--json]
+
+On Windows the events are injected with SendInput and go through the real
+hooks. Elsewhere there is nothing to hook, so stand-ins replay each backend's
+thread hand-offs; those numbers only compare the Python-side dispatch.
+"""
+import argparse
+import json
+import platform
+import queue
+import statistics
+import threading
+import time
+
+# Keys the generator cycles through. F13-F20 exist on every keyboard layout
+# but are bound to nothing by default, so the benchmark doesn't type anything.
+KEYS = {"f13": 0x7C, "f14": 0x7D, "f15": 0x7E, "f16": 0x7F, "f17": 0x80, "f18": 0x81, "f19": 0x82, "f20": 0x83}
+_KEY_BY_VK = {vk: name for name, vk in KEYS.items()}
+
+DEFAULT_EVENTS = 2000
+DEFAULT_RATE = 1000.0
+# How long to wait for stragglers after the last event is sent (seconds)
+SETTLE = 0.5
+
+
+class CaptureBackend:
+    """
+    Common interface: start() begins delivering `on_event(key, is_down)` for
+    the benchmark keys, send() injects one event through the same path real
+    input takes.
+    """
+
+    name = "backend"
+
+    def start(self, on_event):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+    def send(self, key, is_down):
+        raise NotImplementedError
+
+
+class _SendInputMixin:
+    _injector = None
+
+    def send(self, key, is_down):
+        from .injector import Injector, SendInputBackend, KEY
+        if self._injector is None:
+            self._injector = Injector(SendInputBackend())
+        self._injector.send([(KEY, KEYS[key], not is_down)])
+
+
+class KeyboardHookBackend(_SendInputMixin, CaptureBackend):
+    """The `keyboard` library's low-level hook, as in gesture_engine.py."""
+
+    name = "keyboard"
+
+    def start(self, on_event):
+        import keyboard
+
+        def handle(event):
+            if event.name in KEYS:
+                on_event(event.name, event.event_type == keyboard.KEY_DOWN)
+
+        self._hook = keyboard.hook(handle)
+
+    def stop(self):
+        import keyboard
+        keyboard.unhook(self._hook)
+
+
+class PynputBackend(_SendInputMixin, CaptureBackend):
+    """pynput's keyboard listener, as in the input debugger."""
+
+    name = "pynput"
+
+    def start(self, on_event):
+        import pynput
+
+        def handle(key, is_down):
+            name = getattr(key, "name", None)
+            if name in KEYS:
+                on_event(name, is_down)
+
+        self._listener = pynput.keyboard.Listener(on_press=lambda k: handle(k, True),
+                                                  on_release=lambda k: handle(k, False))
+        self._listener.start()
+        self._listener.wait()
+
+    def stop(self):
+        self._listener.stop()
+
+
+class RawInputBackend(_SendInputMixin, CaptureBackend):
+    """The Raw Input monitor's WM_INPUT message loop (win_raw_input.py)."""
+
+    name = "raw_input"
+
+    def start(self, on_event):
+        from .win_raw_input import RawInputMonitor
+
+        def handle(vk, is_down, timestamp):
+            key = _KEY_BY_VK.get(vk)
+            if key:
+                on_event(key, is_down)
+
+        self._monitor = RawInputMonitor(lambda msg: None, on_key=handle)
+        self._monitor.start()
+        # The window and its registration are created on the monitor's thread
+        time.sleep(0.2)
+
+    def stop(self):
+        self._monitor.stop()
+
+
+class StandInBackend(CaptureBackend):
+    """
+    Replays a backend's thread hand-offs without an OS hook: send() plays the
+    OS posting the event, then each hop is a thread that takes it from a queue
+    and passes it on. `translate` wraps the event in an object first, as
+    pynput does with its Key/KeyCode objects.
+    """
+
+    def __init__(self, name, hops=1, translate=False):
+        self.name = name
+        self.hops = hops
+        self.translate = translate
+        self._queues = []
+        self._threads = []
+
+    def start(self, on_event):
+        self._queues = [queue.SimpleQueue() for _ in range(self.hops)]
+        for i, q in enumerate(self._queues):
+            if i + 1 < self.hops:
+                forward = self._queues[i + 1].put
+            else:
+                forward = self._deliver(on_event)
+            thread = threading.Thread(target=self._pump, args=(q, forward), name=f"StandIn-{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+
+    def send(self, key, is_down):
+        self._queues[0].put((key, is_down))
+
+    def _deliver(self, on_event):
+        if not self.translate:
+            return lambda event: on_event(*event)
+
+        class Key:
+            __slots__ = ("name", "is_down")
+
+            def __init__(self, name, is_down):
+                self.name, self.is_down = name, is_down
+
+        def deliver(event):
+            key = Key(*event)
+            on_event(key.name, key.is_down)
+        return deliver
+
+    @staticmethod
+    def _pump(q, forward):
+        while True:
+            event = q.get()
+            if event is None:
+                return
+            forward(event)
+
+
+class NullBackend(CaptureBackend):
+    """Generator cost only: events are dropped at once. Its CPU is the baseline."""
+
+    name = "null"
+
+    def start(self, on_event):
+        pass
+
+    def send(self, key, is_down):
+        pass
+
+
+def default_backends():
+    if platform.system() == "Windows":
+        return [KeyboardHookBackend(), PynputBackend(), RawInputBackend()]
+    # The keyboard hook runs handlers on the hook thread, pynput translates
+    # first, and Raw Input arrives as a posted message on the window's thread
+    return [
+        StandInBackend("keyboard (stand-in)"),
+        StandInBackend("pynput (stand-in)", translate=True),
+        StandInBackend("raw_input (stand-in)", hops=2),
+    ]
+
+
+def run_backend(backend, events=DEFAULT_EVENTS, rate=DEFAULT_RATE, settle=SETTLE):
+    """
+    Sends `events` alternating presses and releases at `rate` per second
+    through `backend` and returns its latency, jitter, drops and CPU.
+    """
+    received = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def on_event(key, is_down):
+        now = time.perf_counter()
+        with lock:
+            received.append((key, is_down, now))
+            if len(received) >= events:
+                done.set()
+
+    keys = list(KEYS)
+    sent = []
+    backend.start(on_event)
+    try:
+        cpu = time.process_time()
+        start = time.perf_counter()
+        for i in range(events):
+            # Each key goes down then up before the generator moves on
+            key = keys[(i // 2) % len(keys)]
+            is_down = i % 2 == 0
+            wait = start + i / rate - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            sent.append((key, is_down, time.perf_counter()))
+            backend.send(key, is_down)
+        if events and not isinstance(backend, NullBackend):
+            done.wait(settle)
+        cpu = time.process_time() - cpu
+    finally:
+        backend.stop()
+
+    latencies = _match(sent, received)
+    return {
+        "backend": backend.name,
+        "sent": len(sent),
+        "received": len(latencies),
+        "drop_rate": round(1 - len(latencies) / len(sent), 4) if sent else 0.0,
+        "p50_ms": _ms(statistics.median(latencies)) if latencies else None,
+        "p99_ms": _ms(_percentile(latencies, 0.99)) if latencies else None,
+        "max_ms": _ms(max(latencies)) if latencies else None,
+        "jitter_ms": _ms(statistics.pstdev(latencies)) if len(latencies) > 1 else None,
+        "cpu_ms": cpu * 1000,
+    }
+
+
+def _match(sent, received):
+    # Pairs each delivery with the oldest unmatched send of the same key and
+    # direction; sends never matched are the drops
+    pending = {}
+    for key, is_down, t in sent:
+        pending.setdefault((key, is_down), []).append(t)
+    cursor = {k: 0 for k in pending}
+    latencies = []
+    for key, is_down, t in received:
+        times = pending.get((key, is_down))
+        if times is None or cursor[(key, is_down)] >= len(times):
+            continue
+        latencies.append(t - times[cursor[(key, is_down)]])
+        cursor[(key, is_down)] += 1
+    return latencies
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def compare(backends=None, events=DEFAULT_EVENTS, rate=DEFAULT_RATE, settle=SETTLE):
+    """Runs every backend and returns their results plus the recommended one."""
+    baseline = run_backend(NullBackend(), events, rate)["cpu_ms"]
+    results = []
+    for backend in backends or default_backends():
+        result = run_backend(backend, events, rate, settle)
+        # CPU above what generating the events costs on its own
+        result["cpu_ms_per_1k"] = round(max(0.0, result.pop("cpu_ms") - baseline) * 1000 / max(events, 1), 3)
+        results.append(result)
+    return {"results": results, "recommended": recommend(results)}
+
+
+def recommend(results):
+    # Missing input is worse than late input: fewest drops first, then the
+    # steadiest tail latency, then CPU
+    usable = [r for r in results if r["received"]]
+    if not usable:
+        return None
+    best = min(usable, key=lambda r: (r["drop_rate"], r["p99_ms"], r["cpu_ms_per_1k"]))
+    return best["backend"]
+
+
+def format_report(report):
+    columns = ("backend", "received", "drop_rate", "p50_ms", "p99_ms", "jitter_ms", "max_ms", "cpu_ms_per_1k")
+    rows = [[str(r[c]) for c in columns] for r in report["results"]]
+    widths = [max(len(c), *(len(row[i]) for row in rows)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths))]
+    lines.extend("  ".join(v.ljust(w) for v, w in zip(row, widths)) for row in rows)
+    lines.append(f"Recommended: {report['recommended']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare input capture backends.")
+    parser.add_argument("--events", type=int, default=DEFAULT_EVENTS, help="events per backend")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE, help="events per second")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = compare(events=args.events, rate=args.rate)
+    print(json.dumps(report, indent=4) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,18 @@
+import logging
 import platform
 import subprocess
 import shutil
+import threading
+import time
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+# How often the target device's connection state is re-checked when there are
+# no device change notifications to go by (seconds)
+CONNECTION_POLL_INTERVAL = 5.0
+# Device changes come in bursts; wait for them to settle before querying
+DEVICE_CHANGE_SETTLE = 0.5
 
 class BluetoothManager:
     def __init__(self):
@@ -36,21 +48,22 @@ class BluetoothManager:
 
             # Use shell=False is generally safer, but here we invoke powershell directly.
             # We are not passing user input to the command string.
-            result = subprocess.run(
-                ["powershell", "-Command", cmd],
-                capture_output=True,
-                text=True,
-                check=False
-            )
+            with tracing.span("bluetooth.powershell_query"):
+                result = subprocess.run(
+                    ["powershell", "-Command", cmd],
+                    capture_output=True,
+                    text=True,
+                    check=False
+                )
 
             if result.returncode != 0:
-                print(f"PowerShell error: {result.stderr}")
+                logger.warning("PowerShell error: %s", result.stderr)
                 return []
 
             devices = [line.strip() for line in result.stdout.split('\n') if line.strip()]
             return sorted(list(set(devices)))
         except Exception as e:
-            print(f"Error getting Bluetooth devices: {e}")
+            logger.error("Error getting Bluetooth devices: %s", e)
             return []
 
     def _check_windows_connection(self, device_name):
@@ -66,3 +79,167 @@ class BluetoothManager:
     def _check_mock_connection(self, device_name):
         # Mock logic: Always say yes for testing
         return True
+
+
+class DeviceChangeMonitor:
+    """
+    Calls `on_change` when Windows broadcasts WM_DEVICECHANGE, which happens
+    when a Bluetooth device connects or disconnects. Broadcasts only reach
+    top-level windows, so this owns a hidden one and its message loop.
+    """
+
+    WM_DEVICECHANGE = 0x0219
+    WM_CLOSE = 0x0010
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.hwnd = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """Returns False if notifications aren't available, so the caller can poll instead."""
+        if self._thread:
+            return True
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="DeviceChanges", daemon=True)
+        self._thread.start()
+        self._ready.wait(2)
+        return bool(self.hwnd)
+
+    def stop(self):
+        if self.hwnd:
+            self.user32.PostMessageW(self.hwnd, self.WM_CLOSE, 0, 0)
+        if self._thread:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def _run(self):
+        import ctypes
+        from ctypes import wintypes
+
+        self.user32 = user32 = ctypes.WinDLL("user32", use_last_error=True)
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        LRESULT = ctypes.c_ssize_t
+        WNDPROC = ctypes.WINFUNCTYPE(LRESULT, wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+        user32.DefWindowProcW.argtypes = (wintypes.HWND, wintypes.UINT, wintypes.WPARAM, wintypes.LPARAM)
+        user32.DefWindowProcW.restype = LRESULT
+        user32.CreateWindowExW.restype = wintypes.HWND
+
+        class WNDCLASS(ctypes.Structure):
+            _fields_ = [
+                ("style", wintypes.UINT), ("lpfnWndProc", WNDPROC),
+                ("cbClsExtra", ctypes.c_int), ("cbWndExtra", ctypes.c_int),
+                ("hInstance", wintypes.HINSTANCE), ("hIcon", wintypes.HICON),
+                ("hCursor", wintypes.HANDLE), ("hbrBackground", wintypes.HBRUSH),
+                ("lpszMenuName", wintypes.LPCWSTR), ("lpszClassName", wintypes.LPCWSTR),
+            ]
+
+        def wnd_proc(hwnd, msg, wparam, lparam):
+            if msg == self.WM_DEVICECHANGE:
+                self.on_change()
+                return 1
+            if msg == self.WM_CLOSE:
+                user32.DestroyWindow(hwnd)
+                user32.PostQuitMessage(0)
+                return 0
+            return user32.DefWindowProcW(hwnd, msg, wparam, lparam)
+
+        # Keep a reference for as long as the window lives
+        self._proc = WNDPROC(wnd_proc)
+        wc = WNDCLASS()
+        wc.lpfnWndProc = self._proc
+        wc.lpszClassName = "BudsDeviceChangeMonitor"
+        wc.hInstance = kernel32.GetModuleHandleW(None)
+        user32.RegisterClassW(ctypes.byref(wc))
+        # Never shown; a message-only window wouldn't receive the broadcasts
+        self.hwnd = user32.CreateWindowExW(0, wc.lpszClassName, "BudsDeviceChanges", 0,
+                                           0, 0, 0, 0, None, None, wc.hInstance, None)
+        self._ready.set()
+        if not self.hwnd:
+            logger.error("Can't create device change window (error %d)", ctypes.get_last_error())
+            return
+
+        msg = wintypes.MSG()
+        while user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            user32.TranslateMessage(ctypes.byref(msg))
+            user32.DispatchMessageW(ctypes.byref(msg))
+        self.hwnd = None
+        user32.UnregisterClassW(wc.lpszClassName, wc.hInstance)
+
+
+class ConnectionWatcher:
+    """
+    Keeps the target device's connection state cached and reports changes, so
+    nothing on the gesture path waits for a PowerShell query. Checks run on
+    refresh(), which device change notifications call on Windows; with
+    `interval` set they also run that often in the background.
+    """
+
+    def __init__(self, bluetooth, get_device, on_change, interval=None):
+        self.bluetooth = bluetooth
+        self.get_device = get_device
+        self.on_change = on_change
+        self.interval = interval
+
+        self.device = None
+        self.connected = False
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+        self._device_changes = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._wake.clear()
+        self._thread = threading.Thread(target=self._run, name="ConnectionWatcher", daemon=True)
+        self._thread.start()
+        if platform.system() == "Windows":
+            self._device_changes = DeviceChangeMonitor(self.refresh)
+            if not self._device_changes.start() and self.interval is None:
+                # No notifications: fall back to polling
+                self.interval = CONNECTION_POLL_INTERVAL
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._device_changes:
+            self._device_changes.stop()
+            self._device_changes = None
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1 + DEVICE_CHANGE_SETTLE)
+        self._thread = None
+
+    def refresh(self):
+        # e.g. after the target device was changed
+        self._wake.set()
+
+    def check(self):
+        """Queries the connection once and reports a change. Returns the connection state."""
+        with self._lock:
+            device = self.get_device()
+            connected = bool(device) and self.bluetooth.is_device_connected(device)
+            changed = connected != self.connected or device != self.device
+            self.device = device
+            self.connected = connected
+            if changed:
+                logger.info("Target device %s: %s", device, "connected" if connected else "not connected")
+                self.on_change(connected)
+            return connected
+
+    def _run(self):
+        while self._running:
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Connection check failed: %s", e)
+            # Without an interval this sleeps until refresh(): no wakeups while idle
+            self._wake.wait(self.interval)
+            if self._running and self._wake.is_set():
+                self._wake.clear()
+                time.sleep(DEVICE_CHANGE_SETTLE)
+                self._wake.clear()
@@ -0,0 +1,128 @@
+import threading
+from . import tracing
+
+# How long a press waits for its chord partner (seconds)
+DEFAULT_CHORD_TOLERANCE = 0.08
+
+
+class ChordDetector:
+    """
+    Detects buttons pressed together (e.g. play/pause + volume up) as one gesture.
+
+    A press on a button that is part of a mapped chord is held back for at most
+    `tolerance` seconds. If a partner goes down in that time the chord fires;
+    otherwise, as soon as the chord can no longer happen (deadline passed, key
+    released, or an unrelated key pressed), the held press is passed on with its
+    original timestamp. Buttons that aren't in any chord are passed on at once.
+    """
+
+    def __init__(self, scheduler, on_press, on_release, on_chord):
+        self.scheduler = scheduler
+        self.on_press = on_press
+        self.on_release = on_release
+        self.on_chord = on_chord
+
+        self.chords = {}
+        self.partners = {}
+        self.tolerance = DEFAULT_CHORD_TOLERANCE
+
+        # Re-entrant: forwarding a press may arm scheduler jobs that call back in
+        self._lock = threading.RLock()
+        # button -> (state, timestamp, deadline job, token) for presses held back
+        self._pending = {}
+        # Buttons still held down after firing a chord; their key-ups are swallowed
+        self._consumed = set()
+
+        self.chord_count = 0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def configure(self, chords, tolerance=DEFAULT_CHORD_TOLERANCE):
+        # chords: {frozenset of buttons: action}
+        with self._lock:
+            self.chords = dict(chords)
+            self.tolerance = tolerance
+            self.partners = {}
+            for buttons in self.chords:
+                for button in buttons:
+                    self.partners.setdefault(button, set()).update(buttons - {button})
+
+    def stats(self):
+        with self._lock:
+            mean = self.total_latency / self.chord_count if self.chord_count else 0.0
+            return {
+                "chords": self.chord_count,
+                "max_latency_ms": round(self.max_latency * 1000, 1),
+                "mean_latency_ms": round(mean * 1000, 1),
+                "bound_ms": round(self.tolerance * 1000, 1),
+            }
+
+    def key_down(self, state, timestamp):
+        button = state.button
+        with self._lock:
+            if button in self._consumed:
+                # Auto-repeat of a key that is part of a fired chord
+                return
+
+            # An unrelated key rules out the chords of anything held back
+            for other in list(self._pending):
+                if other != button and button not in self.partners.get(other, ()):
+                    self._flush(other)
+
+            chord = self._find_chord(button)
+            if chord is not None:
+                self._fire(chord, button, timestamp)
+                return
+
+            if button in self.partners and button not in self._pending:
+                token = object()
+                job = self.scheduler.call_later(self.tolerance, lambda: self._expire(button, token))
+                self._pending[button] = (state, timestamp, job, token)
+                return
+
+            if button not in self._pending:
+                self.on_press(state, timestamp)
+
+    def key_up(self, state, timestamp):
+        button = state.button
+        with self._lock:
+            if button in self._consumed:
+                self._consumed.discard(button)
+                return
+            if button in self._pending:
+                # Released before a partner arrived, so it was a plain press
+                self._flush(button)
+            self.on_release(state, timestamp)
+
+    def _find_chord(self, button):
+        held = set(self._pending) | {button}
+        for buttons in self.chords:
+            if button in buttons and buttons <= held:
+                return buttons
+        return None
+
+    def _fire(self, buttons, button, timestamp):
+        first = min(self._pending[b][1] for b in buttons if b != button)
+        for b in buttons:
+            if b in self._pending:
+                self.scheduler.discard(self._pending.pop(b)[2])
+        self._consumed.update(buttons)
+
+        latency = max(0.0, timestamp - first)
+        self.chord_count += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+        tracing.tracer.instant("engine.chord")
+        self.on_chord(buttons, self.chords[buttons], latency)
+
+    def _expire(self, button, token):
+        with self._lock:
+            pending = self._pending.get(button)
+            if pending is not None and pending[3] is token:
+                self._flush(button)
+
+    def _flush(self, button):
+        state, timestamp, job, _ = self._pending.pop(button)
+        self.scheduler.discard(job)
+        self.on_press(state, timestamp)
@@ -0,0 +1,215 @@
+import logging
+import os
+import platform
+import queue
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Pre-spawned shells kept warm; also the maximum number of commands running at once
+DEFAULT_POOL_SIZE = 2
+# Commands waiting for a free shell beyond this are rejected rather than piling up
+MAX_QUEUED = 8
+DEFAULT_TIMEOUT = 10.0
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class ShellWorker:
+    """
+    A long-lived shell that runs commands written to its stdin, so a gesture
+    doesn't have to wait for a new shell or interpreter to start.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.os_type = platform.system()
+        self.process = None
+        self.lines = None
+        self.spawn()
+
+    def spawn(self):
+        if self.os_type == "Windows":
+            args = ["powershell", "-NoLogo", "-NoProfile", "-NonInteractive", "-Command", "-"]
+            kwargs = {"creationflags": subprocess.CREATE_NO_WINDOW}
+        else:
+            args = ["/bin/sh"]
+            # Own process group, so a timed out command can be killed with its children
+            kwargs = {"start_new_session": True}
+
+        self.process = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            **kwargs
+        )
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_output, args=(self.process, self.lines),
+                         name=f"{self.name}-reader", daemon=True).start()
+
+    def _read_output(self, process, lines):
+        for line in process.stdout:
+            lines.put(line.rstrip("\r\n"))
+        lines.put(None)
+
+    def _wrap(self, command, marker):
+        if self.os_type == "Windows":
+            return (
+                "$LASTEXITCODE = 0; $c = 0; "
+                f"try {{ & {{ {command} }} 2>&1 | Out-String -Stream; if ($LASTEXITCODE) {{ $c = $LASTEXITCODE }} }} "
+                "catch { $_ | Out-String -Stream; $c = 1 }; "
+                f"Write-Output \"{marker}:$c\"\n"
+            )
+        # Subshell so `exit`/`cd` in a command can't affect the worker, and no
+        # access to our stdin so it can't swallow the next job.
+        return f"( {command}\n) </dev/null 2>&1; echo \"{marker}:$?\"\n"
+
+    def run(self, command, timeout):
+        """Runs one command. Returns (exit_code, output_lines); raises CommandTimeout."""
+        marker = f"__done_{uuid.uuid4().hex}__"
+        self.process.stdin.write(self._wrap(command, marker))
+        self.process.stdin.flush()
+
+        deadline = time.monotonic() + timeout
+        output = []
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise CommandTimeout(command)
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                raise CommandTimeout(command)
+            if line is None:
+                # Shell died (e.g. the command killed its parent); report and respawn
+                raise BrokenPipeError("worker shell exited")
+            if line.startswith(marker):
+                code = line[len(marker) + 1:].strip()
+                return (int(code) if code.lstrip("-").isdigit() else 1), output
+            output.append(line)
+
+    def kill(self):
+        if self.process is None or self.process.poll() is not None:
+            return
+        try:
+            if self.os_type == "Windows":
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(self.process.pid)],
+                               capture_output=True, creationflags=subprocess.CREATE_NO_WINDOW)
+            else:
+                os.killpg(self.process.pid, signal.SIGKILL)
+        except (OSError, subprocess.SubprocessError):
+            self.process.kill()
+        self.process.wait()
+
+    def restart(self):
+        self.kill()
+        self.spawn()
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self.kill()
+
+
+class CommandPool:
+    """
+    Runs external commands on a fixed pool of warm shells. At most `size`
+    commands run at once, each with its own timeout; output goes to the log.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_queued=MAX_QUEUED, log=None):
+        self.size = size
+        self.max_queued = max_queued
+        self.log = log or logger.info
+        self.jobs = queue.Queue()
+        self.workers = []
+        self.threads = []
+        self.running = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.running = True
+            for i in range(self.size):
+                thread = threading.Thread(target=self._work, args=(i,), name=f"CommandWorker-{i}", daemon=True)
+                self.threads.append(thread)
+                thread.start()
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+            # Queued commands would otherwise hold up the sentinels behind them
+            dropped = 0
+            while True:
+                try:
+                    if self.jobs.get_nowait() is not None:
+                        dropped += 1
+                except queue.Empty:
+                    break
+            if dropped:
+                self.log(f"[Commands] Stopped with {dropped} commands still waiting; they were not run")
+            for _ in self.threads:
+                self.jobs.put(None)
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
+
+    def submit(self, name, command, timeout=DEFAULT_TIMEOUT):
+        # Never blocks the caller (the gesture path); returns False if rejected
+        if not self.running:
+            self.start()
+        if self.jobs.qsize() >= self.max_queued:
+            self.log(f"[Command {name}] Rejected: {self.jobs.qsize()} commands already waiting")
+            return False
+        self.jobs.put((name, command, timeout, time.perf_counter()))
+        return True
+
+    def _work(self, index):
+        # Spawning happens here, off the caller's thread, so the pool warms up in the background
+        worker = ShellWorker(f"CommandWorker-{index}")
+        with self._lock:
+            self.workers.append(worker)
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is None:
+                    return
+                self._run_job(worker, *job)
+        finally:
+            worker.close()
+            with self._lock:
+                self.workers.remove(worker)
+
+    def _run_job(self, worker, name, command, timeout, submitted):
+        started = time.perf_counter()
+        try:
+            code, output = worker.run(command, timeout)
+        except CommandTimeout:
+            self.log(f"[Command {name}] Timed out after {timeout:.1f}s, restarting worker")
+            worker.restart()
+            return
+        except (BrokenPipeError, OSError) as e:
+            self.log(f"[Command {name}] Worker failed ({e}), restarting")
+            worker.restart()
+            return
+
+        for line in output:
+            self.log(f"[Command {name}] {line}")
+        self.log(f"[Command {name}] Exit code {code} "
+                 f"(waited {(started - submitted) * 1000:.1f} ms, ran {(time.perf_counter() - started) * 1000:.1f} ms)")
@@ -1,67 +1,224 @@
+import copy
 import json
+import logging
 import os
+from .foreground_app import normalize_app
+
+logger = logging.getLogger(__name__)
 
 CONFIG_FILE = "config.json"
 
+# The button the "gestures" section maps; other buttons live under "button_gestures"
+PRIMARY_BUTTON = "play_pause"
+
 DEFAULT_CONFIG = {
     "gestures": {
         "single_tap": "Play / Pause",
         "double_tap": "Scroll Down",
         "triple_tap": "Alt + Tab",
-        "long_press": "Switch Desktop"
+        "long_press": "Switch Desktop",
+        "long_press_2": "None"
     },
     "options": {
         "notifications": True,
-        "start_with_windows": False
+        "start_with_windows": False,
+        # Hold-to-repeat for the long press action (repeats per second)
+        "repeat_long_press": False,
+        "repeat_rate": 8.0,
+        "repeat_max_rate": 30.0,
+        "repeat_acceleration": 15.0,
+        # Second hold level ("long_press_2" gesture), in seconds
+        "long_press_2_threshold": 1.5,
+        # Fire a hold level's action on release instead of when it is reached,
+        # unless the next level is reached first
+        "long_press_on_release": False,
+        # How long a press waits for the other buttons of a chord (seconds)
+        "chord_tolerance": 0.08,
+        # Hook callbacks slower than this are reported as overruns
+        "hook_budget_ms": 50,
+        # Level for debug.log: DEBUG, INFO, WARNING or ERROR
+        "log_level": "INFO",
+        # Run the keyboard hooks and gesture engine in their own process, so the
+        # UI can't hold up hook callbacks
+        "hook_process": True,
+        # Hook events waiting for the engine beyond this are dropped, oldest
+        # first; "collapse_repeats" also merges repeats of the same key edge
+        "input_queue_size": 256,
+        "input_overflow": "collapse_repeats",
+        # Clean-up of key edges before recognition (see input_filter.py), and
+        # how close together edges count as chatter rather than taps
+        "input_filters": ["duplicates", "debounce", "orphans"],
+        "debounce_ms": 25,
+        # Record presses to sessions/ for python -m src.session_analysis
+        "record_sessions": False,
+        # Count gestures and how they turned out in usage/ (Statistics tab)
+        "usage_stats": True
     },
+    "button_gestures": {},
+    # Per-application overrides, keyed by executable name, e.g.
+    # {"powerpnt.exe": {"play_pause": {"double_tap": "Next Track"}}}
+    "app_gestures": {},
+    # Chatter window for devices that need a different one than options.debounce_ms,
+    # e.g. {"Cheap Buds": 40}
+    "device_debounce_ms": {},
+    # Buttons pressed together, e.g. {"play_pause+volume_up": "Lock Screen"}
+    "chords": {},
+    # External commands usable as "Run: <name>" actions,
+    # e.g. {"Mic Mute": {"command": "...", "timeout": 5}}
+    "commands": {},
     "target_device": None
 }
 
 class ConfigManager:
+    # {app or None: {(button, gesture): action}}, rebuilt after gesture edits
+    _gesture_maps = None
+
     def __init__(self):
         self.config = self.load_config()
 
     def load_config(self):
         if not os.path.exists(CONFIG_FILE):
-            return DEFAULT_CONFIG.copy()
+            return copy.deepcopy(DEFAULT_CONFIG)
 
         try:
             with open(CONFIG_FILE, "r") as f:
                 return json.load(f)
         except (json.JSONDecodeError, IOError):
-            return DEFAULT_CONFIG.copy()
+            return copy.deepcopy(DEFAULT_CONFIG)
+
+    def reload(self):
+        # Pick up changes saved by another process
+        self.config = self.load_config()
+        self._gesture_maps = None
 
     def save_config(self):
         try:
             with open(CONFIG_FILE, "w") as f:
                 json.dump(self.config, f, indent=4)
         except IOError as e:
-            print(f"Error saving config: {e}")
+            logger.error("Error saving config: %s", e)
 
     def get(self, key, default=None):
         return self.config.get(key, default)
 
     def set(self, key, value):
         self.config[key] = value
+        self._gesture_maps = None
+
+    def get_gesture(self, gesture_type, button=PRIMARY_BUTTON, app=None):
+        # Called while resolving gestures: one lookup in the map for `app`,
+        # which already has the global mappings merged in.
+        maps = self._gesture_maps
+        if maps is None:
+            maps = self._gesture_maps = self._compile_gesture_maps()
+        return maps.get(app, maps[None]).get((button, gesture_type))
+
+    def has_mappings(self):
+        # Anything at all to intercept, for any application?
+        if self._gesture_maps is None:
+            self._gesture_maps = self._compile_gesture_maps()
+        for table in self._gesture_maps.values():
+            if any(action and action != "None" for action in table.values()):
+                return True
+        return bool(self.get_chords())
+
+    def _compile_gesture_maps(self):
+        base = {}
+        for button, gestures in self.config.get("button_gestures", {}).items():
+            if button != PRIMARY_BUTTON:
+                for gesture_type, action in gestures.items():
+                    base[(button, gesture_type)] = action
+        for gesture_type, action in self.config.get("gestures", {}).items():
+            base[(PRIMARY_BUTTON, gesture_type)] = action
 
-    def get_gesture(self, gesture_type):
-        return self.config.get("gestures", {}).get(gesture_type)
+        maps = {None: base}
+        for app, buttons in self.config.get("app_gestures", {}).items():
+            table = dict(base)
+            for button, gestures in buttons.items():
+                for gesture_type, action in gestures.items():
+                    table[(button, gesture_type)] = action
+            maps[normalize_app(app)] = table
+        return maps
 
-    def set_gesture(self, gesture_type, action):
-        if "gestures" not in self.config:
-            self.config["gestures"] = {}
-        self.config["gestures"][gesture_type] = action
+    def set_gesture(self, gesture_type, action, button=PRIMARY_BUTTON):
+        self._gesture_maps = None
+        if button == PRIMARY_BUTTON:
+            if "gestures" not in self.config:
+                self.config["gestures"] = {}
+            self.config["gestures"][gesture_type] = action
+            return
+        if "button_gestures" not in self.config:
+            self.config["button_gestures"] = {}
+        self.config["button_gestures"].setdefault(button, {})[gesture_type] = action
+
+    def get_mapped_buttons(self):
+        # Buttons other than the primary one that have an action or chord mapped,
+        # globally or for some application
+        sections = [self.config.get("button_gestures", {})] + list(self.config.get("app_gestures", {}).values())
+        buttons = []
+        for section in sections:
+            for button, gestures in section.items():
+                if (button != PRIMARY_BUTTON and button not in buttons
+                        and any(action and action != "None" for action in gestures.values())):
+                    buttons.append(button)
+        for chord in self.get_chords():
+            buttons.extend(b for b in chord if b != PRIMARY_BUTTON and b not in buttons)
+        return buttons
+
+    def get_chords(self):
+        # {"play_pause+volume_up": action} -> {frozenset({"play_pause", "volume_up"}): action}
+        chords = {}
+        for combo, action in self.config.get("chords", {}).items():
+            buttons = frozenset(b.strip() for b in combo.split("+") if b.strip())
+            if len(buttons) >= 2 and action and action != "None":
+                chords[buttons] = action
+        return chords
 
     def get_option(self, option_name):
-        return self.config.get("options", {}).get(option_name)
+        # Fall back to the defaults for options missing from older config files
+        default = DEFAULT_CONFIG["options"].get(option_name)
+        return self.config.get("options", {}).get(option_name, default)
 
     def set_option(self, option_name, value):
         if "options" not in self.config:
             self.config["options"] = {}
         self.config["options"][option_name] = value
 
+    def get_repeat_options(self):
+        return {
+            "enabled": bool(self.get_option("repeat_long_press")),
+            "rate": float(self.get_option("repeat_rate")),
+            "max_rate": float(self.get_option("repeat_max_rate")),
+            "acceleration": float(self.get_option("repeat_acceleration")),
+        }
+
+    def get_commands(self):
+        commands = {}
+        for name, spec in self.config.get("commands", {}).items():
+            if isinstance(spec, str):
+                spec = {"command": spec}
+            if isinstance(spec, dict) and spec.get("command"):
+                commands[name] = spec
+        return commands
+
     def get_target_device(self):
         return self.config.get("target_device")
 
     def set_target_device(self, device_name):
         self.config["target_device"] = device_name
+
+    def get_debounce_window(self, device_name):
+        # Seconds; the device's own window if it has one
+        ms = self.config.get("device_debounce_ms", {}).get(device_name)
+        if ms is None:
+            ms = self.get_option("debounce_ms")
+        return ms / 1000.0
+
+    def get_timing(self, device_name):
+        # Learned gesture thresholds, stored per device ("default" when none is selected)
+        return self.config.get("timing", {}).get(device_name or "default")
+
+    def set_timing(self, device_name, timing):
+        if "timing" not in self.config:
+            self.config["timing"] = {}
+        self.config["timing"][device_name or "default"] = timing
@@ -0,0 +1,50 @@
+import collections
+import threading
+
+# Messages waiting for the UI beyond this are dropped, oldest first
+MAX_PENDING = 2000
+# The debug log box is cut back to its newest TRIM_TO characters once it
+# holds more than MAX_CHARS
+MAX_CHARS = 50000
+TRIM_TO = 10000
+
+
+class DebugLogBuffer:
+    """
+    Carries input debugger messages from listener threads to the UI thread.
+    The first message of a batch calls `schedule_flush()`, and the UI then
+    takes the whole batch with drain(). If the UI falls behind, the oldest
+    messages are dropped instead of piling up.
+    """
+
+    def __init__(self, schedule_flush, max_pending=MAX_PENDING):
+        self.schedule_flush = schedule_flush
+        self.dropped = 0
+        self._unreported = 0
+        self._messages = collections.deque(maxlen=max_pending)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def append(self, msg):
+        with self._lock:
+            messages = self._messages
+            if len(messages) == messages.maxlen:
+                self.dropped += 1
+                self._unreported += 1
+            messages.append(msg)
+            if len(messages) > 1:
+                # A flush is already scheduled
+                return
+        self.schedule_flush()
+
+    def drain(self):
+        """Everything queued since the last drain, as one string."""
+        with self._lock:
+            text = "".join(self._messages)
+            self._messages.clear()
+            if self._unreported:
+                text = f"[Debug] {self._unreported} messages dropped\n" + text
+                self._unreported = 0
+        return text
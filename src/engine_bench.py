@@ -0,0 +1,139 @@
+"""
+How late the gesture engine's hook callbacks reach the input queue while the
+settings window is busy, with that load in the engine's process (as with
+`"hook_process": false`) or in another one (the default):
+
+    python -m src.engine_bench [--duration 2] [--interval 0.002] [--json]
+
+A hook thread wakes every `interval`, as the `keyboard` hook does when the OS
+delivers a key, and calls the engine's real _on_key_down/_on_key_up. Each
+sample is the time from the wake-up being due to the event being pushed onto
+the input queue. The load is the input debugger's path: formatting lines into
+a DebugLogBuffer and draining it as the UI does. No hooks are installed and
+queued events are discarded, so nothing is sent to the system.
+"""
+import argparse
+import json
+import multiprocessing
+import statistics
+import threading
+import time
+from types import SimpleNamespace
+
+from .debug_log import DebugLogBuffer
+from .input_queue import InputQueue
+
+DEFAULT_DURATION = 2.0
+DEFAULT_INTERVAL = 0.002
+
+
+def measure_hook_latency(separate_process, duration=DEFAULT_DURATION, interval=DEFAULT_INTERVAL, config=None):
+    """
+    Runs the hook path for `duration` seconds under UI load and returns the
+    push delays: {"samples", "p50_ms", "p99_ms", "max_ms"}.
+    """
+    # Imported here so the load process started below doesn't need them
+    from .config_manager import ConfigManager
+    from .gesture_engine import GestureEngine
+
+    engine = GestureEngine(config or ConfigManager())
+    engine.is_running = True
+    # As if the target device were connected, so every event is queued
+    engine.connection.connected = True
+    engine.input = InputQueue(lambda state, is_down, timestamp: None)
+
+    delays = []
+    push = engine.input.push
+    due = 0.0
+
+    def timed_push(state, is_down, timestamp):
+        delays.append(time.perf_counter() - due)
+        push(state, is_down, timestamp)
+
+    engine.input.push = timed_push
+
+    stop = multiprocessing.Event()
+    if separate_process:
+        load = multiprocessing.Process(target=_ui_load, args=(stop,), daemon=True)
+    else:
+        load = threading.Thread(target=_ui_load, args=(stop,), daemon=True)
+    load.start()
+
+    def hook():
+        nonlocal due
+        is_down = True
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            due = time.perf_counter() + interval
+            time.sleep(interval)
+            event = SimpleNamespace(event_type="down" if is_down else "up", time=time.time())
+            if is_down:
+                engine._on_key_down(event)
+            else:
+                engine._on_key_up(event)
+            is_down = not is_down
+
+    try:
+        hook_thread = threading.Thread(target=hook, name="BenchHook")
+        hook_thread.start()
+        hook_thread.join()
+    finally:
+        stop.set()
+        load.join(timeout=1)
+        engine.input.stop()
+        engine.scheduler.stop()
+
+    if not delays:
+        return {"samples": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+    delays.sort()
+    return {
+        "samples": len(delays),
+        "p50_ms": round(statistics.median(delays) * 1000, 3),
+        "p99_ms": round(delays[min(len(delays) - 1, int(len(delays) * 0.99))] * 1000, 3),
+        "max_ms": round(delays[-1] * 1000, 3),
+    }
+
+
+def _ui_load(stop):
+    # The input debugger under a key storm: Python-side formatting that holds
+    # the GIL, with the UI draining the batch once it is scheduled
+    flushes = []
+    log = DebugLogBuffer(lambda: flushes.append(True))
+    count = 0
+    while not stop.is_set():
+        for _ in range(200):
+            count += 1
+            log.append(f"[Debug] {time.perf_counter():.6f} key down: scan code {count % 256} (media_play_pause)\n")
+        if flushes:
+            flushes.clear()
+            log.drain()
+
+
+def compare(duration=DEFAULT_DURATION, interval=DEFAULT_INTERVAL):
+    return {
+        "same_process": measure_hook_latency(False, duration, interval),
+        "separate_process": measure_hook_latency(True, duration, interval),
+    }
+
+
+def format_report(report):
+    labels = {"same_process": "UI load in the engine process", "separate_process": "UI load in another process"}
+    return "\n".join(
+        f"{labels[name]}: {r['samples']} events, median {r['p50_ms']} ms, p99 {r['p99_ms']} ms, max {r['max_ms']} ms"
+        for name, r in report.items()
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure hook-to-queue latency under UI load.")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds per run")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between hook events")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = compare(args.duration, args.interval)
+    print(json.dumps(report, indent=4) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import logging
+import multiprocessing
+import threading
+
+from . import event_ring
+from .actions import ActionManager
+from .config_manager import ConfigManager
+from .event_ring import EventRing
+from .log_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+# The engine process logs separately, so the two processes never rotate the same file
+ENGINE_LOG_FILE = "engine.log"
+
+
+class EngineHost:
+    """
+    Engine-process side: reports gestures and hook stats into the event ring
+    as they happen, and sets `ready` so the UI process wakes up only then.
+    Reports come from several engine threads (scheduler, input queue,
+    connection watcher, hook watchdog, control loop); the ring takes one
+    producer, so every push goes through `_lock`.
+    """
+
+    def __init__(self, engine, events, ready=None):
+        self.engine = engine
+        self.events = events
+        self.ready = ready
+        self._last_stats = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.engine.on_gesture = self.gesture
+        self.engine.on_status = self.publish_stats
+
+    def stop(self):
+        self.engine.on_gesture = None
+        self.engine.on_status = None
+
+    def gesture(self, gesture, action):
+        # Called on the gesture path: a few struct writes, only ever waits on
+        # another report
+        with self._lock:
+            self.events.push(event_ring.GESTURE, text=f"{gesture}: {action}" if gesture else action)
+            self._publish_stats()
+        self._signal()
+
+    def publish_stats(self):
+        with self._lock:
+            changed = self._publish_stats()
+        if changed:
+            self._signal()
+
+    def _publish_stats(self):
+        # Under _lock
+        stats = self.engine.hook_stats()
+        key = (stats["calls"], stats["max_ms"], stats["overruns"], stats["recoveries"], stats["connected"],
+               stats["dropped"], stats["collapsed"], stats["delay_ms"])
+        if key == self._last_stats:
+            return False
+        self._last_stats = key
+        self.events.push(
+            event_ring.STATS, stats["calls"], stats["max_ms"],
+            f"{stats['overruns']},{stats['recoveries']},{int(stats['connected'])},"
+            f"{stats['dropped']},{stats['collapsed']},{stats['delay_ms']}",
+        )
+        return True
+
+    def _signal(self):
+        if self.ready is not None:
+            self.ready.set()
+
+
+def run_engine(events_name, control, log_level="INFO", ready=None):
+    """Entry point of the engine process: hooks, gesture engine and actions, no UI."""
+    # Imported here: the UI process only needs EngineClient
+    from .gesture_engine import GestureEngine
+
+    log_pipeline = setup_logging(log_level, path=ENGINE_LOG_FILE)
+    events = EventRing(events_name)
+    config = ConfigManager()
+    engine = GestureEngine(config)
+    host = EngineHost(engine, events, ready)
+
+    # Thresholds in use per device this run, see reload_engine
+    learned = {}
+
+    engine.actions.warm_up()
+    engine.start()
+    host.start()
+    logger.info("Engine process started")
+    try:
+        while True:
+            try:
+                command, *args = control.recv()
+            except (EOFError, OSError):
+                # The UI process is gone
+                break
+            if command == "stop":
+                break
+            elif command == "reload":
+                reload_engine(engine, config, learned)
+            elif command == "tracing":
+                engine.set_tracing(*args)
+            elif command == "export_trace":
+                try:
+                    engine.export_trace(*args)
+                except IOError as e:
+                    logger.error("Failed to save trace: %s", e)
+            host.publish_stats()
+    finally:
+        host.stop()
+        engine.stop()
+        engine.actions.shutdown()
+        events.close()
+        log_pipeline.stop()
+
+
+def reload_engine(engine, config, learned):
+    """
+    Applies a config the UI process just saved. Its "timing" section is the
+    UI's copy, loaded before anything was learned here, so the thresholds of
+    every device the engine has used this run are put back (and written out
+    by engine.reload()) whether or not they changed since the last reload.
+    """
+    learned[engine.timing_device] = engine.timing.to_dict()
+    config.reload()
+    for device, timing in learned.items():
+        if config.get_timing(device) != timing:
+            config.set_timing(device, timing)
+            engine.timing_dirty = True
+    engine.reload()
+
+
+class EngineClient:
+    """
+    UI-process stand-in for GestureEngine when the engine runs in its own
+    process. Commands go over a pipe; gestures and stats come back through a
+    shared-memory EventRing. A reader thread sleeps until the engine signals
+    new records, then calls `on_status` so the UI can drain them.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        # Only used to list actions (and configured commands) in the settings
+        self.actions = ActionManager()
+        self.actions.configure_commands(config.get_commands())
+
+        self.process = None
+        self.events = None
+        self.control = None
+        self.ready = None
+        self.on_status = None
+        self._reader = None
+        self._stats = {"calls": 0, "overruns": 0, "max_ms": 0.0, "recoveries": 0, "connected": False,
+                       "dropped": 0, "collapsed": 0, "delay_ms": 0.0}
+
+    def start(self):
+        if self.process:
+            return
+        self.events = EventRing()
+        self.ready = multiprocessing.Event()
+        self.control, child_control = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_engine,
+            args=(self.events.name, child_control, self.config.get_option("log_level"), self.ready),
+            name="GestureEngine",
+            daemon=True,
+        )
+        self.process.start()
+        child_control.close()
+        self._reader = threading.Thread(target=self._read_events, name="EngineEvents", daemon=True)
+        self._reader.start()
+
+    def stop(self):
+        if not self.process:
+            return
+        self._send("stop")
+        self.process.join(timeout=3)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.process = None
+        # Wake the reader so it sees the engine is gone
+        self.ready.set()
+        self._reader.join(timeout=1)
+        self._reader = None
+        self.control.close()
+        self.events.close()
+
+    def reload(self):
+        self.actions.configure_commands(self.config.get_commands())
+        self._send("reload")
+
+    def set_tracing(self, enabled):
+        self._send("tracing", bool(enabled))
+
+    def export_trace(self, path):
+        # Written by the engine process, where the trace is recorded
+        self._send("export_trace", path)
+
+    def hook_stats(self):
+        return dict(self._stats)
+
+    def poll_events(self):
+        """Drains the event ring; returns the gestures reported since the last call."""
+        if not self.events:
+            return []
+        gestures = []
+        for kind, a, b, text in self.events.pop_all():
+            if kind == event_ring.GESTURE:
+                gestures.append(text)
+            elif kind == event_ring.STATS:
+                *counts, delay_ms = text.split(",")
+                overruns, recoveries, connected, dropped, collapsed = (int(v) for v in counts)
+                self._stats = {"calls": int(a), "overruns": overruns, "max_ms": b,
+                               "recoveries": recoveries, "connected": bool(connected),
+                               "dropped": dropped, "collapsed": collapsed, "delay_ms": float(delay_ms)}
+        return gestures
+
+    def _read_events(self):
+        process = self.process
+        while True:
+            self.ready.wait()
+            if self.process is not process:
+                return
+            self.ready.clear()
+            if self.on_status:
+                self.on_status()
+
+    def _send(self, command, *args):
+        try:
+            self.control.send((command,) + args)
+        except (OSError, AttributeError) as e:
+            logger.error("Engine process unavailable: %s", e)
+
@@ -0,0 +1,73 @@
+import struct
+from multiprocessing import shared_memory
+
+# Record kinds
+GESTURE = 1      # text: "<gesture>: <action>"
+STATS = 2        # a: hook calls, b: slowest callback (ms),
+                 # text: "<overruns>,<recoveries>,<connected>,<dropped>,<collapsed>,<delay ms>"
+
+DEFAULT_CAPACITY = 1024
+
+# write count, read count (u64 each), then capacity
+_HEADER = struct.Struct("<QQI4x")
+# kind, two numbers and a short UTF-8 text
+_RECORD = struct.Struct("<B7xdd64s")
+_WRITE = 0
+_READ = 8
+
+
+class EventRing:
+    """
+    Single-producer, single-consumer ring of fixed-size records in shared
+    memory, for passing events between two processes without locks. The
+    producer only ever advances the write count and the consumer the read
+    count, each after its record is fully written or read. When the ring is
+    full push() drops the new record rather than waiting. Producers in the
+    same process must take turns (see EngineHost).
+    """
+
+    def __init__(self, name=None, capacity=DEFAULT_CAPACITY):
+        if name is None:
+            size = _HEADER.size + capacity * _RECORD.size
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            _HEADER.pack_into(self.shm.buf, 0, 0, 0, capacity)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.buf = self.shm.buf
+        self.capacity = _HEADER.unpack_from(self.buf, 0)[2]
+        self.dropped = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def push(self, kind, a=0.0, b=0.0, text=""):
+        write, read = struct.unpack_from("<QQ", self.buf, 0)
+        if write - read >= self.capacity:
+            self.dropped += 1
+            return False
+        offset = _HEADER.size + (write % self.capacity) * _RECORD.size
+        _RECORD.pack_into(self.buf, offset, kind, a, b, text.encode("utf-8")[:64])
+        # Publish only after the record is in place
+        struct.pack_into("<Q", self.buf, _WRITE, write + 1)
+        return True
+
+    def pop_all(self):
+        """Returns every record written since the last call as (kind, a, b, text)."""
+        write, read = struct.unpack_from("<QQ", self.buf, 0)
+        records = []
+        while read < write:
+            offset = _HEADER.size + (read % self.capacity) * _RECORD.size
+            kind, a, b, text = _RECORD.unpack_from(self.buf, offset)
+            records.append((kind, a, b, text.rstrip(b"\0").decode("utf-8", "ignore")))
+            read += 1
+        struct.pack_into("<Q", self.buf, _READ, read)
+        return records
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
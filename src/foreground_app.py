@@ -0,0 +1,144 @@
+import logging
+import ntpath
+import platform
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_app(name):
+    # "C:\\Program Files\\...\\POWERPNT.EXE" -> "powerpnt.exe"
+    return ntpath.basename(name).lower() if name else None
+
+
+class MockForegroundApp:
+    """Foreground app that only changes when told to (non-Windows and tests)."""
+
+    def __init__(self, app=None):
+        self.current_app = normalize_app(app)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def set_app(self, app):
+        self.current_app = normalize_app(app)
+
+
+class ForegroundAppMonitor:
+    """
+    Tracks the foreground application through EVENT_SYSTEM_FOREGROUND
+    notifications. The executable name is looked up once per switch and kept
+    in `current_app`, so gesture resolution only reads an attribute.
+    """
+
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    WINEVENT_OUTOFCONTEXT = 0x0000
+    WINEVENT_SKIPOWNPROCESS = 0x0002
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    WM_QUIT = 0x0012
+
+    def __init__(self):
+        self.current_app = None
+        self._thread = None
+        self._thread_id = None
+        self._ready = threading.Event()
+
+    def start(self):
+        if self._thread:
+            return
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name="ForegroundApp", daemon=True)
+        self._thread.start()
+        self._ready.wait(1)
+
+    def stop(self):
+        if not self._thread:
+            return
+        if self._thread_id:
+            self.user32.PostThreadMessageW(self._thread_id, self.WM_QUIT, 0, 0)
+        self._thread.join(timeout=1)
+        self._thread = None
+        self._thread_id = None
+
+    def _run(self):
+        import ctypes
+        from ctypes import wintypes
+
+        self.user32 = ctypes.WinDLL("user32", use_last_error=True)
+        self.kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        self.user32.GetForegroundWindow.restype = wintypes.HWND
+        self.user32.GetWindowThreadProcessId.argtypes = (wintypes.HWND, ctypes.POINTER(wintypes.DWORD))
+        self.kernel32.OpenProcess.restype = wintypes.HANDLE
+        self.kernel32.QueryFullProcessImageNameW.argtypes = (
+            wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR, ctypes.POINTER(wintypes.DWORD),
+        )
+        self.kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+        WINEVENTPROC = ctypes.WINFUNCTYPE(
+            None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+            wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD,
+        )
+        self.user32.SetWinEventHook.argtypes = (
+            wintypes.DWORD, wintypes.DWORD, wintypes.HMODULE, WINEVENTPROC,
+            wintypes.DWORD, wintypes.DWORD, wintypes.DWORD,
+        )
+        self.user32.SetWinEventHook.restype = wintypes.HANDLE
+
+        def on_event(hook, event, hwnd, id_object, id_child, thread, time_ms):
+            self._update(hwnd)
+
+        # Keep a reference for as long as the hook lives
+        self._proc = WINEVENTPROC(on_event)
+        self._thread_id = self.kernel32.GetCurrentThreadId()
+        # The hook delivers events through this thread's message loop
+        hook = self.user32.SetWinEventHook(
+            self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND, None, self._proc,
+            0, 0, self.WINEVENT_OUTOFCONTEXT | self.WINEVENT_SKIPOWNPROCESS,
+        )
+        if not hook:
+            logger.error("SetWinEventHook failed (error %d)", ctypes.get_last_error())
+        self._update(self.user32.GetForegroundWindow())
+        self._ready.set()
+
+        msg = wintypes.MSG()
+        while self.user32.GetMessageW(ctypes.byref(msg), None, 0, 0) > 0:
+            self.user32.TranslateMessage(ctypes.byref(msg))
+            self.user32.DispatchMessageW(ctypes.byref(msg))
+
+        if hook:
+            self.user32.UnhookWinEvent(hook)
+
+    def _update(self, hwnd):
+        if not hwnd:
+            return
+        app = self._process_name(hwnd)
+        if app and app != self.current_app:
+            self.current_app = app
+            logger.debug("Foreground app: %s", app)
+
+    def _process_name(self, hwnd):
+        import ctypes
+        from ctypes import wintypes
+
+        pid = wintypes.DWORD()
+        self.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid))
+        handle = self.kernel32.OpenProcess(self.PROCESS_QUERY_LIMITED_INFORMATION, False, pid.value)
+        if not handle:
+            return None
+        try:
+            buffer = ctypes.create_unicode_buffer(260)
+            size = wintypes.DWORD(len(buffer))
+            if not self.kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+                return None
+            return normalize_app(buffer.value)
+        finally:
+            self.kernel32.CloseHandle(handle)
+
+
+def default_monitor():
+    if platform.system() == "Windows":
+        return ForegroundAppMonitor()
+    return MockForegroundApp()
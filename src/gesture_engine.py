@@ -1,77 +1,396 @@
+import logging
 import time
 import threading
 import keyboard
 from .actions import ActionManager
-from .bluetooth_manager import BluetoothManager
-from .config_manager import ConfigManager
+from .adaptive_timing import AdaptiveTiming
+from .bluetooth_manager import BluetoothManager, ConnectionWatcher
+from .chords import ChordDetector, DEFAULT_CHORD_TOLERANCE
+from .config_manager import ConfigManager, PRIMARY_BUTTON
+from .foreground_app import default_monitor
+from .hook_watchdog import HookWatchdog
+from .input_filter import FilterPipeline
+from .input_queue import InputQueue, OVERFLOW_POLICIES, COLLAPSE_REPEATS
+from .notifications import Notifier
+from .scheduler import Scheduler
+from .session_recorder import SessionRecorder
+from .timebase import Timebase
+from . import usage_stats
+from .usage_stats import UsageStats
+from . import tracing
 
-# Time thresholds in seconds
+logger = logging.getLogger(__name__)
+
+# Default time thresholds in seconds, adapted per device at runtime (see adaptive_timing.py)
 LONG_PRESS_THRESHOLD = 0.5
 MULTI_TAP_WINDOW = 0.4
 
-class GestureEngine:
-    def __init__(self, config_manager: ConfigManager):
-        self.config = config_manager
-        self.actions = ActionManager()
-        self.bluetooth = BluetoothManager()
+# Media buttons the engine can remap, with the key names `keyboard` may know them by.
+# Names are tried in order, since some systems don't have the first one.
+BUTTON_KEYS = {
+    "play_pause": ("play/pause media", "play/pause"),
+    "next_track": ("next track",),
+    "previous_track": ("previous track",),
+    "volume_up": ("volume up",),
+    "volume_down": ("volume down",),
+}
+
+# What each button does on its own, sent for its gestures that have nothing
+# mapped (the primary button is always intercepted and has no fallback)
+NATIVE_ACTIONS = {
+    "next_track": "Next Track",
+    "previous_track": "Previous Track",
+    "volume_up": "Volume Up",
+    "volume_down": "Volume Down",
+}
+
+# Hold gestures in order of how long the button is held. Each fires once its
+# threshold is crossed; the first uses the adaptive long press threshold, later
+# ones the named option (seconds).
+HOLD_LEVELS = (("long_press", None), ("long_press_2", "long_press_2_threshold"))
+
+# Key injected by the hook watchdog to check the hook is alive; rarely on any keyboard
+PROBE_KEY = "f24"
+
+class KeyState:
+    """Gesture state for one hooked button."""
+    __slots__ = (
+        "button", "key_name", "scan_codes",
+        "tap_count", "last_tap_time", "timer", "tap_window_start",
+        "is_key_down", "key_down_time", "repeat_job",
+        "hold_jobs", "hold_level", "hold_fired", "last_event_time", "native_repeats",
+    )
+
+    def __init__(self, button):
+        self.button = button
+        # Resolved once at start, see GestureEngine._resolve_key
+        self.key_name = None
+        self.scan_codes = ()
 
         self.tap_count = 0
         self.last_tap_time = 0
+        # Scheduler job that resolves the taps once the multi-tap window closes
         self.timer = None
-        self.is_running = False
+        # Trace mark for when the current multi-tap wait started
+        self.tap_window_start = 0
 
         # State for long press detection
-        self.key_down_time = 0
         self.is_key_down = False
+        self.key_down_time = 0
+        self.repeat_job = None
+        # One scheduler deadline per hold level; levels reached and already acted on
+        self.hold_jobs = ()
+        self.hold_level = 0
+        self.hold_fired = 0
+        # Time of the latest press or release, for gesture latency in usage stats
+        self.last_event_time = 0
+        # Auto-repeats of this press sent on as the button's own key
+        self.native_repeats = 0
+
+class GestureEngine:
+    def __init__(self, config_manager: ConfigManager, foreground=None, scheduler=None):
+        self.config = config_manager
+        self.actions = ActionManager()
+        self.bluetooth = BluetoothManager()
+
+        # Application in front, for per-app gesture mappings
+        self.foreground = foreground or default_monitor()
+
+        self.is_running = False
         self.hooks = []
 
+        # Suppressing hooks are only installed while there is something to
+        # intercept (see _update_hooks); the lock serialises installs and removals.
+        self.hooked = False
+        self._hooks_lock = threading.RLock()
+        self.connection = ConnectionWatcher(self.bluetooth, self.config.get_target_device, self._on_connection_change)
+
+        # One state record per hooked button; the primary button always has one
+        self.primary = KeyState(PRIMARY_BUTTON)
+        self.states = {PRIMARY_BUTTON: self.primary}
+
+        # Multi-tap, hold-to-repeat and chord deadlines: one scheduler drives
+        # them all, and its clock is the engine's (virtual in soak runs, see soak.py)
+        self.scheduler = scheduler or Scheduler()
+        self.clock = self.scheduler.clock
+        self.chords = ChordDetector(self.scheduler, self._key_pressed, self._key_released, self._handle_chord)
+
+        # Hook callbacks only timestamp events and queue them; the engine
+        # handles them on the queue's thread (see input_queue.py)
+        self.input = InputQueue(self._on_input)
+        # Chatter and duplicate edges are dropped before recognition
+        self.filters = FilterPipeline(self._filtered_down, self._filtered_up)
+        # Press and release times come from the hook's event timestamps, mapped
+        # onto the scheduler's clock
+        self.timebase = Timebase("keyboard", clock=self.clock)
+
+        # Hook callback timing and dead-hook recovery
+        self.watchdog = HookWatchdog(self._send_probe, self._recover_hooks)
+
+        # On-action notifications, shown from their own thread
+        self.notifier = Notifier()
+        # Optional callback(gesture, action) for every action run, e.g. to
+        # report it to the UI process (see engine_process.py)
+        self.on_gesture = None
+        # Optional callback() when hook_stats() changes for a reason other than
+        # a gesture (connection, hook recovery), so the UI needn't poll
+        self.on_status = None
+
+        # Press/release log for offline threshold tuning (options.record_sessions)
+        self.recorder = SessionRecorder()
+        # Which gestures get used and how they turn out (options.usage_stats)
+        self.usage = UsageStats()
+
+        # Learned thresholds for the current target device
+        self.timing_device = None
+        self.timing = AdaptiveTiming(MULTI_TAP_WINDOW, LONG_PRESS_THRESHOLD)
+        self.timing_dirty = False
+
     def start(self):
         if self.is_running:
             return
 
         self.is_running = True
-        # Use on_press_key and on_release_key with suppress=True to block default behavior
-        # 'play/pause media' is the scan code name usually.
-        # We hook both to ensure we capture the full lifecycle and suppress it.
+        self._sync_timing_device()
+        self.actions.configure_commands(self.config.get_commands())
+        self.watchdog.budget = self.config.get_option("hook_budget_ms") / 1000.0
+        self._configure_input()
+        try:
+            self.filters.configure(self.config.get_option("input_filters"),
+                                   self.config.get_debounce_window(self.timing_device))
+        except ValueError as e:
+            logger.warning("%s; input filters unchanged", e)
 
-        # Note: hook_key is lower level. on_press_key is higher level.
-        # on_press_key returns a hook that we can remove later.
+        # Resolve every button's key name to scan codes once, so hooking
+        # (here and again in _re_emit) doesn't repeat the name fallback.
+        self.states = {PRIMARY_BUTTON: self.primary}
+        for button in [PRIMARY_BUTTON] + self.config.get_mapped_buttons():
+            if button not in BUTTON_KEYS:
+                logger.warning("Unknown button in config: %s", button)
+                continue
+            state = self.states.get(button) or KeyState(button)
+            if self._resolve_key(state):
+                self.states[button] = state
 
-        print("Gesture Engine Started. Listening for 'play/pause media'...")
-        try:
-            h1 = keyboard.on_press_key('play/pause media', self._on_key_down, suppress=True)
-            h2 = keyboard.on_release_key('play/pause media', self._on_key_up, suppress=True)
-            self.hooks.extend([h1, h2])
-        except ValueError:
-            # Fallback if key name is not found (e.g. some systems)
-            # Try 'play/pause'
+        chords = self.config.get_chords()
+        self.chords.configure(chords, self.config.get_option("chord_tolerance") if chords else DEFAULT_CHORD_TOLERANCE)
+
+        logger.info("Gesture Engine Started.")
+        if self.config.get_option("record_sessions"):
+            self.recorder.open(self.config.get_target_device(), list(BUTTON_KEYS))
+        if self.config.get_option("usage_stats"):
             try:
-                h1 = keyboard.on_press_key('play/pause', self._on_key_down, suppress=True)
-                h2 = keyboard.on_release_key('play/pause', self._on_key_up, suppress=True)
-                self.hooks.extend([h1, h2])
-            except Exception as e:
-                print(f"Failed to hook key: {e}")
+                self.usage.start()
+            except OSError as e:
+                logger.error("Can't record usage stats: %s", e)
+        self.notifier.enabled = bool(self.config.get_option("notifications"))
+        if self.notifier.enabled:
+            self.notifier.start()
+        self.foreground.start()
+        # Hook right away if the device was already known to be connected; the
+        # watcher re-checks in the background and hooks or unhooks on changes.
+        self._update_hooks()
+        self.connection.start()
+        self.connection.refresh()
 
     def stop(self):
         if not self.is_running:
             return
         self.is_running = False
+        self.connection.stop()
+        self.foreground.stop()
+        self._update_hooks()
+        self.input.stop()
+        self.scheduler.stop()
+        self.notifier.stop()
+        self.recorder.close()
+        self.usage.stop()
+
+        # Keep what was learned for next time
+        if self.timing_dirty:
+            self.config.save_config()
+            self.timing_dirty = False
+
+    def _configure_input(self):
+        size = self.config.get_option("input_queue_size")
+        policy = self.config.get_option("input_overflow")
+        if policy not in OVERFLOW_POLICIES:
+            logger.warning("Unknown input_overflow '%s', using %s", policy, COLLAPSE_REPEATS)
+            policy = COLLAPSE_REPEATS
+        if (size, policy) != (self.input.size, self.input.policy):
+            self.input.stop()
+            self.input = InputQueue(self._on_input, size, policy)
+
+    def reload(self):
+        # Pick up buttons added to or removed from the config
+        if self.is_running:
+            self.stop()
+            self.start()
+
+    # The UI talks to the engine through these, so it works the same whether
+    # the engine runs in-process or behind an EngineClient.
+
+    def hook_stats(self):
+        stats = self.watchdog.stats()
+        stats["connected"] = self.connection.connected
+        stats["dropped"] = self.input.dropped
+        stats["collapsed"] = self.input.collapsed
+        # How long after the input happened the hook callback ran
+        stats["delay_ms"] = round(self.timebase.mean_delay * 1000, 2)
+        stats["filtered"] = sum(self.filters.stats().values())
+        return stats
+
+    def set_tracing(self, enabled):
+        if enabled:
+            tracing.tracer.enable()
+        else:
+            tracing.tracer.disable()
+
+    def export_trace(self, path):
+        tracing.tracer.export(path)
+
+    def poll_events(self):
+        # Gestures are only queued up for the UI when they cross a process boundary
+        return []
+
+    def _resolve_key(self, state):
+        for name in BUTTON_KEYS[state.button]:
+            try:
+                state.scan_codes = tuple(keyboard.key_to_scan_codes(name))
+                state.key_name = name
+                return True
+            except ValueError:
+                # Key name not known on this system, try the next one
+                continue
+        logger.warning("Failed to resolve key for button '%s'", state.button)
+        return False
+
+    def _install_hooks(self):
+        # Use on_press_key and on_release_key with suppress=True to block default behavior.
+        # We hook both to ensure we capture the full lifecycle and suppress it.
+        for state in self.states.values():
+            if not state.scan_codes:
+                continue
+            try:
+                h1 = keyboard.on_press_key(state.scan_codes, lambda e, s=state: self._on_key_down(e, s), suppress=True)
+                h2 = keyboard.on_release_key(state.scan_codes, lambda e, s=state: self._on_key_up(e, s), suppress=True)
+                self.hooks.extend([h1, h2])
+            except Exception as e:
+                logger.error("Failed to hook key '%s': %s", state.key_name, e)
+
+        # Liveness probe for the watchdog, swallowed so it never reaches other apps
+        try:
+            h1 = keyboard.on_press_key(PROBE_KEY, self._on_probe, suppress=True)
+            h2 = keyboard.on_release_key(PROBE_KEY, lambda e: None, suppress=True)
+            self.hooks.extend([h1, h2])
+        except Exception as e:
+            logger.error("Failed to hook watchdog probe key: %s", e)
+
+    def _remove_hooks(self):
         for h in self.hooks:
             keyboard.unhook(h)
         self.hooks = []
 
+    def _on_connection_change(self, connected):
+        self._update_hooks()
+        device = self.connection.device
+        if device:
+            self.notifier.notify("connection", f"{device} {'connected' if connected else 'disconnected'}")
+        self._status_changed()
+
+    def _status_changed(self):
+        if self.on_status:
+            self.on_status()
+
+    def _update_hooks(self):
+        # Without a connected target device or any mapping there is nothing to
+        # intercept, so don't hook at all: presses then reach the OS directly
+        # instead of being swallowed and re-sent by _re_emit.
+        with self._hooks_lock:
+            wanted = self.is_running and self.connection.connected and self.config.has_mappings()
+            if wanted == self.hooked:
+                return
+            self.hooked = wanted
+            if wanted:
+                names = ", ".join(f"'{s.key_name}'" for s in self.states.values() if s.key_name)
+                logger.info("Listening for %s...", names)
+                self._install_hooks()
+                self.watchdog.start()
+                return
+            logger.info("Hooks removed, key presses pass through")
+            self._remove_hooks()
+            self._cancel_gestures()
+        # Outside the lock: the watchdog thread may be waiting on it in _recover_hooks
+        self.watchdog.stop()
+
+    def _cancel_gestures(self):
+        self.filters.reset()
+        for state in self.states.values():
+            self.scheduler.cancel(state.repeat_job)
+            state.repeat_job = None
+            self._cancel_hold(state)
+            self.scheduler.discard(state.timer)
+            state.is_key_down = False
+            state.tap_count = 0
+
+    def _on_probe(self, event):
+        self.watchdog.probe_seen()
+
+    def _send_probe(self):
+        keyboard.send(PROBE_KEY)
+
+    def _recover_hooks(self):
+        # Windows drops the OS-level hook without telling the `keyboard` library,
+        # so re-registering our handlers alone isn't enough: restart its listener
+        # to get a fresh SetWindowsHookEx, then hook our keys again.
+        with self._hooks_lock:
+            if not self.hooked:
+                return
+            self._remove_hooks()
+            listener = getattr(keyboard, "_listener", None)
+            if listener is not None and hasattr(listener, "start_if_necessary"):
+                listener.listening = False
+                listener.start_if_necessary()
+            self._install_hooks()
+        self._status_changed()
+
+    def _sync_timing_device(self):
+        # Thresholds are learned per device, so swap them when the target changes
+        device = self.config.get_target_device()
+        if device == self.timing_device:
+            return
+        self.timing_device = device
+        self.timing = AdaptiveTiming.from_dict(
+            self.config.get_timing(device), MULTI_TAP_WINDOW, LONG_PRESS_THRESHOLD
+        )
+        self.filters.set_window(self.config.get_debounce_window(device))
+
+    def _store_timing(self):
+        self.config.set_timing(self.timing_device, self.timing.to_dict())
+        self.timing_dirty = True
+
     def _should_intercept(self):
-        # Check if target device is selected and connected
-        target_device = self.config.get_target_device()
-        if target_device:
-            return self.bluetooth.is_device_connected(target_device)
-        # If no target device selected, maybe intercept always?
-        # Requirement said "select specific bluetooth device to choose to apply".
-        # If none selected, assume disabled or default?
-        # Let's assume if no device is selected, we do NOT intercept (pass through).
-        return False
+        with tracing.span("engine.should_intercept"):
+            return self._check_intercept()
 
-    def _on_key_down(self, event):
+    def _check_intercept(self):
+        # Cached by the connection watcher, which also unhooks us on disconnect;
+        # this only catches presses that race with that.
+        # If no target device is selected we do NOT intercept (pass through).
+        return self.connection.connected
+
+    def _on_key_down(self, event, state=None):
+        started = time.perf_counter()
+        with tracing.span("hook.key_down"):
+            self._process_key_down(event, state or self.primary)
+        self.watchdog.record(time.perf_counter() - started)
+
+    def _event_time(self, event):
+        # `keyboard` stamps events when its hook fires, before our handlers
+        # (and any GIL wait) run
+        return self.timebase.map(getattr(event, "time", None), self.clock())
+
+    def _process_key_down(self, event, state):
         if not self.is_running:
             return
 
@@ -79,98 +398,312 @@ class GestureEngine:
         # With suppress=True, we swallowed it.
         # If we determine we shouldn't have intercepted, we must re-emit it.
         if not self._should_intercept():
-            self._re_emit(event)
+            self._re_emit(event, state)
+            self.usage.record(f"Passthrough [{state.button}]", None, self.timing_device, None, usage_stats.PASSTHROUGH)
             return
 
-        if not self.is_key_down:
-            self.is_key_down = True
-            self.key_down_time = time.time()
+        self.input.push(state, True, self._event_time(event))
+
+    def _key_pressed(self, state, timestamp):
+        # Press of a single button, after chord detection has let it through
+        if not state.is_key_down:
+            state.is_key_down = True
+            state.key_down_time = timestamp
+            state.last_event_time = timestamp
+            state.native_repeats = 0
+            self.recorder.record(state.button, True, timestamp)
+
+            self._sync_timing_device()
+            if state.last_tap_time:
+                if self.timing.observe_gap(state.key_down_time - state.last_tap_time):
+                    self._store_timing()
+                state.last_tap_time = 0
+
+            self._arm_hold(state)
+
+    def _on_key_up(self, event, state=None):
+        started = time.perf_counter()
+        with tracing.span("hook.key_up"):
+            self._process_key_up(event, state or self.primary)
+        self.watchdog.record(time.perf_counter() - started)
 
-    def _on_key_up(self, event):
+    def _process_key_up(self, event, state):
         if not self.is_running:
             return
 
         if not self._should_intercept():
-            self._re_emit(event)
+            self._re_emit(event, state)
             return
 
-        if self.is_key_down:
-            self.is_key_down = False
-            press_duration = time.time() - self.key_down_time
+        self.input.push(state, False, self._event_time(event))
 
-            if press_duration > LONG_PRESS_THRESHOLD:
-                self._handle_long_press()
-            else:
-                self._handle_tap()
+    def _on_input(self, state, is_down, timestamp):
+        # On the input queue's thread, in hook order
+        if not self.is_running:
+            return
+        if is_down and state.is_key_down and self._hold_is_native(state):
+            # Auto-repeat of a held button whose hold does nothing here: keep
+            # sending its own key so it ramps as it would unhooked. The first
+            # repeat also stands in for the press, which was held back.
+            self._send_native(NATIVE_ACTIONS[state.button], 1 if state.native_repeats else 2)
+            state.native_repeats += 1
+            return
+        self.filters.process(state, is_down, timestamp)
+
+    def _filtered_down(self, state, timestamp):
+        self.chords.key_down(state, timestamp)
+
+    def _filtered_up(self, state, timestamp):
+        self.chords.key_up(state, timestamp)
+
+    def _key_released(self, state, release_time):
+        if state.is_key_down:
+            state.is_key_down = False
+            press_duration = release_time - state.key_down_time
+            state.last_event_time = release_time
+            self.recorder.record(state.button, False, release_time)
+
+            # Stop repeating right on key-up; if it already repeated, the hold is used up
+            repeats = self.scheduler.cancel(state.repeat_job)
+            state.repeat_job = None
+            hold_armed = bool(state.hold_jobs)
+            # Once these return, hold_level covers every deadline that fired
+            self._cancel_hold(state)
+
+            is_long_press = (repeats > 0 or state.hold_level > 0 or state.native_repeats > 0
+                             or press_duration > self.timing.long_press_threshold)
+            if self.timing.observe_hold(press_duration, is_long_press):
+                self._store_timing()
+
+            if state.native_repeats:
+                # Already sent as the button's own key while held
+                self._record_usage(None, "Long Press", state, usage_stats.PASSTHROUGH, None)
+                state.tap_count = 0
+            elif repeats:
+                logger.info("Detected: Hold (repeated %dx)%s", repeats, self._button_suffix(state))
+                self.usage.record("Hold (repeat)" + self._button_suffix(state), self._gesture("long_press", state.button),
+                                  self.timing_device, None, usage_stats.ACTION)
+                state.tap_count = 0
+            elif state.hold_level > state.hold_fired:
+                # Fire-on-release mode: the level reached last, the next one never came
+                self._handle_long_press(state, state.hold_level)
+            elif is_long_press and not state.hold_level:
+                # Either released right at the threshold, before its deadline
+                # ran, or no hold level is mapped and there was no deadline:
+                # then it is recorded as unmapped (or passed through)
+                self._handle_long_press(state, outcome=usage_stats.RECLASSIFIED if hold_armed else None)
+            elif not is_long_press:
+                state.last_tap_time = release_time
+                self._handle_tap(state)
+            state.hold_level = state.hold_fired = 0
+
+    def _arm_hold(self, state):
+        # Long press fires as soon as the hold crosses its threshold, from a
+        # scheduler deadline, rather than waiting for the key to come up.
+        self._arm_repeat(state)
+        if state.repeat_job:
+            return
+        state.hold_level = state.hold_fired = 0
+        # The press may have been held back for chord detection, so count from key-down
+        elapsed = self.clock() - state.key_down_time
+        state.hold_jobs = tuple(
+            self.scheduler.call_later(max(0.0, threshold - elapsed),
+                                      lambda level=level: self._hold_reached(state, level))
+            for level, threshold in enumerate(self._hold_thresholds(state), 1)
+        )
+
+    def _hold_thresholds(self, state):
+        # Thresholds up to the last hold level with an action mapped
+        thresholds = []
+        threshold = self.timing.long_press_threshold
+        for gesture_type, option in HOLD_LEVELS:
+            if option:
+                threshold = max(threshold, float(self.config.get_option(option)))
+            thresholds.append(threshold)
+        while thresholds and not self._is_mapped(HOLD_LEVELS[len(thresholds) - 1][0], state.button):
+            thresholds.pop()
+        return thresholds
+
+    def _hold_reached(self, state, level):
+        # Runs on the scheduler thread; _key_released cancels these jobs and
+        # waits for a running one before it looks at hold_level.
+        if not state.is_key_down:
+            return
+        state.hold_level = level
+        if level < len(state.hold_jobs) and self.config.get_option("long_press_on_release"):
+            # Decided on release, unless the next level is reached first
+            return
+        self._handle_long_press(state, level)
 
-    def _re_emit(self, event):
+    def _cancel_hold(self, state):
+        for job in state.hold_jobs:
+            self.scheduler.cancel(job)
+        state.hold_jobs = ()
+
+    def _arm_repeat(self, state):
+        # Start repeating the long press action once the hold crosses the threshold.
+        # The press may have been held back for chord detection, so count from key-down.
+        action = self._gesture("long_press", state.button)
+        if not self.actions.is_repeatable(action):
+            return
+        options = self.config.get_repeat_options()
+        if not options["enabled"]:
+            return
+
+        state.repeat_job = self.scheduler.repeat(
+            lambda count: self._repeat_action(action, count),
+            rate=options["rate"],
+            delay=max(0.0, self.timing.long_press_threshold - (self.clock() - state.key_down_time)),
+            max_rate=options["max_rate"],
+            acceleration=options["acceleration"],
+        )
+
+    def _repeat_action(self, action, count):
+        self.actions.execute_repeat(action, count)
+        # Repeats arrive many times a second; the notifier folds them into one
+        self.notifier.notify(f"repeat:{action}", f"Hold: {action}", count=count)
+
+    def _re_emit(self, event, state):
         # Re-emit the event so the system handles it.
         # We must unhook temporarily to avoid infinite loops since we are suppressing.
+        with self._hooks_lock:
+            self._remove_hooks()
 
-        # Remove hooks
-        for h in self.hooks:
-            keyboard.unhook(h)
-        self.hooks = []
+            # Send the event
+            key = state.scan_codes[0] if state.scan_codes else event.name
+            keyboard.send(key, do_press=(event.event_type=='down'), do_release=(event.event_type=='up'))
 
-        # Send the event
-        keyboard.send(event.name, do_press=(event.event_type=='down'), do_release=(event.event_type=='up'))
+            # Re-add hooks, unless we were unhooked meanwhile. The keys were already
+            # resolved in start() so re-hooking is cheap.
+            if self.hooked:
+                self._install_hooks()
 
-        # Re-add hooks (using internal logic similar to start, but without setting is_running=True again if already true)
-        # Actually, just calling start() might be complex if we are inside the callback.
-        # But since 'keyboard' callbacks are often in a separate thread, it might be ok.
-        # Let's verify: start() checks is_running.
-        # We didn't change is_running. So start() would return immediately.
-        # We need to manually re-add hooks.
+    def _record_usage(self, action_name, gesture, state, outcome, since):
+        # Latency: from the press or release that completed the gesture to now,
+        # so it includes the multi-tap wait a tap has to sit out
+        if state is not None:
+            gesture += self._button_suffix(state)
+            since = state.last_event_time
+        latency = self.clock() - since if since else None
+        if outcome is None:
+            outcome = usage_stats.ACTION if action_name and action_name != "None" else usage_stats.UNMAPPED
+        self.usage.record(gesture, action_name, self.timing_device, latency, outcome)
 
-        try:
-            h1 = keyboard.on_press_key('play/pause media', self._on_key_down, suppress=True)
-            h2 = keyboard.on_release_key('play/pause media', self._on_key_up, suppress=True)
-            self.hooks.extend([h1, h2])
-        except ValueError:
-            try:
-                h1 = keyboard.on_press_key('play/pause', self._on_key_down, suppress=True)
-                h2 = keyboard.on_release_key('play/pause', self._on_key_up, suppress=True)
-                self.hooks.extend([h1, h2])
-            except Exception as e:
-                print(f"Failed to re-hook key: {e}")
+    def _button_suffix(self, state):
+        return "" if state.button == PRIMARY_BUTTON else f" [{state.button}]"
 
-    def _handle_long_press(self):
-        print("Detected: Long Press")
-        action = self.config.get_gesture("long_press")
-        self._execute_action(action)
-        self.tap_count = 0
-        if self.timer:
-            self.timer.cancel()
-
-    def _handle_tap(self):
-        self.tap_count += 1
-
-        if self.timer:
-            self.timer.cancel()
-
-        self.timer = threading.Timer(MULTI_TAP_WINDOW, self._resolve_taps)
-        self.timer.start()
-
-    def _resolve_taps(self):
-        action = None
-        if self.tap_count == 1:
-            print("Detected: Single Tap")
-            action = self.config.get_gesture("single_tap")
-        elif self.tap_count == 2:
-            print("Detected: Double Tap")
-            action = self.config.get_gesture("double_tap")
-        elif self.tap_count >= 3:
-            print("Detected: Triple Tap")
-            action = self.config.get_gesture("triple_tap")
+    def _handle_long_press(self, state, level=1, outcome=None):
+        gesture = "Long Press" if level == 1 else f"Long Press (level {level})"
+        logger.info("Detected: %s%s", gesture, self._button_suffix(state))
+        state.hold_fired = level
+        action = self._gesture(HOLD_LEVELS[level - 1][0], state.button)
+        if self._pass_native(action, state):
+            outcome = usage_stats.PASSTHROUGH
+        self._execute_action(action, gesture, state, outcome)
+        state.tap_count = 0
+        self.scheduler.discard(state.timer)
 
-        self.tap_count = 0
-        self._execute_action(action)
+    def _handle_chord(self, buttons, action, latency):
+        gesture = "Chord " + " + ".join(sorted(buttons))
+        logger.info("Detected: %s (%.0f ms)", gesture, latency * 1000)
+        since = None
+        for button in buttons:
+            state = self.states.get(button)
+            if state:
+                since = max(since or 0, state.last_event_time)
+            if state and state.timer:
+                # Taps already counted on a chord button don't resolve on their own
+                self.scheduler.discard(state.timer)
+                state.tap_count = 0
+        self._execute_action(action, gesture, since=since)
+
+    def _handle_tap(self, state):
+        state.tap_count += 1
+
+        self.scheduler.discard(state.timer)
+
+        # If no longer tap gesture is mapped, this tap can't become ambiguous,
+        # so resolve right away instead of waiting out the multi-tap window.
+        if state.tap_count >= self._max_tap_count(state):
+            window = 0
+        else:
+            window = self.timing.multi_tap_window
+
+        state.tap_window_start = tracing.tracer.now()
+        state.timer = self.scheduler.call_later(window, lambda: self._resolve_taps(state))
+
+    def _max_tap_count(self, state):
+        # Highest tap count that still has an action mapped in the current config.
+        # Taps beyond it resolve the same way (see _resolve_taps), so waiting is pointless.
+        for count, gesture in ((3, "triple_tap"), (2, "double_tap")):
+            if self._is_mapped(gesture, state.button):
+                return count
+        return 1
+
+    def _gesture(self, gesture_type, button=PRIMARY_BUTTON):
+        # Mapping for the application in front; `current_app` is kept up to date
+        # by foreground change notifications, so this is two dict lookups.
+        return self.config.get_gesture(gesture_type, button, app=self.foreground.current_app)
+
+    def _is_mapped(self, gesture_type, button=PRIMARY_BUTTON):
+        action = self._gesture(gesture_type, button)
+        return bool(action) and action != "None"
+
+    def _resolve_taps(self, state):
+        tracing.tracer.complete("engine.tap_window", state.tap_window_start)
+
+        action = gesture = None
+        suffix = self._button_suffix(state)
+        if state.tap_count == 1:
+            gesture = "Single Tap"
+            action = self._gesture("single_tap", state.button)
+        elif state.tap_count == 2:
+            gesture = "Double Tap"
+            action = self._gesture("double_tap", state.button)
+        elif state.tap_count >= 3:
+            gesture = "Triple Tap"
+            action = self._gesture("triple_tap", state.button)
+        if gesture:
+            logger.info("Detected: %s%s", gesture, suffix)
+
+        outcome = None
+        if gesture and self._pass_native(action, state, state.tap_count):
+            outcome = usage_stats.PASSTHROUGH
+        state.tap_count = 0
+        self._execute_action(action, gesture, state, outcome)
+
+    def _pass_native(self, action, state, count=1):
+        # A button hooked for some of its gestures (or for one app's) must keep
+        # working for the rest: send its own key when nothing is mapped here
+        native = NATIVE_ACTIONS.get(state.button)
+        if not native or (action and action != "None"):
+            return False
+        self._send_native(native, count)
+        return True
+
+    def _hold_is_native(self, state):
+        return state.button in NATIVE_ACTIONS and not any(
+            self._is_mapped(gesture_type, state.button) for gesture_type, _ in HOLD_LEVELS)
+
+    def _send_native(self, native, count):
+        def send():
+            for _ in range(count):
+                self.actions.execute(native)
+        self.scheduler.call_later(0, send)
 
-    def _execute_action(self, action_name):
+    def _execute_action(self, action_name, gesture=None, state=None, outcome=None, since=None):
+        if gesture:
+            self._record_usage(action_name, gesture, state, outcome, since)
+        if action_name and action_name != "None":
+            self.notifier.notify(f"action:{gesture}:{action_name}", f"{gesture}: {action_name}" if gesture else action_name)
+            if self.on_gesture:
+                self.on_gesture(gesture, action_name)
         if action_name:
             # If the action is "Play / Pause", we need to send the key.
             # But we are suppressing it!
             # So we must use a method that bypasses our suppression or unhook temporarily.
-            # `actions.py` uses `pyautogui`.
-            # `pyautogui` uses different injection method usually.
-            self.actions.execute(action_name)
+            # `actions.py` injects through SendInput (see injector.py), not the
+            # `keyboard` library whose hooks we are suppressing.
+            # Run it on the scheduler thread: this may be called from a hook
+            # callback, which must return quickly (see HookWatchdog).
+            self.scheduler.call_later(0, lambda: self.actions.execute(action_name))
@@ -0,0 +1,158 @@
+import logging
+import platform
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Hook callbacks slower than this count as overruns. Windows silently removes
+# low-level hooks whose callbacks exceed LowLevelHooksTimeout (a few hundred ms),
+# so the budget sits well below that.
+DEFAULT_HOOK_BUDGET = 0.05
+
+# How often a live hook is checked, and how long a probe may take to come back
+PROBE_INTERVAL = 30.0
+PROBE_TIMEOUT = 1.0
+# How often the hook is checked when it has seen no keys at all. A hook that
+# Windows removed delivers nothing, so silence alone must not stop the checks.
+IDLE_PROBE_INTERVAL = 20 * 60.0
+
+
+def system_last_input():
+    """
+    Tick of the last input anywhere on the system (GetLastInputInfo), or None
+    where that isn't available.
+    """
+    if platform.system() != "Windows":
+        return None
+    import ctypes
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [("cbSize", ctypes.c_uint), ("dwTime", ctypes.c_uint)]
+
+    info = LASTINPUTINFO(ctypes.sizeof(LASTINPUTINFO))
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+        return None
+    return info.dwTime
+
+
+class HookWatchdog:
+    """
+    Times hook callbacks against a budget and checks that the hook is still alive
+    by injecting a probe key it should see. A dead hook is reinstalled.
+    Checks run every PROBE_INTERVAL while the hook is seeing keys, every
+    IDLE_PROBE_INTERVAL while it isn't (a removed hook sees nothing, e.g.
+    after a timeout our budget didn't catch, or after resume from sleep),
+    and straight after an overrun, since that is when Windows drops hooks.
+    An idle check is skipped when `last_input()` shows the user hasn't touched
+    anything since the last probe: the probe is injected input and would keep
+    resetting the screen-off, lock and sleep timers.
+    """
+
+    def __init__(self, send_probe, reinstall, budget=DEFAULT_HOOK_BUDGET,
+                 probe_interval=PROBE_INTERVAL, probe_timeout=PROBE_TIMEOUT,
+                 idle_probe_interval=IDLE_PROBE_INTERVAL, last_input=system_last_input):
+        self.send_probe = send_probe
+        self.reinstall = reinstall
+        self.budget = budget
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.idle_probe_interval = idle_probe_interval
+        self.last_input = last_input
+
+        self.calls = 0
+        self.overruns = 0
+        self.max_duration = 0.0
+        self.probes = 0
+        self.recoveries = 0
+        self.idle_skips = 0
+
+        self._probe_seen = threading.Event()
+        self._wake = threading.Event()
+        self._activity = threading.Event()
+        self._running = False
+        self._thread = None
+        self._input_at_probe = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._wake.clear()
+        self._activity.clear()
+        self._input_at_probe = self.last_input()
+        self._thread = threading.Thread(target=self._run, name="HookWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        self._activity.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=self.probe_timeout + 1)
+        self._thread = None
+
+    def record(self, duration):
+        # Called at the end of every hook callback; must stay cheap
+        self.calls += 1
+        if not self._activity.is_set():
+            self._activity.set()
+        if duration > self.max_duration:
+            self.max_duration = duration
+        if duration > self.budget:
+            self.overruns += 1
+            logger.warning("Hook callback overran its budget: %.1f ms > %.0f ms", duration * 1000, self.budget * 1000)
+            self._activity.set()
+            self._wake.set()
+
+    def probe_seen(self):
+        self._probe_seen.set()
+
+    def check(self):
+        """Probes the hook once; reinstalls it if the probe never arrives. Returns True if alive."""
+        self._probe_seen.clear()
+        self.probes += 1
+        self.send_probe()
+        if self._probe_seen.wait(self.probe_timeout):
+            return True
+
+        self.recoveries += 1
+        logger.warning("Keyboard hook stopped responding, reinstalling (recovery #%d)", self.recoveries)
+        self.reinstall()
+        return False
+
+    def _user_idle(self):
+        # The probe counts as input, so compare against the tick right after it
+        last = self.last_input()
+        return last is not None and last == self._input_at_probe
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "overruns": self.overruns,
+            "max_ms": round(self.max_duration * 1000, 1),
+            "budget_ms": round(self.budget * 1000, 1),
+            "probes": self.probes,
+            "recoveries": self.recoveries,
+            "idle_skips": self.idle_skips,
+        }
+
+    def _run(self):
+        while self._running:
+            # Keys seen call for a check within probe_interval; without any,
+            # the slow idle check still catches a hook that died silently
+            # while the user is at the machine
+            if self._activity.wait(self.idle_probe_interval):
+                self._wake.wait(self.probe_interval)
+            elif self._user_idle():
+                self.idle_skips += 1
+                continue
+            if not self._running:
+                return
+            self._wake.clear()
+            # Keys seen from here on call for the next check
+            self._activity.clear()
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("Hook watchdog check failed: %s", e)
+            self._input_at_probe = self.last_input()
@@ -0,0 +1,175 @@
+import ctypes
+import logging
+import platform
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Virtual-key codes used by the built-in actions
+VK_TAB = 0x09
+VK_CONTROL = 0x11
+VK_MENU = 0x12  # Alt
+VK_LEFT = 0x25
+VK_RIGHT = 0x27
+VK_L = 0x4C
+VK_LWIN = 0x5B
+VK_VOLUME_DOWN = 0xAE
+VK_VOLUME_UP = 0xAF
+VK_MEDIA_NEXT_TRACK = 0xB0
+VK_MEDIA_PREV_TRACK = 0xB1
+VK_MEDIA_PLAY_PAUSE = 0xB3
+
+# Keys that need KEYEVENTF_EXTENDEDKEY to be recognised
+EXTENDED_KEYS = {
+    VK_LEFT, VK_RIGHT, VK_LWIN, VK_VOLUME_DOWN, VK_VOLUME_UP,
+    VK_MEDIA_NEXT_TRACK, VK_MEDIA_PREV_TRACK, VK_MEDIA_PLAY_PAUSE,
+}
+
+# Event kinds in a batch: ("key", vk, is_up) and ("wheel", delta)
+KEY = "key"
+WHEEL = "wheel"
+
+
+def tap(vk):
+    return [(KEY, vk, False), (KEY, vk, True)]
+
+
+def combo(*vks):
+    # Modifiers go down in order, then come back up in reverse
+    return [(KEY, vk, False) for vk in vks] + [(KEY, vk, True) for vk in reversed(vks)]
+
+
+def wheel(delta):
+    return [(WHEEL, delta)]
+
+
+class RecordingBackend:
+    """Keeps every submitted batch instead of injecting it (non-Windows and tests)."""
+
+    def __init__(self):
+        self.batches = []
+
+    def prepare(self, events):
+        return tuple(events)
+
+    def submit(self, prepared):
+        self.batches.append(prepared)
+        return len(prepared)
+
+
+class SendInputBackend:
+    """Submits a whole batch with a single user32.SendInput call."""
+
+    INPUT_MOUSE = 0
+    INPUT_KEYBOARD = 1
+    KEYEVENTF_EXTENDEDKEY = 0x0001
+    KEYEVENTF_KEYUP = 0x0002
+    MOUSEEVENTF_WHEEL = 0x0800
+
+    def __init__(self):
+        from ctypes import wintypes
+
+        ULONG_PTR = ctypes.c_size_t
+
+        class KEYBDINPUT(ctypes.Structure):
+            _fields_ = [
+                ("wVk", wintypes.WORD),
+                ("wScan", wintypes.WORD),
+                ("dwFlags", wintypes.DWORD),
+                ("time", wintypes.DWORD),
+                ("dwExtraInfo", ULONG_PTR),
+            ]
+
+        class MOUSEINPUT(ctypes.Structure):
+            _fields_ = [
+                ("dx", wintypes.LONG),
+                ("dy", wintypes.LONG),
+                ("mouseData", wintypes.DWORD),
+                ("dwFlags", wintypes.DWORD),
+                ("time", wintypes.DWORD),
+                ("dwExtraInfo", ULONG_PTR),
+            ]
+
+        class HARDWAREINPUT(ctypes.Structure):
+            _fields_ = [
+                ("uMsg", wintypes.DWORD),
+                ("wParamL", wintypes.WORD),
+                ("wParamH", wintypes.WORD),
+            ]
+
+        class _INPUTUNION(ctypes.Union):
+            _fields_ = [("ki", KEYBDINPUT), ("mi", MOUSEINPUT), ("hi", HARDWAREINPUT)]
+
+        class INPUT(ctypes.Structure):
+            _anonymous_ = ("u",)
+            _fields_ = [("type", wintypes.DWORD), ("u", _INPUTUNION)]
+
+        self.INPUT = INPUT
+        self.input_size = ctypes.sizeof(INPUT)
+        self.user32 = ctypes.WinDLL("user32", use_last_error=True)
+        self.user32.SendInput.argtypes = (wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+        self.user32.SendInput.restype = wintypes.UINT
+
+    def prepare(self, events):
+        inputs = (self.INPUT * len(events))()
+        for i, event in enumerate(events):
+            if event[0] == KEY:
+                _, vk, is_up = event
+                flags = self.KEYEVENTF_KEYUP if is_up else 0
+                if vk in EXTENDED_KEYS:
+                    flags |= self.KEYEVENTF_EXTENDEDKEY
+                inputs[i].type = self.INPUT_KEYBOARD
+                inputs[i].ki.wVk = vk
+                inputs[i].ki.dwFlags = flags
+            else:
+                inputs[i].type = self.INPUT_MOUSE
+                inputs[i].mi.mouseData = event[1] & 0xFFFFFFFF
+                inputs[i].mi.dwFlags = self.MOUSEEVENTF_WHEEL
+        return inputs
+
+    def submit(self, prepared):
+        sent = self.user32.SendInput(len(prepared), prepared, self.input_size)
+        if sent != len(prepared):
+            logger.warning("SendInput injected %d/%d events (error %d)", sent, len(prepared), ctypes.get_last_error())
+        return sent
+
+
+def default_backend():
+    if platform.system() == "Windows":
+        return SendInputBackend()
+    return RecordingBackend()
+
+
+class Injector:
+    """
+    Builds input events into batches and submits each batch in one go.
+    Batches can be prepared ahead of time so injecting is a single call.
+    """
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._lock = threading.Lock()
+        self._prepared = {}
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = default_backend()
+        return self._backend
+
+    def prepare(self, key, events):
+        # Cache a ready-to-submit batch under `key`
+        self._prepared[key] = self.backend.prepare(events)
+
+    def send_prepared(self, key):
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            return 0
+        return self.backend.submit(prepared)
+
+    def send(self, events):
+        if not events:
+            return 0
+        return self.backend.submit(self.backend.prepare(events))
@@ -0,0 +1,159 @@
+"""
+Cleans up key edges before gesture recognition. Some earbuds resend a press
+a few milliseconds later, or report a bouncing contact as extra down/up
+pairs, which would otherwise count as extra taps. Each stage keeps a little
+state per key and does O(1) work per event.
+"""
+
+# Default chatter window (seconds); per-device values come from the config
+DEFAULT_DEBOUNCE = 0.025
+
+DUPLICATES = "duplicates"
+DEBOUNCE = "debounce"
+ORPHANS = "orphans"
+
+
+class DuplicateEdgeFilter:
+    """
+    Drops an edge repeating the key's previous one: a second down while
+    down, or a second up within the window of the first. A lone up after
+    longer than that is passed on, and dropped by OrphanReleaseFilter.
+    """
+
+    name = DUPLICATES
+
+    def __init__(self, window):
+        self.window = window
+        self.filtered = 0
+        # key -> (was_down, timestamp) of the last edge passed on
+        self._last = {}
+
+    def reset(self):
+        self._last.clear()
+
+    def process(self, key, is_down, timestamp, emit):
+        last = self._last.get(key)
+        if last is not None and last[0] == is_down and (is_down or timestamp - last[1] < self.window):
+            self.filtered += 1
+            return
+        self._last[key] = (is_down, timestamp)
+        emit(key, is_down, timestamp)
+
+
+class DebounceFilter:
+    """
+    Drops a press that starts within the window of the key's last release,
+    together with its release: the contact bounced, it wasn't another tap.
+    """
+
+    name = DEBOUNCE
+
+    def __init__(self, window):
+        self.window = window
+        self.filtered = 0
+        self._released = {}
+        self._bouncing = set()
+
+    def reset(self):
+        self._released.clear()
+        self._bouncing.clear()
+
+    def process(self, key, is_down, timestamp, emit):
+        if is_down:
+            released = self._released.get(key)
+            if released is not None and timestamp - released < self.window:
+                self._bouncing.add(key)
+                self.filtered += 1
+                return
+        else:
+            if key in self._bouncing:
+                self._bouncing.discard(key)
+                self.filtered += 1
+                return
+            self._released[key] = timestamp
+        emit(key, is_down, timestamp)
+
+
+class OrphanReleaseFilter:
+    """
+    Drops a release with no press before it: a resent release, one for a
+    press made before the hooks were installed, or one following reset().
+    Turning it into a tap would fire an action the user never asked for.
+    """
+
+    name = ORPHANS
+
+    def __init__(self, window):
+        self.filtered = 0
+        self._down = set()
+
+    def reset(self):
+        self._down.clear()
+
+    def process(self, key, is_down, timestamp, emit):
+        if is_down:
+            self._down.add(key)
+        elif key in self._down:
+            self._down.discard(key)
+        else:
+            self.filtered += 1
+            return
+        emit(key, is_down, timestamp)
+
+
+STAGES = {DUPLICATES: DuplicateEdgeFilter, DEBOUNCE: DebounceFilter, ORPHANS: OrphanReleaseFilter}
+
+
+class FilterPipeline:
+    """
+    Runs key edges through the configured stages in order and passes what
+    survives to on_down(key, timestamp) / on_up(key, timestamp).
+    """
+
+    def __init__(self, on_down, on_up, stages=(DUPLICATES, DEBOUNCE, ORPHANS), window=DEFAULT_DEBOUNCE):
+        self.on_down = on_down
+        self.on_up = on_up
+        self.configure(stages, window)
+
+    def configure(self, stages, window):
+        unknown = [name for name in stages if name not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown input filter: {', '.join(unknown)}")
+        if getattr(self, "stages", None) is not None and [s.name for s in self.stages] == list(stages):
+            # Same stages: keep their counters
+            self.set_window(window)
+            return
+        self.window = window
+        self.stages = [STAGES[name](window) for name in stages]
+        # Each stage emits into the next; the last one into the engine
+        emit = self._deliver
+        for stage in reversed(self.stages):
+            emit = _link(stage, emit)
+        self._entry = emit
+
+    def set_window(self, window):
+        self.window = window
+        for stage in self.stages:
+            if hasattr(stage, "window"):
+                stage.window = window
+
+    def process(self, key, is_down, timestamp):
+        self._entry(key, is_down, timestamp)
+
+    def reset(self):
+        # Forget key states, e.g. after unhooking, when a release may have been missed
+        for stage in self.stages:
+            stage.reset()
+
+    def stats(self):
+        return {stage.name: stage.filtered for stage in self.stages}
+
+    def _deliver(self, key, is_down, timestamp):
+        if is_down:
+            self.on_down(key, timestamp)
+        else:
+            self.on_up(key, timestamp)
+
+
+def _link(stage, emit):
+    return lambda key, is_down, timestamp: stage.process(key, is_down, timestamp, emit)
@@ -0,0 +1,112 @@
+import collections
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# How many hook events may wait for the engine before the overflow policy applies
+DEFAULT_QUEUE_SIZE = 256
+
+# Overflow policies. Both keep the queue bounded by dropping the oldest events
+# when it is full; collapse_repeats also merges an event into an identical one
+# (same key, same direction) queued right before it, as a stuck key or a link
+# resending reports produces.
+DROP_OLDEST = "drop_oldest"
+COLLAPSE_REPEATS = "collapse_repeats"
+OVERFLOW_POLICIES = (DROP_OLDEST, COLLAPSE_REPEATS)
+
+
+class InputQueue:
+    """
+    Hands hook events to the engine. Hook callbacks only push a timestamped
+    event and return; a consumer thread runs `handler(key, is_down, timestamp)`
+    for each. push() takes no lock: deque appends and pops are atomic, and a
+    deque with a maxlen discards from the other end when full, so a storm
+    can't grow memory or hold up the hook.
+    """
+
+    def __init__(self, handler, size=DEFAULT_QUEUE_SIZE, policy=COLLAPSE_REPEATS):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.handler = handler
+        self.size = size
+        self.policy = policy
+
+        self.pushed = 0
+        self.processed = 0
+        self.dropped = 0
+        self.collapsed = 0
+        self.high_water = 0
+
+        self._items = collections.deque(maxlen=size)
+        self._ready = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="InputQueue", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._items.clear()
+        self._ready.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def push(self, key, is_down, timestamp):
+        # Called from hook callbacks: counters are only written here, the
+        # consumer reads them
+        self.pushed += 1
+        items = self._items
+        if self.policy == COLLAPSE_REPEATS and items:
+            try:
+                last = items[-1]
+            except IndexError:
+                # Consumed in the meantime
+                last = None
+            if last is not None and last[0] is key and last[1] == is_down:
+                self.collapsed += 1
+                return
+        if len(items) == self.size:
+            self.dropped += 1
+        items.append((key, is_down, timestamp))
+        if len(items) > self.high_water:
+            self.high_water = len(items)
+        if not self._ready.is_set():
+            self._ready.set()
+        if not self._running:
+            self.start()
+
+    def stats(self):
+        return {
+            "pushed": self.pushed,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "collapsed": self.collapsed,
+            "queued": len(self._items),
+            "high_water": self.high_water,
+        }
+
+    def _run(self):
+        items = self._items
+        while self._running:
+            self._ready.wait()
+            # Cleared before draining, so a push that lands after the last
+            # pop still leaves the event set
+            self._ready.clear()
+            while self._running:
+                try:
+                    key, is_down, timestamp = items.popleft()
+                except IndexError:
+                    break
+                try:
+                    self.handler(key, is_down, timestamp)
+                except Exception as e:
+                    # Keep consuming; one bad event mustn't stall the input
+                    logger.error("Input event handler failed: %s", e)
+                self.processed += 1
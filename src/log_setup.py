@@ -0,0 +1,147 @@
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+LOG_FILE = "debug.log"
+MAX_BYTES = 1024 * 1024
+BACKUP_COUNT = 3
+# Records written per wakeup of the writer thread, flushed together
+BATCH_SIZE = 256
+LOG_FORMAT = "%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s"
+
+_STOP = object()
+
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the queue untouched. The stock QueueHandler formats the
+    message in the calling thread; here that is left to the writer thread so
+    hook and timer threads only pay for creating the record.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class _BatchRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that writes a batch of records with a single flush."""
+
+    def emit_batch(self, records):
+        self.acquire()
+        try:
+            for record in records:
+                try:
+                    text = self.format(record) + self.terminator
+                    if self.stream is None:
+                        self.stream = self._open()
+                    if self.maxBytes > 0 and self.stream.tell() + len(text) >= self.maxBytes:
+                        self.doRollover()
+                        if self.stream is None:
+                            self.stream = self._open()
+                    self.stream.write(text)
+                except Exception:
+                    self.handleError(record)
+            if self.stream is not None:
+                self.stream.flush()
+        finally:
+            self.release()
+
+
+class LogPipeline:
+    """Queue-based logging: callers enqueue records, one background thread writes them."""
+
+    def __init__(self, path=LOG_FILE, level=logging.INFO, max_bytes=MAX_BYTES,
+                 backup_count=BACKUP_COUNT, batch_size=BATCH_SIZE, console=None):
+        self.queue = queue.SimpleQueue()
+        self.batch_size = batch_size
+        self.file_handler = _BatchRotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        self.file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.handler = _EnqueueHandler(self.queue)
+
+        # Optional echo to a terminal, also written from the writer thread
+        self.console_handler = None
+        if console is not None:
+            self.console_handler = logging.StreamHandler(console)
+            self.console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        self.level = level
+        self._thread = None
+
+    def start(self):
+        root = logging.getLogger()
+        root.setLevel(self.level)
+        root.addHandler(self.handler)
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        logging.getLogger().removeHandler(self.handler)
+        if self._thread:
+            self.queue.put(_STOP)
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.file_handler.close()
+
+    def _run(self):
+        while True:
+            # Block for the first record, then take whatever else is already waiting
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(record is _STOP for record in batch)
+            records = [record for record in batch if record is not _STOP]
+            if records:
+                self.file_handler.emit_batch(records)
+                if self.console_handler is not None:
+                    for record in records:
+                        self.console_handler.handle(record)
+            if stop:
+                return
+
+
+class _StreamToLogger:
+    """Stands in for stdout/stderr in windowed mode so stray prints and tracebacks reach the log."""
+
+    def __init__(self, logger, level):
+        self.logger = logger
+        self.level = level
+        self._buffer = ""
+
+    def write(self, text):
+        self._buffer += text
+        while "\n" in self._buffer:
+            line, self._buffer = self._buffer.split("\n", 1)
+            if line.strip():
+                self.logger.log(self.level, line)
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+def setup_logging(level="INFO", path=LOG_FILE, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+
+    interactive = sys.stdout is not None and sys.stdout.isatty()
+    pipeline = LogPipeline(path, level, max_bytes, backup_count, console=sys.stderr if interactive else None)
+    pipeline.start()
+
+    # No console in windowed mode (or output is redirected): send stray output to the log
+    if not interactive:
+        sys.stdout = _StreamToLogger(logging.getLogger("stdout"), logging.INFO)
+        sys.stderr = _StreamToLogger(logging.getLogger("stderr"), logging.ERROR)
+
+    return pipeline
@@ -1,28 +1,38 @@
+import logging
 import threading
 import sys
 import multiprocessing
 from .config_manager import ConfigManager
 from .bluetooth_manager import BluetoothManager
+from .engine_process import EngineClient
 from .gesture_engine import GestureEngine
+from .log_setup import setup_logging
 from .ui import BluetoothBudsControlApp
 
+logger = logging.getLogger(__name__)
+
 def main():
     # PyInstaller boilerplate for Windows multiprocessing support
     multiprocessing.freeze_support()
 
-    # Redirect stdout/stderr to file for debugging in windowed mode
-    if sys.stdout is None or sys.stderr is None or not sys.stdout.isatty():
-        sys.stdout = open("debug.log", "w")
-        sys.stderr = sys.stdout
-
-    print("Starting Bluetooth Buds Control...")
-
     # Initialize Managers
     config = ConfigManager()
+
+    # Log through a background writer to a size-capped debug.log (plus backups);
+    # in windowed mode stray stdout/stderr output ends up there too
+    log_pipeline = setup_logging(config.get_option("log_level"))
+    logger.info("Starting Bluetooth Buds Control...")
+
     bluetooth = BluetoothManager()
 
     # Initialize Logic
-    gesture_engine = GestureEngine(config)
+    if config.get_option("hook_process"):
+        # Hooks and gestures in their own process, away from the UI's GIL
+        gesture_engine = EngineClient(config)
+    else:
+        gesture_engine = GestureEngine(config)
+        # Build the injection batches in the background before the first gesture
+        gesture_engine.actions.warm_up()
 
     # Start Gesture Engine
     # Note: keyboard.hook() is non-blocking, but we need to ensure it persists.
@@ -30,14 +40,16 @@ def main():
     gesture_engine.start()
 
     # Initialize UI
-    app = BluetoothBudsControlApp(config, bluetooth, gesture_engine)
+    app = BluetoothBudsControlApp(config, bluetooth, gesture_engine, on_save_callback=gesture_engine.reload)
 
     try:
         app.mainloop()
     except KeyboardInterrupt:
-        print("Exiting...")
+        logger.info("Exiting...")
     finally:
         gesture_engine.stop()
+        gesture_engine.actions.shutdown()
+        log_pipeline.stop()
         sys.exit(0)
 
 if __name__ == "__main__":
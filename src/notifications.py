@@ -0,0 +1,217 @@
+import logging
+import platform
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+APP_TITLE = "Bluetooth Buds Control"
+
+# At most one round of notifications per interval; anything arriving in between
+# is coalesced per key and shown together at the end of it (seconds)
+MIN_INTERVAL = 1.0
+BALLOON_TIMEOUT_MS = 3000
+
+# Shell_NotifyIconW
+NIM_ADD, NIM_MODIFY, NIM_DELETE = 0, 1, 2
+NIF_ICON, NIF_TIP, NIF_INFO = 0x02, 0x04, 0x10
+NIIF_INFO = 0x01
+IDI_INFORMATION = 32516
+HWND_MESSAGE = -3
+
+class RecordingBackend:
+    """Keeps what would have been displayed (tests)."""
+
+    def __init__(self):
+        self.shown = []
+
+    def show(self, key, title, message):
+        self.shown.append((key, title, message))
+
+
+class LogBackend:
+    """Writes notifications to the log (platforms without a notification area)."""
+
+    def show(self, key, title, message):
+        logger.info("Notification: %s - %s", title, message)
+
+
+class BalloonBackend:
+    """
+    Windows tray balloon on one tray icon that lives as long as the notifier:
+    added with the first notification, then updated in place, so a burst
+    replaces the text instead of stacking icons. Called only from the
+    notifier's thread, which owns the icon's hidden window.
+    """
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class NOTIFYICONDATAW(ctypes.Structure):
+            _fields_ = [
+                ("cbSize", wintypes.DWORD),
+                ("hWnd", wintypes.HWND),
+                ("uID", wintypes.UINT),
+                ("uFlags", wintypes.UINT),
+                ("uCallbackMessage", wintypes.UINT),
+                ("hIcon", wintypes.HICON),
+                ("szTip", wintypes.WCHAR * 128),
+                ("dwState", wintypes.DWORD),
+                ("dwStateMask", wintypes.DWORD),
+                ("szInfo", wintypes.WCHAR * 256),
+                ("uTimeoutOrVersion", wintypes.UINT),
+                ("szInfoTitle", wintypes.WCHAR * 64),
+                ("dwInfoFlags", wintypes.DWORD),
+                ("guidItem", ctypes.c_byte * 16),
+                ("hBalloonIcon", wintypes.HICON),
+            ]
+
+        self._ctypes = ctypes
+        self._user32 = ctypes.windll.user32
+        self._shell32 = ctypes.windll.shell32
+        self._user32.CreateWindowExW.restype = wintypes.HWND
+        self._user32.LoadIconW.restype = wintypes.HICON
+        self._data = NOTIFYICONDATAW()
+        self._data.cbSize = ctypes.sizeof(NOTIFYICONDATAW)
+        self._data.uID = 1
+        self._data.szTip = APP_TITLE
+        self._added = False
+
+    def show(self, key, title, message):
+        data = self._data
+        data.szInfoTitle = title[:63]
+        data.szInfo = message[:255]
+        data.uTimeoutOrVersion = BALLOON_TIMEOUT_MS
+        data.dwInfoFlags = NIIF_INFO
+        if self._added:
+            data.uFlags = NIF_INFO
+            if self._shell_notify(NIM_MODIFY):
+                return
+            # Explorer restarted and took the icon with it: add it again
+            self._added = False
+        if not data.hWnd:
+            # Message-only window: owns the icon, never shown, gets no broadcasts
+            data.hWnd = self._user32.CreateWindowExW(0, "STATIC", APP_TITLE, 0, 0, 0, 0, 0, HWND_MESSAGE, 0, 0, 0)
+            data.hIcon = self._user32.LoadIconW(0, IDI_INFORMATION)
+        data.uFlags = NIF_ICON | NIF_TIP | NIF_INFO
+        self._added = self._shell_notify(NIM_ADD)
+        if not self._added:
+            raise OSError("Shell_NotifyIconW failed")
+
+    def close(self):
+        if self._added:
+            self._shell_notify(NIM_DELETE)
+            self._added = False
+        if self._data.hWnd:
+            self._user32.DestroyWindow(self._data.hWnd)
+            self._data.hWnd = None
+
+    def _shell_notify(self, message):
+        return bool(self._shell32.Shell_NotifyIconW(message, self._ctypes.byref(self._data)))
+
+
+def default_backend():
+    if platform.system() == "Windows":
+        return BalloonBackend()
+    return LogBackend()
+
+
+class Notifier:
+    """
+    Shows notifications from a background thread. notify() only records the
+    latest message per key and returns, so it is safe on the gesture path.
+    Bursts on one key (e.g. volume repeating while held) collapse into a
+    single notification with a count, shown at most once per `min_interval`.
+    """
+
+    def __init__(self, backend=None, min_interval=MIN_INTERVAL, clock=time.monotonic):
+        self.backend = backend or default_backend()
+        self.min_interval = min_interval
+        self.clock = clock
+        self.enabled = True
+
+        self.shown = 0
+        self.coalesced = 0
+
+        # key -> [title, message, count], in arrival order
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._last_shown = None
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="Notifier", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._pending.clear()
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def notify(self, key, message, title=APP_TITLE, count=1):
+        if not self.enabled:
+            return
+        with self._cond:
+            if not self._running:
+                return
+            entry = self._pending.get(key)
+            if entry:
+                entry[0], entry[1] = title, message
+                entry[2] += count
+                self.coalesced += 1
+                return
+            self._pending[key] = [title, message, count]
+            self._cond.notify()
+
+    def _run(self):
+        try:
+            self._loop()
+        finally:
+            # The backend's tray icon belongs to this thread, so it goes away with it
+            close = getattr(self.backend, "close", None)
+            if close:
+                try:
+                    close()
+                except Exception as e:
+                    logger.error("Failed to close notification backend: %s", e)
+
+    def _loop(self):
+        with self._cond:
+            while True:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+
+                if self._last_shown is not None:
+                    wait = self._last_shown + self.min_interval - self.clock()
+                    if wait > 0:
+                        # Let the burst collect until the rate limit allows another round
+                        self._cond.wait(wait)
+                        continue
+
+                pending, self._pending = self._pending, {}
+                self._last_shown = self.clock()
+                self._cond.release()
+                try:
+                    for key, (title, message, count) in pending.items():
+                        self._show(key, title, message if count == 1 else f"{message} (x{count})")
+                finally:
+                    self._cond.acquire()
+
+    def _show(self, key, title, message):
+        try:
+            self.backend.show(key, title, message)
+            self.shown += 1
+        except Exception as e:
+            logger.error("Failed to show notification: %s", e)
@@ -0,0 +1,184 @@
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Minimum spacing between batches of a repeating job. Repeats that fall due in
+# between are injected together in the next batch instead of waking per repeat.
+BATCH_INTERVAL = 0.02
+
+
+class Job:
+    __slots__ = ("deadline", "callback", "cancelled", "fired", "lock")
+
+    def __init__(self, deadline, callback):
+        self.deadline = deadline
+        self.callback = callback
+        self.cancelled = False
+        self.fired = 0
+        # Held while the callback runs, so cancel() can wait for an in-flight batch
+        self.lock = threading.Lock()
+
+
+class RepeatJob(Job):
+    """
+    Fires `callback(count)` at `rate` per second, speeding up by `acceleration`
+    per second until `max_rate`. Counts are batched, see BATCH_INTERVAL.
+    """
+    __slots__ = ("start", "rate", "max_rate", "acceleration")
+
+    def __init__(self, start, callback, rate, max_rate=None, acceleration=0.0):
+        super().__init__(start, callback)
+        self.start = start
+        self.rate = rate
+        self.max_rate = max(rate, max_rate or rate)
+        self.acceleration = acceleration if self.max_rate > rate else 0.0
+
+    def _saturation_time(self):
+        if not self.acceleration:
+            return 0.0
+        return (self.max_rate - self.rate) / self.acceleration
+
+    def repeats_due(self, elapsed):
+        # Total repeats owed after `elapsed` seconds, the first one fires at 0
+        t_sat = self._saturation_time()
+        if elapsed <= t_sat:
+            n = self.rate * elapsed + self.acceleration * elapsed * elapsed / 2
+        else:
+            n = self.rate * t_sat + self.acceleration * t_sat * t_sat / 2
+            n += self.max_rate * (elapsed - t_sat)
+        return 1 + int(math.floor(n + 1e-9))
+
+    def time_of_repeat(self, index):
+        # Inverse of repeats_due: seconds after start at which repeat #index is due
+        n = index - 1
+        t_sat = self._saturation_time()
+        n_sat = self.rate * t_sat + self.acceleration * t_sat * t_sat / 2
+        if self.acceleration and n <= n_sat:
+            a, r = self.acceleration, self.rate
+            return (-r + math.sqrt(r * r + 2 * a * n)) / a
+        return t_sat + (n - n_sat) / self.max_rate
+
+
+class Scheduler:
+    """
+    A single background thread that runs deadline callbacks and repeating jobs.
+    The thread sleeps until the next deadline and does not wake at all while
+    nothing is scheduled.
+    """
+
+    def __init__(self, clock=time.monotonic, batch_interval=BATCH_INTERVAL):
+        self.clock = clock
+        self.batch_interval = batch_interval
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="Scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._heap = []
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def call_later(self, delay, callback):
+        job = Job(self.clock() + delay, callback)
+        self._push(job)
+        return job
+
+    def repeat(self, callback, rate, delay=0.0, max_rate=None, acceleration=0.0):
+        job = RepeatJob(self.clock() + delay, callback, rate, max_rate, acceleration)
+        self._push(job)
+        return job
+
+    def cancel(self, job):
+        """
+        Stops a job. Once this returns the callback will not run again, and any
+        batch that was already running has finished. Returns how many times
+        (repeats, for repeating jobs) the job fired.
+        """
+        if job is None:
+            return 0
+        job.cancelled = True
+        # A callback cancelling its own job must not wait on itself
+        if threading.current_thread() is not self._thread:
+            with job.lock:
+                pass
+        return job.fired
+
+    def discard(self, job):
+        # Like cancel(), but never waits; for callers that may hold locks the job needs
+        if job is not None:
+            job.cancelled = True
+
+    def _push(self, job):
+        with self._cond:
+            heapq.heappush(self._heap, (job.deadline, next(self._seq), job))
+            self._cond.notify()
+        if not self._running:
+            self.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and (not self._heap or self._heap[0][0] > self.clock()):
+                    timeout = self._heap[0][0] - self.clock() if self._heap else None
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+
+            if job.cancelled:
+                continue
+            self._fire(job)
+
+    def _fire(self, job):
+        with job.lock:
+            if job.cancelled:
+                return
+            if isinstance(job, RepeatJob):
+                self._fire_repeat(job)
+            else:
+                job.fired = 1
+                self._call(job.callback)
+
+    def _call(self, callback, *args):
+        # One failing callback mustn't take the thread, and every later
+        # deadline, down with it
+        try:
+            callback(*args)
+        except Exception:
+            logger.exception("Scheduled callback failed")
+
+    def _fire_repeat(self, job):
+        now = self.clock()
+        due = job.repeats_due(max(0.0, now - job.start))
+        count = due - job.fired
+        if count > 0:
+            job.fired = due
+            self._call(job.callback, count)
+
+        if job.cancelled:
+            return
+        next_deadline = max(job.start + job.time_of_repeat(job.fired + 1), now + self.batch_interval)
+        job.deadline = next_deadline
+        with self._cond:
+            if self._running:
+                heapq.heappush(self._heap, (next_deadline, next(self._seq), job))
+                self._cond.notify()
@@ -0,0 +1,223 @@
+"""
+Offline analysis of recorded sessions (see session_recorder.py), to choose the
+multi-tap window and long press threshold from data:
+
+    python -m src.session_analysis sessions/*.bin [--write]
+
+Needs NumPy, which the app itself doesn't (pip install -r requirements-analysis.txt).
+"""
+import argparse
+import json
+
+import numpy as np
+
+from .adaptive_timing import (
+    MIN_MULTI_TAP_WINDOW, MAX_MULTI_TAP_WINDOW, MIN_LONG_PRESS_THRESHOLD, MAX_LONG_PRESS_THRESHOLD,
+)
+
+RECORD_DTYPE = np.dtype([("t", "<f8"), ("button", "u1"), ("down", "u1")])
+
+# Candidate thresholds tried for both settings (seconds)
+GRID = np.round(np.arange(0.05, 1.5, 0.005), 3)
+# Gaps longer than this are idle time between uses, never part of a gesture
+MAX_GAP = 1.5
+
+
+def read_session(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    end = data.index(b"\n") + 1
+    header = json.loads(data[:end])
+    records = np.frombuffer(data, RECORD_DTYPE, offset=end, count=(len(data) - end) // RECORD_DTYPE.itemsize)
+    return header, records
+
+
+def load_sessions(paths):
+    """
+    Concatenates session files. Returns the event arrays, sorted per session
+    and button, and the (device, user) label of each group id.
+    """
+    labels = {}
+    parts = []
+    for session, path in enumerate(paths):
+        header, records = read_session(path)
+        group = labels.setdefault((header.get("device") or "default", header.get("user")), len(labels))
+        parts.append((records, session, group))
+
+    count = sum(len(records) for records, _, _ in parts)
+    events = {
+        "t": np.empty(count), "button": np.empty(count, np.uint8), "down": np.empty(count, np.uint8),
+        "session": np.empty(count, np.uint32), "group": np.empty(count, np.uint32),
+    }
+    start = 0
+    for records, session, group in parts:
+        end = start + len(records)
+        events["t"][start:end] = records["t"]
+        events["button"][start:end] = records["button"]
+        events["down"][start:end] = records["down"]
+        events["session"][start:end] = session
+        events["group"][start:end] = group
+        start = end
+
+    order = np.lexsort((events["t"], events["button"], events["session"]))
+    events = {name: values[order] for name, values in events.items()}
+    return events, {group: label for label, group in labels.items()}
+
+
+def extract_intervals(events):
+    """Hold durations (press -> release) and inter-tap gaps (release -> press), with their group ids."""
+    t, down = events["t"], events["down"]
+    same = (events["session"][1:] == events["session"][:-1]) & (events["button"][1:] == events["button"][:-1])
+    delta = t[1:] - t[:-1]
+    hold = same & (down[:-1] == 1) & (down[1:] == 0)
+    gap = same & (down[:-1] == 0) & (down[1:] == 1) & (delta < MAX_GAP)
+    group = events["group"][:-1]
+    return (delta[hold], group[hold]), (delta[gap], group[gap])
+
+
+def fit_mixture(values, bins=512, iterations=200, tolerance=1e-7):
+    """
+    Two log-normal populations fitted by EM: the short one (taps, gaps inside
+    a multi-tap) and the long one (holds, gaps between gestures). Runs on a
+    histogram of the log durations, so its cost doesn't grow with the sample.
+    Returns (weights, means, sigmas) of the log durations, short one first.
+    """
+    logs = np.log(np.maximum(values, 1e-4))
+    counts, edges = np.histogram(logs, bins)
+    x = (edges[:-1] + edges[1:]) / 2
+    total = counts.sum()
+    width = edges[1] - edges[0]
+
+    weights = np.array([0.5, 0.5])
+    means = np.percentile(logs, [25, 75]).astype(float)
+    sigmas = np.full(2, max(logs.std() / 2, width))
+    previous = -np.inf
+    for _ in range(iterations):
+        density = _densities(x, weights, means, sigmas)
+        mixture = np.maximum(density.sum(axis=1), 1e-300)
+        likelihood = (counts * np.log(mixture)).sum() / total
+        resp = density / mixture[:, None] * counts[:, None]
+        n = np.maximum(resp.sum(axis=0), 1e-12)
+        weights = n / total
+        means = (resp * x[:, None]).sum(axis=0) / n
+        # Never narrower than a bin, or one component can collapse onto it
+        sigmas = np.maximum(np.sqrt((resp * (x[:, None] - means) ** 2).sum(axis=0) / n), width)
+        if likelihood - previous < tolerance:
+            break
+        previous = likelihood
+    order = np.argsort(means)
+    return weights[order], means[order], sigmas[order]
+
+
+def _densities(logs, weights, means, sigmas):
+    z = (logs[:, None] - means) / sigmas
+    return weights * np.exp(-z * z / 2) / (sigmas * np.sqrt(2 * np.pi))
+
+
+def long_probability(values, mixture):
+    """How likely each value is to belong to the long population."""
+    density = _densities(np.log(np.maximum(values, 1e-4)), *mixture)
+    return density[:, 1] / np.maximum(density.sum(axis=1), 1e-300)
+
+
+def error_curve(values, p_long, grid=GRID):
+    """
+    Expected misclassification rate at every candidate threshold at once,
+    scored against each value's own label from the mixture fit: short
+    values that reach the threshold plus long ones that don't.
+    """
+    order = np.argsort(values)
+    values, p_long = values[order], p_long[order]
+    long_below = np.concatenate(([0.0], np.cumsum(p_long)))
+    short_below = np.concatenate(([0.0], np.cumsum(1 - p_long)))
+    below = np.searchsorted(values, grid)
+    wrong = (short_below[-1] - short_below[below]) + long_below[below]
+    return wrong / max(len(values), 1)
+
+
+def recommend(values, low, high, grid=GRID):
+    # Middle of the lowest-error plateau, inside the range the engine accepts
+    if len(values) < 2:
+        return None, None
+    errors = error_curve(values, long_probability(values, fit_mixture(values)), grid)
+    allowed = (grid >= low) & (grid <= high)
+    best = errors[allowed].min()
+    candidates = grid[allowed][errors[allowed] <= best + 1e-9]
+    return float(candidates[len(candidates) // 2]), float(best)
+
+
+def _percentiles(values):
+    if not len(values):
+        return None
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    return {"count": int(len(values)), "p5": round(p5, 3), "p50": round(p50, 3), "p95": round(p95, 3)}
+
+
+def _by_group(values, groups):
+    # Splits a sample by group id with one sort instead of a mask per group
+    order = np.argsort(groups, kind="stable")
+    ids, starts = np.unique(groups[order], return_index=True)
+    return dict(zip(ids.tolist(), np.split(values[order], starts[1:])))
+
+
+def analyze(events, labels):
+    """Per device/user report, plus recommended timing per device in config.json's format."""
+    (holds, hold_groups), (gaps, gap_groups) = extract_intervals(events)
+
+    report = {}
+    holds_by_group = _by_group(holds, hold_groups)
+    gaps_by_group = _by_group(gaps, gap_groups)
+    for group, (device, user) in labels.items():
+        group_holds = holds_by_group.get(group, np.empty(0))
+        group_gaps = gaps_by_group.get(group, np.empty(0))
+        threshold, hold_error = recommend(group_holds, MIN_LONG_PRESS_THRESHOLD, MAX_LONG_PRESS_THRESHOLD)
+        window, gap_error = recommend(group_gaps, MIN_MULTI_TAP_WINDOW, MAX_MULTI_TAP_WINDOW)
+        report.setdefault(device, {})[user] = {
+            "holds": _percentiles(group_holds),
+            "gaps": _percentiles(group_gaps),
+            "long_press_threshold": threshold,
+            "long_press_error": hold_error,
+            "multi_tap_window": window,
+            "multi_tap_error": gap_error,
+        }
+
+    # Config holds one setting per device, so pool that device's users
+    device_ids = {}
+    device_of_group = np.array([device_ids.setdefault(labels[g][0], len(device_ids)) for g in sorted(labels)])
+    timing = {}
+    device_holds = _by_group(holds, device_of_group[hold_groups]) if len(holds) else {}
+    device_gaps = _by_group(gaps, device_of_group[gap_groups]) if len(gaps) else {}
+    for device, index in device_ids.items():
+        threshold, _ = recommend(device_holds.get(index, np.empty(0)), MIN_LONG_PRESS_THRESHOLD, MAX_LONG_PRESS_THRESHOLD)
+        window, _ = recommend(device_gaps.get(index, np.empty(0)), MIN_MULTI_TAP_WINDOW, MAX_MULTI_TAP_WINDOW)
+        values = {}
+        if window is not None:
+            values["multi_tap_window"] = round(window, 3)
+        if threshold is not None:
+            values["long_press_threshold"] = round(threshold, 3)
+        if values:
+            timing[device] = values
+
+    return {"timing": timing, "report": report}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommend gesture timing from recorded sessions.")
+    parser.add_argument("sessions", nargs="+", help="session_*.bin files")
+    parser.add_argument("--write", action="store_true", help="store the recommended timing in config.json")
+    args = parser.parse_args(argv)
+
+    events, labels = load_sessions(args.sessions)
+    result = analyze(events, labels)
+    print(json.dumps(result, indent=4))
+
+    if args.write:
+        from .config_manager import ConfigManager
+        config = ConfigManager()
+        for device, timing in result["timing"].items():
+            config.set_timing(None if device == "default" else device, timing)
+        config.save_config()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import getpass
+import json
+import logging
+import os
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+SESSION_DIR = "sessions"
+FORMAT_VERSION = 1
+# timestamp (s, on the engine's monotonic timebase), button index into the header's "buttons", 1 = press / 0 = release
+RECORD = struct.Struct("<dBB")
+
+
+class SessionRecorder:
+    """
+    Records every press and release to a session file for offline threshold
+    tuning (see session_analysis.py). A file is one JSON header line followed
+    by fixed-size binary records, so millions of events load in one read.
+    """
+
+    def __init__(self, directory=SESSION_DIR):
+        self.directory = directory
+        self.path = None
+        self._file = None
+        self._buttons = {}
+
+    def open(self, device, buttons):
+        self.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, f"session_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.bin")
+        self._buttons = {button: i for i, button in enumerate(buttons)}
+        header = {
+            "format": FORMAT_VERSION,
+            "device": device,
+            "user": getpass.getuser(),
+            "buttons": list(buttons),
+            "started": time.time(),
+        }
+        try:
+            self._file = open(self.path, "wb")
+            self._file.write(json.dumps(header).encode("utf-8") + b"\n")
+        except OSError as e:
+            logger.error("Can't record session to %s: %s", self.path, e)
+            self._file = None
+
+    def record(self, button, is_down, timestamp):
+        # On the gesture path: one buffered write, flushed when the buffer fills
+        if self._file is not None:
+            self._file.write(RECORD.pack(timestamp, self._buttons.get(button, 255), is_down))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,607 @@
+"""
+Soak test: drives the gesture engine and the input debugger's log pipeline
+with hours of synthetic use in accelerated virtual time, and checks that
+memory, threads, OS handles and installed hooks stay flat:
+
+    python -m src.soak [--hours 8] [--seed 1] [--json]
+
+The engine runs on a virtual clock. Its scheduler has no thread of its own:
+multi-tap windows, holds, repeats and chord deadlines fire as the driver
+moves time forward, so an hour of use takes seconds. Everything else (the
+input queue, usage stats writer, hook watchdog, notifier) runs on its real
+threads. Hooks, injected actions and the Bluetooth link are in-process
+stand-ins, so a run can't type or play anything.
+
+Every snapshot interval of virtual time the traced Python heap
+(tracemalloc), thread count, handle count and hook count are sampled. The
+first sample after the warm-up is the baseline; the run fails if a later
+sample has grown past the limits.
+"""
+import argparse
+import copy
+import gc
+import heapq
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from . import gesture_engine
+from .actions import ActionManager
+from .config_manager import ConfigManager, DEFAULT_CONFIG
+from .debug_log import DebugLogBuffer, MAX_CHARS, TRIM_TO
+from .foreground_app import MockForegroundApp
+from .gesture_engine import GestureEngine, BUTTON_KEYS
+from .injector import Injector
+from .notifications import Notifier
+from .scheduler import Scheduler
+from .usage_stats import UsageStats
+
+SOAK_DEVICE = "Soak Buds"
+
+DEFAULT_HOURS = 8.0
+SNAPSHOT_INTERVAL = 30 * 60.0
+WARMUP = 60 * 60.0
+# The engine is restarted this often, as saving settings in the UI does (seconds)
+RELOAD_INTERVAL = 60 * 60.0
+# Mean virtual time between bursts of activity (seconds)
+MEAN_IDLE = 20.0
+# How long to wait for the engine to take an event before giving up (real seconds)
+SETTLE_TIMEOUT = 2.0
+# The UI flushes debug messages this long after the first of a batch
+LOG_FLUSH_DELAY = 0.1
+
+# Growth over the baseline that fails the run
+MAX_MEMORY_GROWTH_KB = 512
+MAX_THREAD_GROWTH = 0
+MAX_HANDLE_GROWTH = 8
+MAX_HOOK_GROWTH = 0
+
+
+class VirtualClock:
+    """A clock that only moves when the driver moves it."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+
+class VirtualScheduler(Scheduler):
+    """
+    Scheduler without a thread: run_until() runs due jobs on the caller's
+    thread in deadline order, setting the virtual clock to each deadline.
+    """
+
+    def __init__(self, clock):
+        super().__init__(clock)
+
+    def start(self):
+        with self._cond:
+            self._running = True
+
+    def run_until(self, deadline):
+        # Jobs run here count as the scheduler's own thread, so one that
+        # cancels itself doesn't wait on itself
+        self._thread = threading.current_thread()
+        while True:
+            with self._cond:
+                if not self._heap or self._heap[0][0] > deadline:
+                    break
+                due, _, job = heapq.heappop(self._heap)
+            if job.cancelled:
+                continue
+            self.clock.now = max(self.clock.now, due)
+            self._fire(job)
+        self.clock.now = max(self.clock.now, deadline)
+
+    def pending(self):
+        with self._cond:
+            return len(self._heap)
+
+
+class KeyEvent:
+    __slots__ = ("name", "scan_code", "event_type", "time")
+
+    def __init__(self, name, scan_code, event_type, time):
+        self.name = name
+        self.scan_code = scan_code
+        self.event_type = event_type
+        self.time = time
+
+
+class SoakKeyboard:
+    """
+    Stands in for the `keyboard` module: keeps hooks in a table, delivers
+    events to the matching ones, and counts events no hook took (those
+    would have reached the OS).
+    """
+
+    KEY_DOWN = "down"
+    KEY_UP = "up"
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.passed = 0
+        self.sent = 0
+        # handle -> (scan codes, is_down, callback)
+        self.hooks = {}
+        self._codes = {}
+        self._handles = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def key_to_scan_codes(self, name):
+        with self._lock:
+            return (self._codes.setdefault(name, 0x100 + len(self._codes)),)
+
+    def on_press_key(self, key, callback, suppress=False):
+        return self._hook(key, True, callback)
+
+    def on_release_key(self, key, callback, suppress=False):
+        return self._hook(key, False, callback)
+
+    def unhook(self, handle):
+        with self._lock:
+            del self.hooks[handle]
+
+    def send(self, key, do_press=True, do_release=True):
+        self.sent += 1
+        code = key if isinstance(key, int) else self.key_to_scan_codes(key)[0]
+        if do_press:
+            self.emit(code, True)
+        if do_release:
+            self.emit(code, False)
+
+    def emit(self, code, is_down):
+        event = KeyEvent(self._name(code), code, self.KEY_DOWN if is_down else self.KEY_UP, self.clock())
+        with self._lock:
+            callbacks = [callback for codes, down, callback in self.hooks.values() if code in codes and down == is_down]
+        if not callbacks:
+            self.passed += 1
+        for callback in callbacks:
+            callback(event)
+
+    def _hook(self, key, is_down, callback):
+        codes = frozenset(key) if isinstance(key, (tuple, list)) else frozenset(self.key_to_scan_codes(key))
+        with self._lock:
+            handle = next(self._handles)
+            self.hooks[handle] = (codes, is_down, callback)
+        return handle
+
+    def _name(self, code):
+        with self._lock:
+            for name, known in self._codes.items():
+                if known == code:
+                    return name
+        return None
+
+
+class _CountingBackend:
+    """Injection backend that only counts what it is given."""
+
+    def __init__(self):
+        self.batches = 0
+
+    def prepare(self, events):
+        return tuple(events)
+
+    def submit(self, prepared):
+        self.batches += 1
+        return len(prepared)
+
+
+class _CountingNotifications:
+    def __init__(self):
+        self.shown = 0
+
+    def show(self, key, title, message):
+        self.shown += 1
+
+
+class _SoakConnection:
+    """Connection the driver sets by hand instead of asking Bluetooth."""
+
+    def __init__(self, device):
+        self.device = device
+        self.connected = True
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def refresh(self):
+        pass
+
+
+class _SoakConfig(ConfigManager):
+    """In-memory config; never reads or writes config.json."""
+
+    def __init__(self, config):
+        self.config = config
+
+    def load_config(self):
+        return self.config
+
+    def save_config(self):
+        pass
+
+
+def soak_config():
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["target_device"] = SOAK_DEVICE
+    config["gestures"]["long_press_2"] = "Lock Screen"
+    config["button_gestures"] = {
+        "next_track": {"single_tap": "Next Track", "double_tap": "Previous Track"},
+        "volume_up": {"single_tap": "Volume Up", "long_press": "Volume Up"},
+    }
+    config["app_gestures"] = {"powerpnt.exe": {"play_pause": {"double_tap": "Next Track"}}}
+    config["chords"] = {"play_pause+volume_up": "Lock Screen"}
+    config["device_debounce_ms"] = {SOAK_DEVICE: 30}
+    config["options"].update(repeat_long_press=True, record_sessions=False, usage_stats=True, notifications=True)
+    return config
+
+
+def handle_count():
+    """Open handles (Windows) or file descriptors of this process; None if unknown."""
+    if platform.system() == "Windows":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        count = ctypes.c_ulong()
+        if kernel32.GetProcessHandleCount(kernel32.GetCurrentProcess(), ctypes.byref(count)):
+            return count.value
+        return None
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def check_growth(snapshots, warmup=WARMUP, limits=None):
+    """
+    Compares every snapshot taken after the warm-up with the first of them.
+    Returns (baseline, failures), failures being readable descriptions.
+    """
+    limits = dict(default_limits(), **(limits or {}))
+    settled = [s for s in snapshots if s["virtual_s"] >= warmup]
+    if not settled:
+        return None, ["no snapshot after the warm-up; run longer"]
+    baseline = settled[0]
+    failures = []
+    for snapshot in settled[1:]:
+        for field, limit in limits.items():
+            if baseline[field] is None or snapshot[field] is None:
+                continue
+            growth = snapshot[field] - baseline[field]
+            if growth > limit:
+                failures.append(f"{field} grew by {round(growth, 1)} (limit {limit}) "
+                                f"at {snapshot['virtual_s'] / 3600:.1f}h")
+    return baseline, failures
+
+
+def default_limits():
+    return {
+        "memory_kb": MAX_MEMORY_GROWTH_KB,
+        "threads": MAX_THREAD_GROWTH,
+        "handles": MAX_HANDLE_GROWTH,
+        "hooks": MAX_HOOK_GROWTH,
+    }
+
+
+class SoakRun:
+    """One soak run: the engine, its stand-ins and the synthetic user driving them."""
+
+    def __init__(self, hours=DEFAULT_HOURS, seed=1, snapshot_interval=SNAPSHOT_INTERVAL,
+                 warmup=WARMUP, limits=None, usage_dir=None):
+        self.duration = hours * 3600
+        self.snapshot_interval = snapshot_interval
+        self.warmup = warmup
+        self.limits = limits
+        self.rng = random.Random(seed)
+
+        self.clock = VirtualClock()
+        self.scheduler = VirtualScheduler(self.clock)
+        self.keyboard = SoakKeyboard(self.clock)
+        self.injected = _CountingBackend()
+        self.notifications = _CountingNotifications()
+        self.foreground = MockForegroundApp()
+        self.config = _SoakConfig(soak_config())
+        self.usage_dir = usage_dir
+
+        # Debugger pipeline: listener messages into the buffer, flushed into
+        # a text that is trimmed like the UI's debug log box
+        self.log = DebugLogBuffer(self._schedule_log_flush)
+        self.log_text = ""
+        self._flush_at = None
+
+        self.edges = 0
+        self.gestures = 0
+        self.reloads = 0
+        self.snapshots = []
+        self._baseline_heap = None
+        self._last_heap = None
+        self.engine = None
+
+    def run(self):
+        started = time.perf_counter()
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        real_keyboard = gesture_engine.keyboard
+        gesture_engine.keyboard = self.keyboard
+        usage_dir = None
+        if self.usage_dir is None:
+            usage_dir = tempfile.TemporaryDirectory()
+        try:
+            self._start_engine(self.usage_dir or usage_dir.name)
+            try:
+                self._drive()
+            finally:
+                self.engine.stop()
+        finally:
+            gesture_engine.keyboard = real_keyboard
+            if usage_dir is not None:
+                usage_dir.cleanup()
+            if not was_tracing:
+                tracemalloc.stop()
+        return self._report(time.perf_counter() - started)
+
+    def _start_engine(self, usage_dir):
+        engine = GestureEngine(self.config, foreground=self.foreground, scheduler=self.scheduler)
+        engine.actions = ActionManager(Injector(self.injected))
+        engine.connection = _SoakConnection(SOAK_DEVICE)
+        engine.notifier = Notifier(self.notifications)
+        # Usage records are stamped on a virtual wall clock, so long runs roll over days
+        wall = time.time()
+        engine.usage = UsageStats(usage_dir, clock=lambda: wall + self.clock())
+        engine.on_gesture = self._on_gesture
+        self.engine = engine
+        engine.start()
+        self.codes = {button: self.keyboard.key_to_scan_codes(names[0])[0] for button, names in BUTTON_KEYS.items()}
+
+    def _drive(self):
+        activities = [
+            (self._tap, 30), (self._double_tap, 15), (self._triple_tap, 5),
+            (self._long_press, 10), (self._long_press_2, 5), (self._volume_hold, 5),
+            (self._chord, 5), (self._chatter, 5), (self._orphan_release, 2),
+            (self._next_track, 8), (self._switch_app, 5), (self._connection_drop, 2),
+            (self._debugger_burst, 3),
+        ]
+        actions, weights = zip(*activities)
+        t = 0.0
+        next_snapshot = 0.0
+        next_reload = RELOAD_INTERVAL
+        while True:
+            t += self.rng.expovariate(1 / MEAN_IDLE)
+            while next_snapshot <= min(t, self.duration):
+                self._advance(next_snapshot)
+                self._snapshot()
+                next_snapshot += self.snapshot_interval
+            if t >= self.duration:
+                break
+            if t >= next_reload:
+                self._advance(t)
+                self.engine.reload()
+                self.reloads += 1
+                next_reload += RELOAD_INTERVAL
+            t = self.rng.choices(actions, weights)[0](t)
+        self._advance(self.duration)
+
+    # Synthetic use. Each activity starts at `t` and returns when it ended.
+
+    def _tap(self, t, button="play_pause"):
+        self._edge(t, button, True)
+        self._edge(t + self.rng.uniform(0.05, 0.15), button, False)
+        return t + 0.2
+
+    def _double_tap(self, t):
+        self._tap(t)
+        return self._tap(t + self.rng.uniform(0.18, 0.3))
+
+    def _triple_tap(self, t):
+        t = self._double_tap(t)
+        return self._tap(t + 0.05)
+
+    def _hold(self, t, duration, button="play_pause"):
+        self._edge(t, button, True)
+        self._edge(t + duration, button, False)
+        return t + duration
+
+    def _long_press(self, t):
+        return self._hold(t, self.rng.uniform(0.7, 1.2))
+
+    def _long_press_2(self, t):
+        return self._hold(t, self.rng.uniform(1.6, 2.5))
+
+    def _volume_hold(self, t):
+        return self._hold(t, self.rng.uniform(1.0, 4.0), "volume_up")
+
+    def _chord(self, t):
+        self._edge(t, "play_pause", True)
+        self._edge(t + 0.02, "volume_up", True)
+        self._edge(t + 0.15, "play_pause", False)
+        self._edge(t + 0.16, "volume_up", False)
+        return t + 0.2
+
+    def _chatter(self, t):
+        # The release and a short press resent right after it, as cheap earbuds do
+        self._edge(t, "play_pause", True)
+        self._edge(t + 0.08, "play_pause", False)
+        self._edge(t + 0.083, "play_pause", True)
+        self._edge(t + 0.085, "play_pause", False)
+        return t + 0.1
+
+    def _orphan_release(self, t):
+        self._edge(t, "play_pause", False)
+        return t
+
+    def _next_track(self, t):
+        return self._tap(t, "next_track")
+
+    def _switch_app(self, t):
+        self.foreground.set_app(self.rng.choice(["powerpnt.exe", "chrome.exe", None]))
+        return t
+
+    def _connection_drop(self, t):
+        # Presses that race the disconnect are re-emitted by the still
+        # installed hooks; once unhooked they go straight to the OS
+        connection = self.engine.connection
+        connection.connected = False
+        t = self._tap(t)
+        self.engine._on_connection_change(False)
+        t = self._tap(t + self.rng.uniform(5, 60))
+        self._advance(t + 1)
+        connection.connected = True
+        self.engine._on_connection_change(True)
+        return t + 1
+
+    def _debugger_burst(self, t):
+        # A second of HID reports, as a gamepad or a chatty device sends them
+        for i in range(200):
+            self._advance(t + i * 0.005)
+            self.log.append(f"[Raw HID/Consumer] Count: 1, Size: 3, Data: 01 {i % 256:02X} 00 (+0.4 ms)\n")
+        return t + 1
+
+    # Plumbing
+
+    def _edge(self, t, button, is_down):
+        self._advance(t)
+        code = self.codes[button]
+        self.keyboard.emit(code, is_down)
+        self.log.append(f"[Raw Keyboard] MakeCode: {code}, VKey: 0, Message: {256 if is_down else 257} (+0.0 ms)\n")
+        self.edges += 1
+        self._settle()
+
+    def _settle(self):
+        # Wait until the engine's input thread has taken every queued event
+        queue = self.engine.input
+        deadline = time.monotonic() + SETTLE_TIMEOUT
+        while queue.processed < queue.pushed - queue.collapsed - queue.dropped:
+            if time.monotonic() > deadline:
+                raise RuntimeError("The engine stopped taking input events")
+            time.sleep(0.0002)
+
+    def _advance(self, t):
+        if self._flush_at is not None and self._flush_at <= t:
+            self.scheduler.run_until(self._flush_at)
+            self._flush_at = None
+            self._flush_log()
+        self.scheduler.run_until(t)
+
+    def _schedule_log_flush(self):
+        self._flush_at = self.clock() + LOG_FLUSH_DELAY
+
+    def _flush_log(self):
+        self.log_text += self.log.drain()
+        if len(self.log_text) > MAX_CHARS:
+            self.log_text = self.log_text[-TRIM_TO:]
+
+    def _on_gesture(self, gesture, action):
+        self.gestures += 1
+
+    def _snapshot(self):
+        gc.collect()
+        heap = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            # The run's own bookkeeping (snapshots, counters) isn't the app's
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        if self._baseline_heap is None and self.clock() >= self.warmup:
+            self._baseline_heap = heap
+        self._last_heap = heap
+        self.snapshots.append({
+            "virtual_s": self.clock(),
+            "memory_kb": round(sum(stat.size for stat in heap.statistics("filename")) / 1024, 1),
+            "threads": threading.active_count(),
+            "handles": handle_count(),
+            "hooks": len(self.keyboard.hooks),
+            "scheduled": self.scheduler.pending(),
+            "log_pending": len(self.log),
+        })
+
+    def _report(self, real_seconds):
+        baseline, failures = check_growth(self.snapshots, self.warmup, self.limits)
+        growth = {}
+        top_growth = []
+        if baseline is not None:
+            last = self.snapshots[-1]
+            growth = {field: None if baseline[field] is None else round(last[field] - baseline[field], 1)
+                      for field in default_limits()}
+            # Where the heap grew most, to start the hunt from
+            for stat in self._last_heap.compare_to(self._baseline_heap, "lineno")[:5]:
+                if stat.size_diff > 0:
+                    top_growth.append(f"{stat.traceback}: +{stat.size_diff / 1024:.1f} KiB")
+        return {
+            "virtual_hours": round(self.clock() / 3600, 2),
+            "real_seconds": round(real_seconds, 1),
+            "edges": self.edges,
+            "gestures": self.gestures,
+            "injected": self.injected.batches,
+            "notifications": self.notifications.shown,
+            "reloads": self.reloads,
+            "engine": self.engine.hook_stats(),
+            "snapshots": self.snapshots,
+            "baseline": baseline,
+            "growth": growth,
+            "top_growth": top_growth,
+            "failures": failures,
+            "passed": not failures,
+        }
+
+
+def run_soak(hours=DEFAULT_HOURS, seed=1, snapshot_interval=SNAPSHOT_INTERVAL, warmup=WARMUP, limits=None):
+    """Runs a soak of `hours` virtual hours and returns its report."""
+    return SoakRun(hours, seed, snapshot_interval, warmup, limits).run()
+
+
+def format_report(report):
+    lines = [
+        f"{report['virtual_hours']}h of virtual time in {report['real_seconds']}s: "
+        f"{report['edges']} key edges, {report['gestures']} gestures, {report['reloads']} restarts",
+        "hours   memory_kb  threads  handles  hooks  scheduled",
+    ]
+    for s in report["snapshots"]:
+        lines.append(f"{s['virtual_s'] / 3600:<7.1f} {s['memory_kb']:<10} {s['threads']:<8} "
+                     f"{str(s['handles']):<8} {s['hooks']:<6} {s['scheduled']}")
+    if report["growth"]:
+        lines.append("Growth since baseline: " + ", ".join(f"{k} {v}" for k, v in report["growth"].items()))
+    lines.extend("  " + line for line in report["top_growth"])
+    lines.extend("FAIL: " + failure for failure in report["failures"])
+    lines.append("PASS" if report["passed"] else "FAILED")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak test the gesture engine in accelerated virtual time.")
+    parser.add_argument("--hours", type=float, default=DEFAULT_HOURS, help="virtual hours to run")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the synthetic input")
+    parser.add_argument("--snapshot-minutes", type=float, default=SNAPSHOT_INTERVAL / 60,
+                        help="virtual minutes between snapshots")
+    parser.add_argument("--warmup-minutes", type=float, default=WARMUP / 60,
+                        help="virtual minutes before the baseline snapshot")
+    parser.add_argument("--max-memory-kb", type=float, default=MAX_MEMORY_GROWTH_KB)
+    parser.add_argument("--max-threads", type=int, default=MAX_THREAD_GROWTH)
+    parser.add_argument("--max-handles", type=int, default=MAX_HANDLE_GROWTH)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_soak(args.hours, args.seed, args.snapshot_minutes * 60, args.warmup_minutes * 60, {
+        "memory_kb": args.max_memory_kb, "threads": args.max_threads, "handles": args.max_handles,
+    })
+    print(json.dumps(report, indent=4) if args.json else format_report(report))
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import collections
+import time
+
+# Offset samples are kept as the smallest delay seen per window, for this many
+# windows; drift is fitted across them (seconds, count)
+WINDOW = 10.0
+WINDOWS = 30
+# A source timestamp further than this from where the fit expects it means
+# the source clock was changed (e.g. the wall clock was set), so start over
+RESYNC = 1.0
+# Weight of a new sample in the mean delay
+DELAY_SMOOTHING = 0.05
+
+
+class Timebase:
+    """
+    Maps one input source's event timestamps onto time.monotonic(), the clock
+    the engine and scheduler run on, so gesture timing follows when the input
+    happened rather than when the callback got to run.
+
+    Every event gives a sample of (callback time - source time), which is the
+    clock offset plus that event's delivery delay. The smallest samples are the
+    ones with the least delay, so the offset is the lower envelope of the
+    samples: a line fitted through the smallest sample of each WINDOW (its
+    slope is the drift between the clocks), lowered until it sits under every
+    retained sample. Mapped times are never later than the callback itself.
+    """
+
+    def __init__(self, name, scale=1.0, wrap=None, window=WINDOW, windows=WINDOWS, clock=time.monotonic):
+        self.name = name
+        # Source units to seconds (e.g. 0.001 for millisecond ticks)
+        self.scale = scale
+        # Raw value at which the source counter wraps around, if it does
+        self.wrap = wrap
+        self.window = window
+        self.clock = clock
+
+        self.samples = 0
+        self.resyncs = 0
+        self.last_delay = 0.0
+        self.mean_delay = 0.0
+        self.max_delay = 0.0
+
+        self._minima = collections.deque(maxlen=windows)
+        self._last_raw = None
+        self._epoch = 0
+        self._reset()
+
+    def map(self, source_time, received=None):
+        """
+        Returns the monotonic time of an event stamped `source_time` by its
+        source, received (seen by the callback) at monotonic `received`.
+        Events without a usable timestamp map to when they were received.
+        """
+        if received is None:
+            received = self.clock()
+        if not isinstance(source_time, (int, float)) or isinstance(source_time, bool):
+            return received
+
+        # Relative to the first sample, so the fit works on small numbers
+        absolute = self._unwrap(source_time) * self.scale
+        if self._origin is None:
+            self._origin = absolute
+        x = absolute - self._origin
+        sample = received - x
+
+        if self._intercept is not None and abs(sample - self._offset(x)) > RESYNC:
+            self.resyncs += 1
+            self._reset()
+            self._origin = absolute
+            x = 0.0
+            sample = received
+
+        self._add(x, sample)
+        mapped = min(x + self._offset(x), received)
+
+        delay = received - mapped
+        self.samples += 1
+        self.last_delay = delay
+        self.mean_delay += (delay - self.mean_delay) * (1.0 if self.samples == 1 else DELAY_SMOOTHING)
+        if delay > self.max_delay:
+            self.max_delay = delay
+        return mapped
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "delay_ms": round(self.mean_delay * 1000, 2),
+            "max_delay_ms": round(self.max_delay * 1000, 2),
+            # How much faster the source clock runs than the monotonic one
+            "drift_ppm": round(-self._drift * 1e6, 1),
+            "resyncs": self.resyncs,
+        }
+
+    def _unwrap(self, value):
+        if self.wrap:
+            if self._last_raw is not None and value < self._last_raw - self.wrap / 2:
+                self._epoch += self.wrap
+            self._last_raw = value
+        return value + self._epoch
+
+    def _reset(self):
+        self._minima.clear()
+        self._origin = None
+        self._window_start = None
+        self._window_min = None
+        self._drift = 0.0
+        self._intercept = None
+
+    def _offset(self, x):
+        return self._intercept + self._drift * x
+
+    def _add(self, x, sample):
+        if self._window_start is None or x - self._window_start >= self.window:
+            if self._window_min is not None:
+                self._minima.append(self._window_min)
+            self._window_start = x
+            self._window_min = (x, sample)
+            self._fit()
+        elif sample < self._window_min[1]:
+            self._window_min = (x, sample)
+
+        # Lower the line under this sample if it is the least delayed yet
+        below = sample - self._drift * x
+        if self._intercept is None or below < self._intercept:
+            self._intercept = below
+
+    def _fit(self):
+        # Least squares through the window minima, then down to the lowest one.
+        # Only runs when a window closes, so map() stays cheap.
+        points = list(self._minima) + [self._window_min]
+        if len(points) >= 2:
+            n = len(points)
+            mean_x = sum(p[0] for p in points) / n
+            mean_y = sum(p[1] for p in points) / n
+            var = sum((p[0] - mean_x) ** 2 for p in points)
+            if var > 0:
+                self._drift = sum((p[0] - mean_x) * (p[1] - mean_y) for p in points) / var
+        self._intercept = min(p[1] - self._drift * p[0] for p in points)
@@ -0,0 +1,130 @@
+import itertools
+import json
+import os
+import threading
+import time
+
+# Number of events kept; once full, the oldest events are overwritten
+DEFAULT_CAPACITY = 65536
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.tracer.begin(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer.end(self.name)
+        return False
+
+
+class Tracer:
+    """
+    Records begin/end spans of the input-to-action pipeline into a preallocated
+    ring buffer and exports them as Chrome trace-event JSON (loads in Perfetto
+    and chrome://tracing).
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.enabled = False
+        self.capacity = capacity
+        self._events = [None] * capacity
+        self._counter = itertools.count()
+        self._thread_names = {}
+
+    def enable(self):
+        self.clear()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self._events = [None] * self.capacity
+        self._counter = itertools.count()
+        self._thread_names = {}
+
+    def _record(self, phase, name, ts, dur=0):
+        # next() on itertools.count is atomic, so writers never share a slot
+        tid = threading.get_ident()
+        if tid not in self._thread_names:
+            self._thread_names[tid] = threading.current_thread().name
+        self._events[next(self._counter) % self.capacity] = (phase, name, ts, tid, dur)
+
+    def begin(self, name):
+        if self.enabled:
+            self._record("B", name, time.perf_counter_ns())
+
+    def end(self, name):
+        if self.enabled:
+            self._record("E", name, time.perf_counter_ns())
+
+    def instant(self, name):
+        if self.enabled:
+            self._record("i", name, time.perf_counter_ns())
+
+    def complete(self, name, start_ns):
+        # For waits that start on one thread and finish on another (e.g. the tap timer)
+        if self.enabled and start_ns:
+            now = time.perf_counter_ns()
+            self._record("X", name, start_ns, now - start_ns)
+
+    def now(self):
+        # Start mark for complete(); 0 when disabled so nothing is recorded later
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def to_chrome_trace(self):
+        events = [e for e in self._events if e is not None]
+        events.sort(key=lambda e: e[2])
+
+        pid = os.getpid()
+        trace_events = []
+        for tid, thread_name in self._thread_names.items():
+            trace_events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                                 "args": {"name": thread_name}})
+
+        for phase, name, ts, tid, dur in events:
+            event = {"name": name, "cat": name.split(".")[0], "ph": phase,
+                     "ts": ts / 1000.0, "pid": pid, "tid": tid}
+            if phase == "X":
+                event["dur"] = dur / 1000.0
+            elif phase == "i":
+                event["s"] = "t"
+            trace_events.append(event)
+
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
+
+
+# Process-wide tracer used by the engine, actions and UI
+tracer = Tracer()
+
+
+def span(name):
+    # Hot path: a single attribute check when tracing is off
+    if not tracer.enabled:
+        return _NULL_SPAN
+    return _Span(tracer, name)
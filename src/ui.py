@@ -1,4 +1,5 @@
 import customtkinter as ctk
+import logging
 import threading
 import time
 import keyboard
@@ -11,8 +12,29 @@ except ImportError:
 # Import our new lightweight Raw Input Monitor
 from .win_raw_input import RawInputMonitor, enumerate_devices
 
-from .config_manager import ConfigManager
+from .config_manager import PRIMARY_BUTTON
 from .bluetooth_manager import BluetoothManager
+from .debug_log import DebugLogBuffer, MAX_CHARS, TRIM_TO
+from .timebase import Timebase
+from . import usage_stats
+
+logger = logging.getLogger(__name__)
+
+# Remappable buttons, as shown in the gesture settings
+BUTTON_LABELS = {
+    "play_pause": "Play / Pause",
+    "next_track": "Next Track",
+    "previous_track": "Previous Track",
+    "volume_up": "Volume Up",
+    "volume_down": "Volume Down",
+}
+GESTURES = ("single_tap", "double_tap", "triple_tap", "long_press", "long_press_2")
+
+# Other threads never call into Tk; they raise flags that the Tk thread picks
+# up this often (ms): quickly while the debugger is open or messages wait,
+# otherwise only to follow engine status changes
+LOG_FLUSH_INTERVAL = 100
+STATUS_POLL_INTERVAL = 1000
 
 ctk.set_appearance_mode("System")
 ctk.set_default_color_theme("blue")
@@ -27,7 +49,7 @@ class BluetoothBudsControlApp(ctk.CTk):
         self.on_save_callback = on_save_callback
 
         self.title("Bluetooth Buds Control")
-        self.geometry("600x700")
+        self.geometry("600x860")
         self.resizable(False, False)
 
         # Tab Control
@@ -36,6 +58,7 @@ class BluetoothBudsControlApp(ctk.CTk):
 
         self.settings_tab = self.tab_view.add("Settings")
         self.debug_tab = self.tab_view.add("Input Debugger")
+        self.stats_tab = self.tab_view.add("Statistics")
 
         # --- Settings Tab ---
         self._create_header(self.settings_tab)
@@ -47,14 +70,20 @@ class BluetoothBudsControlApp(ctk.CTk):
         # --- Debug Tab ---
         self._create_debug_tab(self.debug_tab)
 
+        # --- Statistics Tab ---
+        self._create_stats_tab(self.stats_tab)
+
         # Status Bar (global)
         self._create_status_bar()
 
         # Load initial values
         self._load_values()
 
-        # Start status update loop
-        self.after(2000, self._update_status)
+        # The status bar follows the engine: it is redrawn when the engine
+        # reports a change (connection, hook health, gestures), see _pump
+        self._status_pending = threading.Event()
+        self.gesture_engine.on_status = self._status_pending.set
+        self.after_idle(self._update_status)
 
         # Debug state
         self.is_debugging = False
@@ -62,15 +91,18 @@ class BluetoothBudsControlApp(ctk.CTk):
         self.mouse_listener = None
         self.gamepad_thread = None
         self.stop_gamepad_thread = False
+        # Gamepad events carry their own timestamps; shown with how late they arrived
+        self.gamepad_timebase = Timebase("gamepad")
 
-        # Log Queue
-        self.log_queue = []
-        self.log_lock = threading.Lock()
-        self.after(100, self._process_log_queue)
+        # Debug messages from listener threads, flushed by _pump
+        self._log_pending = threading.Event()
+        self.log_buffer = DebugLogBuffer(self._log_pending.set)
 
         # Raw Input Monitor
         self.raw_monitor = RawInputMonitor(self._queue_debug_log)
 
+        self.after(LOG_FLUSH_INTERVAL, self._pump)
+
     def _create_header(self, parent):
         header_frame = ctk.CTkFrame(parent, fg_color="transparent")
         header_frame.pack(fill="x", pady=(0, 20))
@@ -121,10 +153,21 @@ class BluetoothBudsControlApp(ctk.CTk):
         title_label = ctk.CTkLabel(self.gesture_frame, text="Gesture Settings", font=("Arial", 14, "bold"))
         title_label.pack(anchor="w", padx=10, pady=(10, 5))
 
+        # Gestures are edited per button; the dropdowns below show the selected one
+        button_frame = ctk.CTkFrame(self.gesture_frame, fg_color="transparent")
+        button_frame.pack(fill="x", padx=10, pady=5)
+        ctk.CTkLabel(button_frame, text="🎛️ Button", width=120, anchor="w").pack(side="left")
+        self.selected_button = PRIMARY_BUTTON
+        self.button_var = ctk.StringVar(value=BUTTON_LABELS[PRIMARY_BUTTON])
+        self.button_dropdown = ctk.CTkOptionMenu(button_frame, variable=self.button_var, values=list(BUTTON_LABELS.values()), command=self._on_button_selected)
+        self.button_dropdown.pack(side="right", fill="x", expand=True)
+        self.pending_gestures = {}
+
         self.single_tap_var = self._create_gesture_row(self.gesture_frame, "👆 Single Tap", "single_tap")
         self.double_tap_var = self._create_gesture_row(self.gesture_frame, "✌️ Double Tap", "double_tap")
         self.triple_tap_var = self._create_gesture_row(self.gesture_frame, "🤟 Triple Tap", "triple_tap")
         self.long_press_var = self._create_gesture_row(self.gesture_frame, "🔒 Long Press", "long_press")
+        self.long_press_2_var = self._create_gesture_row(self.gesture_frame, "⏳ Longer Hold", "long_press_2")
 
     def _create_gesture_row(self, parent, label_text, config_key):
         row_frame = ctk.CTkFrame(parent, fg_color="transparent")
@@ -133,8 +176,8 @@ class BluetoothBudsControlApp(ctk.CTk):
         label = ctk.CTkLabel(row_frame, text=label_text, width=120, anchor="w")
         label.pack(side="left")
 
-        from .actions import ActionManager
-        actions = ActionManager().get_available_actions()
+        # Ask the engine's ActionManager, which also knows the configured commands
+        actions = self.gesture_engine.actions.get_available_actions()
 
         var = ctk.StringVar()
         dropdown = ctk.CTkOptionMenu(row_frame, variable=var, values=actions)
@@ -142,6 +185,29 @@ class BluetoothBudsControlApp(ctk.CTk):
 
         return var
 
+    def _gesture_vars(self):
+        return {
+            "single_tap": self.single_tap_var,
+            "double_tap": self.double_tap_var,
+            "triple_tap": self.triple_tap_var,
+            "long_press": self.long_press_var,
+            "long_press_2": self.long_press_2_var,
+        }
+
+    def _store_button_gestures(self):
+        self.pending_gestures[self.selected_button] = {g: var.get() for g, var in self._gesture_vars().items()}
+
+    def _show_button_gestures(self, button):
+        self.selected_button = button
+        gestures = self.pending_gestures.get(button, {})
+        for gesture, var in self._gesture_vars().items():
+            var.set(gestures.get(gesture) or "None")
+
+    def _on_button_selected(self, label):
+        button = next(b for b, l in BUTTON_LABELS.items() if l == label)
+        self._store_button_gestures()
+        self._show_button_gestures(button)
+
     def _create_options(self, parent):
         self.options_frame = ctk.CTkFrame(parent)
         self.options_frame.pack(fill="x", pady=(0, 20))
@@ -157,6 +223,14 @@ class BluetoothBudsControlApp(ctk.CTk):
         self.start_check = ctk.CTkCheckBox(self.options_frame, text="Start with Windows", variable=self.start_var)
         self.start_check.pack(anchor="w", padx=10, pady=5)
 
+        self.repeat_var = ctk.BooleanVar()
+        self.repeat_check = ctk.CTkCheckBox(self.options_frame, text="Repeat Long Press Action While Held (Scroll / Volume)", variable=self.repeat_var)
+        self.repeat_check.pack(anchor="w", padx=10, pady=5)
+
+        self.hold_release_var = ctk.BooleanVar()
+        self.hold_release_check = ctk.CTkCheckBox(self.options_frame, text="Fire Long Press on Release (unless Held Longer)", variable=self.hold_release_var)
+        self.hold_release_check.pack(anchor="w", padx=10, pady=5)
+
     def _create_footer(self, parent):
         footer_frame = ctk.CTkFrame(parent, fg_color="transparent")
         footer_frame.pack(fill="x", pady=10)
@@ -179,11 +253,14 @@ class BluetoothBudsControlApp(ctk.CTk):
         self.log_mouse_click_var = ctk.BooleanVar(value=True)
         self.log_kbd_var = ctk.BooleanVar(value=True)
         self.log_hid_var = ctk.BooleanVar(value=True)
+        # Mirrors log_hid_var for the gamepad thread, which waits on it
+        self.hid_logging = threading.Event()
+        self.hid_logging.set()
 
         ctk.CTkCheckBox(filter_frame, text="Mouse Move", variable=self.log_mouse_move_var).pack(side="left", padx=5)
         ctk.CTkCheckBox(filter_frame, text="Mouse Click", variable=self.log_mouse_click_var).pack(side="left", padx=5)
         ctk.CTkCheckBox(filter_frame, text="Keyboard", variable=self.log_kbd_var).pack(side="left", padx=5)
-        ctk.CTkCheckBox(filter_frame, text="HID/Raw", variable=self.log_hid_var).pack(side="left", padx=5)
+        ctk.CTkCheckBox(filter_frame, text="HID/Raw", variable=self.log_hid_var, command=self._toggle_hid_logging).pack(side="left", padx=5)
 
         control_frame = ctk.CTkFrame(parent, fg_color="transparent")
         control_frame.pack(fill="x", pady=5)
@@ -197,10 +274,54 @@ class BluetoothBudsControlApp(ctk.CTk):
         self.clear_debug_btn = ctk.CTkButton(control_frame, text="Clear Log", command=self._clear_debug_log, fg_color="gray")
         self.clear_debug_btn.pack(pady=5)
 
+        # Pipeline tracing (hook -> engine -> action), exported for Perfetto / chrome://tracing
+        trace_frame = ctk.CTkFrame(parent, fg_color="transparent")
+        trace_frame.pack(fill="x", pady=5)
+
+        self.trace_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(trace_frame, text="Trace Pipeline", variable=self.trace_var, command=self._toggle_trace).pack(side="left", padx=5)
+
+        self.export_trace_btn = ctk.CTkButton(trace_frame, text="Export Trace", command=self._export_trace, fg_color="gray")
+        self.export_trace_btn.pack(side="right", padx=5)
+
         self.debug_log = ctk.CTkTextbox(parent, width=500, height=350)
         self.debug_log.pack(pady=10, fill="both", expand=True)
         self.debug_log.insert("0.0", "Logs will appear here...\n")
 
+    def _create_stats_tab(self, parent):
+        control_frame = ctk.CTkFrame(parent, fg_color="transparent")
+        control_frame.pack(fill="x", pady=5)
+
+        self.stats_days_var = ctk.StringVar(value="Last 30 days")
+        ctk.CTkOptionMenu(control_frame, variable=self.stats_days_var,
+                          values=["Today", "Last 7 days", "Last 30 days", "All"],
+                          command=lambda _: self._refresh_stats()).pack(side="left", padx=5)
+        ctk.CTkButton(control_frame, text="Refresh", command=self._refresh_stats, fg_color="gray").pack(side="right", padx=5)
+
+        self.stats_text = ctk.CTkTextbox(parent, width=500, height=500, font=("Consolas", 12))
+        self.stats_text.pack(pady=10, fill="both", expand=True)
+        self._refresh_stats()
+
+    def _refresh_stats(self):
+        days = {"Today": 1, "Last 7 days": 7, "Last 30 days": 30, "All": None}[self.stats_days_var.get()]
+        stats = usage_stats.query(days=days)
+
+        lines = []
+        if not stats:
+            lines.append("No gestures recorded yet." if self.config.get_option("usage_stats")
+                         else 'Usage stats are off ("usage_stats" in config.json).')
+        else:
+            lines.append(f"{'Gesture':<28}{'Count':>7}{'p50 ms':>9}{'p95 ms':>9}  Missed")
+            for gesture, entry in sorted(stats.items(), key=lambda item: -item[1]["count"]):
+                outcomes = entry["outcomes"]
+                missed = ", ".join(f"{outcomes[o]} {o}" for o in ("unmapped", "reclassified", "passthrough") if outcomes.get(o))
+                lines.append(f"{gesture:<28}{entry['count']:>7}{entry['p50_ms'] or '-':>9}{entry['p95_ms'] or '-':>9}  {missed}")
+
+        self.stats_text.configure(state="normal")
+        self.stats_text.delete("1.0", "end")
+        self.stats_text.insert("1.0", "\n".join(lines) + "\n")
+        self.stats_text.configure(state="disabled")
+
     def _toggle_debug(self):
         if not self.is_debugging:
             self.is_debugging = True
@@ -254,32 +375,62 @@ class BluetoothBudsControlApp(ctk.CTk):
             self.mouse_listener = None
 
         self.stop_gamepad_thread = True
+        # Let a gamepad thread waiting for HID logging see the stop
+        self.hid_logging.set()
 
         if self.raw_monitor:
             self.raw_monitor.stop()
 
     # --- Callbacks ---
     def _queue_debug_log(self, msg):
-        with self.log_lock:
-            self.log_queue.append(msg)
+        self.log_buffer.append(msg)
+
+    def _pump(self):
+        # On the Tk thread: handles what engine and listener threads flagged
+        if self._status_pending.is_set():
+            self._status_pending.clear()
+            self._on_engine_status()
+        if self._log_pending.is_set():
+            # Cleared first: a message arriving during the drain flags again
+            self._log_pending.clear()
+            self._process_log_queue()
+        busy = self.is_debugging or self._log_pending.is_set()
+        self.after(LOG_FLUSH_INTERVAL if busy else STATUS_POLL_INTERVAL, self._pump)
+
+    def _on_engine_status(self):
+        # Gestures reported by the engine process
+        for event in self.gesture_engine.poll_events():
+            self._queue_debug_log(f"[Engine] {event}\n")
+        self._update_status()
 
     def _process_log_queue(self):
-        with self.log_lock:
-            if self.log_queue:
-                # Flush all messages
-                text = "".join(self.log_queue)
-                self.log_queue.clear()
+        # Flush all messages
+        text = self.log_buffer.drain()
+        if text:
+            # Update UI
+            self.debug_log.insert("end", text)
+            self.debug_log.see("end")
 
-                # Update UI
-                self.debug_log.insert("end", text)
-                self.debug_log.see("end")
+            # Trim buffer if too long
+            content = self.debug_log.get("1.0", "end")
+            if len(content) > MAX_CHARS:
+                self.debug_log.delete("1.0", f"end-{TRIM_TO}c") # Delete oldest chars
 
-                # Trim buffer if too long
-                content = self.debug_log.get("1.0", "end")
-                if len(content) > 50000: # Max characters
-                    self.debug_log.delete("1.0", "end-10000c") # Delete oldest chars
+    def _toggle_trace(self):
+        if self.trace_var.get():
+            self.gesture_engine.set_tracing(True)
+            self._queue_debug_log("[Trace] Recording pipeline trace...\n")
+        else:
+            self.gesture_engine.set_tracing(False)
+            self._queue_debug_log("[Trace] Recording stopped.\n")
 
-        self.after(100, self._process_log_queue)
+    def _export_trace(self):
+        path = f"trace_{time.strftime('%Y%m%d_%H%M%S')}.json"
+        try:
+            self.gesture_engine.export_trace(path)
+            self._queue_debug_log(f"[Trace] Saved {path} (open in ui.perfetto.dev)\n")
+        except IOError as e:
+            self._queue_debug_log(f"[Trace] Failed to save trace: {e}\n")
 
     def _clear_debug_log(self):
         self.debug_log.delete("1.0", "end")
@@ -311,18 +462,26 @@ class BluetoothBudsControlApp(ctk.CTk):
         msg = f"[Mouse] Scroll: ({dx}, {dy})\n"
         self._queue_debug_log(msg)
 
+    def _toggle_hid_logging(self):
+        if self.log_hid_var.get():
+            self.hid_logging.set()
+        else:
+            self.hid_logging.clear()
+
     def _poll_gamepads(self):
         while not self.stop_gamepad_thread:
-            if not self.log_hid_var.get():
-                time.sleep(0.5)
+            if not self.hid_logging.is_set():
+                self.hid_logging.wait()
                 continue
 
             try:
                 events = inputs.get_gamepad()
+                received = time.monotonic()
                 for event in events:
                     if self.stop_gamepad_thread:
                         break
-                    msg = f"[HID/Gamepad] Code: {event.code}, State: {event.state}, Type: {event.ev_type}\n"
+                    delay = received - self.gamepad_timebase.map(event.timestamp, received)
+                    msg = f"[HID/Gamepad] Code: {event.code}, State: {event.state}, Type: {event.ev_type} (+{delay * 1000:.1f} ms)\n"
                     self._queue_debug_log(msg)
             except Exception:
                 time.sleep(0.1)
@@ -344,42 +503,61 @@ class BluetoothBudsControlApp(ctk.CTk):
         self.status_bar.pack(fill="x", side="bottom")
 
     def _load_values(self):
-        self.single_tap_var.set(self.config.get_gesture("single_tap") or "None")
-        self.double_tap_var.set(self.config.get_gesture("double_tap") or "None")
-        self.triple_tap_var.set(self.config.get_gesture("triple_tap") or "None")
-        self.long_press_var.set(self.config.get_gesture("long_press") or "None")
+        self.pending_gestures = {
+            button: {g: self.config.get_gesture(g, button) or "None" for g in GESTURES}
+            for button in BUTTON_LABELS
+        }
+        self._show_button_gestures(self.selected_button)
 
         self.notif_var.set(self.config.get_option("notifications"))
         self.start_var.set(self.config.get_option("start_with_windows"))
+        self.repeat_var.set(self.config.get_option("repeat_long_press"))
+        self.hold_release_var.set(self.config.get_option("long_press_on_release"))
 
     def _on_save(self):
-        self.config.set_gesture("single_tap", self.single_tap_var.get())
-        self.config.set_gesture("double_tap", self.double_tap_var.get())
-        self.config.set_gesture("triple_tap", self.triple_tap_var.get())
-        self.config.set_gesture("long_press", self.long_press_var.get())
+        self._store_button_gestures()
+        for button, gestures in self.pending_gestures.items():
+            # Don't clutter the config with buttons that were never mapped
+            if button != PRIMARY_BUTTON and all(a == "None" for a in gestures.values()) \
+                    and button not in self.config.get("button_gestures", {}):
+                continue
+            for gesture, action in gestures.items():
+                self.config.set_gesture(gesture, action, button)
 
         self.config.set_option("notifications", self.notif_var.get())
         self.config.set_option("start_with_windows", self.start_var.get())
+        self.config.set_option("repeat_long_press", self.repeat_var.get())
+        self.config.set_option("long_press_on_release", self.hold_release_var.get())
 
         selected_device = self.device_var.get()
         if selected_device != "Select Device" and selected_device != "No Devices Found" and selected_device != "Loading...":
             self.config.set_target_device(selected_device)
 
         self.config.save_config()
-        print("Configuration saved.")
+        logger.info("Configuration saved.")
 
         if self.on_save_callback:
             self.on_save_callback()
+        self._update_status()
 
     def _update_status(self):
-        target = self.device_var.get()
-        if not target or target in ["Select Device", "Loading...", "No Devices Found"]:
-            self.status_bar.configure(text="Status: No device selected")
+        # The engine watches the saved target device, so report that one from
+        # its cached state rather than querying PowerShell from the UI
+        target = self.config.get_target_device()
+        hook_health = self._hook_health_text()
+        if not target:
+            self.status_bar.configure(text="Status: No device selected" + hook_health)
+        elif self.gesture_engine.hook_stats()["connected"]:
+            self.status_bar.configure(text=f"Status: Connected to {target} 🔵" + hook_health, text_color="green")
         else:
-            connected = self.bluetooth.is_device_connected(target)
-            if connected:
-                self.status_bar.configure(text=f"Status: Connected to {target} 🔵", text_color="green")
-            else:
-                self.status_bar.configure(text=f"Status: {target} Not Connected ⚪", text_color="orange")
-
-        self.after(5000, self._update_status)
+            self.status_bar.configure(text=f"Status: {target} Not Connected ⚪" + hook_health, text_color="orange")
+
+    def _hook_health_text(self):
+        # Only shown once something went wrong, to keep the status bar quiet
+        stats = self.gesture_engine.hook_stats()
+        if not stats["overruns"] and not stats["recoveries"] and not stats["dropped"]:
+            return ""
+        text = f"  |  Hook: {stats['overruns']} slow callbacks (max {stats['max_ms']} ms), {stats['recoveries']} recoveries"
+        if stats["dropped"]:
+            text += f", {stats['dropped']} events dropped"
+        return text + " ⚠️"
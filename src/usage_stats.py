@@ -0,0 +1,340 @@
+import datetime
+import json
+import logging
+import math
+import os
+import queue
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+USAGE_DIR = "usage"
+RAW_FILE = "events.bin"
+DAILY_FILE = "daily.json"
+NAMES_FILE = "names.json"
+
+# wall time (s), gesture, action and device (ids into names.json), latency (ms), outcome
+RECORD = struct.Struct("<dHHHfBx")
+# events.bin starts with a magic and the compaction generation it belongs to;
+# daily.json carries the generation it was last folded into. They only match
+# when a reader sees both sides of the same compaction.
+RAW_MAGIC = b"USG1"
+RAW_HEADER = struct.Struct("<4sQ")
+
+# Outcomes
+ACTION = 0          # recognised and its action ran
+UNMAPPED = 1        # recognised, nothing mapped to it
+RECLASSIFIED = 2    # released right at the long press threshold, before its deadline ran
+PASSTHROUGH = 3     # not intercepted, re-emitted to the OS
+OUTCOMES = {ACTION: "action", UNMAPPED: "unmapped", RECLASSIFIED: "reclassified", PASSTHROUGH: "passthrough"}
+
+# Raw records are folded into daily aggregates when the day changes or the
+# log reaches this size, and aggregates older than MAX_DAYS are discarded
+MAX_RAW_BYTES = 1024 * 1024
+MAX_DAYS = 400
+# Records waiting for the writer beyond this are dropped
+MAX_PENDING = 10000
+# query() rereads this often while a compaction is half done
+QUERY_ATTEMPTS = 5
+QUERY_RETRY_DELAY = 0.02
+
+# Latency histogram: bucket i holds latencies below 2 ** (i / 4) ms
+LATENCY_BUCKETS = 64
+
+
+def latency_bucket(ms):
+    if ms != ms or ms <= 1:
+        # NaN (unknown) and sub-millisecond both go in the first bucket
+        return 0
+    return min(LATENCY_BUCKETS - 1, int(math.ceil(4 * math.log2(ms))))
+
+
+def histogram_percentile(histogram, fraction):
+    """Upper edge (ms) of the bucket holding the `fraction` quantile, or None if empty."""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= target:
+            return round(2 ** (i / 4), 1)
+    return round(2 ** ((LATENCY_BUCKETS - 1) / 4), 1)
+
+
+class UsageStats:
+    """
+    Appends one fixed-size record per recognised gesture (and per re-emitted
+    passthrough) to usage/events.bin. record() only queues; a writer thread
+    does the file work and folds the log into per-day aggregates in
+    daily.json, so both files stay bounded however long the app runs.
+    """
+
+    def __init__(self, directory=USAGE_DIR, max_raw_bytes=MAX_RAW_BYTES, max_days=MAX_DAYS,
+                 clock=time.time):
+        self.directory = directory
+        self.max_raw_bytes = max_raw_bytes
+        self.max_days = max_days
+        self.clock = clock
+        self.dropped = 0
+
+        self._queue = queue.Queue(MAX_PENDING)
+        self._thread = None
+        self._names = []
+        self._ids = {}
+        self._file = None
+        self._raw_day = None
+        self._generation = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._names = _load_names(self.directory)
+        self._ids = {name: i for i, name in enumerate(self._names)}
+        self.compact()
+        self._file = open(os.path.join(self.directory, RAW_FILE), "ab")
+        if not self._file.tell():
+            self._file.write(RAW_HEADER.pack(RAW_MAGIC, self._generation))
+            self._file.flush()
+        self._thread = threading.Thread(target=self._run, name="UsageStats", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=2)
+        self._thread = None
+        self._file.close()
+        self._file = None
+
+    def record(self, gesture, action, device, latency, outcome):
+        # Called on the engine's thread: never blocks
+        if not self._thread:
+            return
+        try:
+            self._queue.put_nowait((self.clock(), gesture, action or "", device or "",
+                                    float("nan") if latency is None else latency * 1000, outcome))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Waits until everything recorded so far is on disk."""
+        if self._thread:
+            self._queue.join()
+
+    def compact(self):
+        """Folds the raw log into daily.json and empties it."""
+        raw_generation, records = _read_raw(os.path.join(self.directory, RAW_FILE))
+        generation, daily = _load_daily(self.directory)
+        if records or raw_generation != generation:
+            if raw_generation == generation:
+                _aggregate(_decode(records, self._names), daily)
+                generation += 1
+                _save_json(os.path.join(self.directory, DAILY_FILE),
+                           {"generation": generation, "days": self._prune(daily)})
+            # Otherwise daily.json already holds these records: the last
+            # compaction stopped before it could empty the log
+            self._reset_raw(generation)
+        self._generation = generation
+        self._raw_day = None
+
+    def _reset_raw(self, generation):
+        header = RAW_HEADER.pack(RAW_MAGIC, generation)
+        if self._file:
+            self._file.truncate(0)
+            self._file.write(header)
+            self._file.flush()
+        else:
+            with open(os.path.join(self.directory, RAW_FILE), "wb") as f:
+                f.write(header)
+
+    def _prune(self, daily):
+        cutoff = (datetime.date.fromtimestamp(self.clock()) - datetime.timedelta(days=self.max_days)).isoformat()
+        return {day: gestures for day, gestures in daily.items() if day > cutoff}
+
+    def _run(self):
+        while True:
+            # Blocks while idle; then takes whatever else is already waiting
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                stop = self._write(batch)
+            except Exception as e:
+                logger.error("Failed to write usage stats: %s", e)
+                stop = None in batch
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        data = []
+        stop = False
+        for item in batch:
+            if item is None:
+                stop = True
+                continue
+            timestamp, gesture, action, device, latency, outcome = item
+            day = datetime.date.fromtimestamp(timestamp)
+            if self._raw_day is None:
+                self._raw_day = day
+            elif day != self._raw_day:
+                # New day: fold yesterday's records into their aggregate first
+                self._append(data)
+                data = []
+                self.compact()
+                self._raw_day = day
+            data.append(RECORD.pack(timestamp, self._id(gesture), self._id(action), self._id(device), latency, outcome))
+        self._append(data)
+        if self._file.tell() >= self.max_raw_bytes:
+            self.compact()
+        return stop
+
+    def _append(self, data):
+        if data:
+            self._file.write(b"".join(data))
+            self._file.flush()
+
+    def _id(self, name):
+        index = self._ids.get(name)
+        if index is None:
+            index = self._ids[name] = len(self._names)
+            self._names.append(name)
+            # Written before any record uses the id, so readers can always decode
+            _save_json(os.path.join(self.directory, NAMES_FILE), self._names)
+        return index
+
+
+def _load_names(directory):
+    try:
+        with open(os.path.join(directory, NAMES_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _load_daily(directory):
+    # (generation, {day: {gesture: aggregate}})
+    try:
+        with open(os.path.join(directory, DAILY_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return 0, {}
+    if "days" not in data:
+        # Written before generations were kept
+        return 0, data
+    return data["generation"], data["days"]
+
+
+def _save_json(path, data):
+    # Replaced in one step, so a reader in the other process never sees half a file
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_raw(path):
+    # (generation, undecoded records); generation 0 if the log was never
+    # created, None if it is being emptied right now
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return 0, []
+    except OSError:
+        return None, []
+    if len(data) < RAW_HEADER.size:
+        return None, []
+    magic, generation = RAW_HEADER.unpack_from(data)
+    if magic != RAW_MAGIC:
+        return None, []
+    # A record still being appended is left for next time
+    end = len(data) - (len(data) - RAW_HEADER.size) % RECORD.size
+    return generation, list(RECORD.iter_unpack(data[RAW_HEADER.size:end]))
+
+
+def _decode(records, names):
+    for timestamp, gesture, action, device, latency, outcome in records:
+        yield (timestamp, _name(names, gesture), _name(names, action), _name(names, device), latency, outcome)
+
+
+def _name(names, index):
+    return names[index] if index < len(names) else f"#{index}"
+
+
+def _aggregate(records, daily):
+    for timestamp, gesture, action, device, latency, outcome in records:
+        day = datetime.date.fromtimestamp(timestamp).isoformat()
+        entry = daily.setdefault(day, {}).setdefault(gesture, {
+            "count": 0, "outcomes": {}, "actions": {}, "devices": {}, "latency": [0] * LATENCY_BUCKETS,
+        })
+        entry["count"] += 1
+        _bump(entry["outcomes"], OUTCOMES.get(outcome, str(outcome)))
+        if action:
+            _bump(entry["actions"], action)
+        if device:
+            _bump(entry["devices"], device)
+        if latency == latency:
+            entry["latency"][latency_bucket(latency)] += 1
+    return daily
+
+
+def _bump(counts, key):
+    counts[key] = counts.get(key, 0) + 1
+
+
+def query(directory=USAGE_DIR, days=None, today=None):
+    """
+    Per-gesture usage over the last `days` days (all kept days if None):
+    {gesture: {"count", "outcomes", "actions", "devices", "p50_ms", "p95_ms"}}.
+    Reads the files directly, so it works from the UI process too.
+    """
+    for _ in range(QUERY_ATTEMPTS):
+        generation, daily = _load_daily(directory)
+        raw_generation, records = _read_raw(os.path.join(directory, RAW_FILE))
+        if raw_generation == generation:
+            # Names are saved before any record uses them, so reading them
+            # after the records covers every id
+            _aggregate(_decode(records, _load_names(directory)), daily)
+            break
+        # The writer is between saving daily.json and emptying the log
+        time.sleep(QUERY_RETRY_DELAY)
+    else:
+        logger.warning("Usage log kept changing while being read; leaving out today's latest records")
+    if days is not None:
+        today = today or datetime.date.today()
+        cutoff = (today - datetime.timedelta(days=days)).isoformat()
+        daily = {day: gestures for day, gestures in daily.items() if day > cutoff}
+
+    totals = {}
+    for gestures in daily.values():
+        for gesture, entry in gestures.items():
+            total = totals.setdefault(gesture, {
+                "count": 0, "outcomes": {}, "actions": {}, "devices": {}, "latency": [0] * LATENCY_BUCKETS,
+            })
+            total["count"] += entry["count"]
+            for field in ("outcomes", "actions", "devices"):
+                for key, count in entry[field].items():
+                    total[field][key] = total[field].get(key, 0) + count
+            total["latency"] = [a + b for a, b in zip(total["latency"], entry["latency"])]
+
+    for total in totals.values():
+        histogram = total.pop("latency")
+        total["p50_ms"] = histogram_percentile(histogram, 0.5)
+        total["p95_ms"] = histogram_percentile(histogram, 0.95)
+    return totals
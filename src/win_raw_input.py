@@ -4,21 +4,27 @@ import threading
 import time
 import platform
 
+from .timebase import Timebase
+
 # Only valid on Windows
 if platform.system() != "Windows":
     # Mock class for non-Windows environments
     class RawInputMonitor:
-        def __init__(self, callback):
+        def __init__(self, callback, on_key=None):
             self.callback = callback
+            self.on_key = on_key
             self.running = False
+            self._stopped = threading.Event()
         def start(self):
             self.running = True
+            self._stopped.clear()
             threading.Thread(target=self._mock_loop, daemon=True).start()
         def stop(self):
             self.running = False
+            self._stopped.set()
         def _mock_loop(self):
-            while self.running:
-                time.sleep(1)
+            # Nothing to report; sleep until stopped rather than waking every second
+            self._stopped.wait()
 
     def enumerate_devices():
         return ["Mock Device 1", "Mock Device 2 (Bluetooth)"]
@@ -33,6 +39,7 @@ else:
     RIM_TYPEMOUSE = 0
     RIM_TYPEKEYBOARD = 1
     RIM_TYPEHID = 2
+    RI_KEY_BREAK = 0x01
     RIDEV_INPUTSINK = 0x00000100
     RID_INPUT = 0x10000003
     RIDI_DEVICENAME = 0x20000007
@@ -167,11 +174,15 @@ else:
         return ui_list
 
     class RawInputMonitor:
-        def __init__(self, callback):
+        def __init__(self, callback, on_key=None):
             self.callback = callback
+            # Optional on_key(vk, is_down, monotonic_time) for every keyboard report
+            self.on_key = on_key
             self.thread = None
             self.hwnd = None
             self.running = False
+            # WM_INPUT carries the message time: GetTickCount milliseconds, wrapping after ~49.7 days
+            self.timebase = Timebase("raw_input", scale=0.001, wrap=2 ** 32)
 
         def start(self):
             if self.running: return
@@ -233,6 +244,10 @@ else:
             return user32.DefWindowProcW(hwnd, msg, wparam, lparam)
 
         def _handle_raw_input(self, hrawinput):
+            received = time.monotonic()
+            timestamp = self.timebase.map(user32.GetMessageTime() & 0xFFFFFFFF, received)
+            delay = received - timestamp
+
             # Get Header first to determine size
             header = RAWINPUTHEADER()
             size = ctypes.c_uint(ctypes.sizeof(header))
@@ -252,6 +267,8 @@ else:
             msg = ""
             if raw.header.dwType == RIM_TYPEKEYBOARD:
                 kbd = raw.data
+                if self.on_key:
+                    self.on_key(kbd.VKey, not kbd.Flags & RI_KEY_BREAK, timestamp)
                 msg = f"[Raw Keyboard] MakeCode: {kbd.MakeCode}, VKey: {kbd.VKey}, Message: {kbd.Message}"
 
             elif raw.header.dwType == RIM_TYPEHID:
@@ -269,4 +286,4 @@ else:
                 msg = f"[Raw HID/Consumer] Count: {count}, Size: {size_hid}, Data: {hex_str}"
 
             if msg:
-                self.callback(f"{msg}\n")
+                self.callback(f"{msg} (+{delay * 1000:.1f} ms)\n")
@@ -1,23 +1,33 @@
 import unittest
 import time
 import sys
+import threading
 from unittest.mock import MagicMock, patch
 
 # Mock modules that might not exist or work in headless
 sys.modules['keyboard'] = MagicMock()
-sys.modules['pyautogui'] = MagicMock()
 sys.modules['customtkinter'] = MagicMock()
 
 from src.gesture_engine import GestureEngine
-from src.config_manager import ConfigManager
+from src.config_manager import ConfigManager, DEFAULT_CONFIG
 from src.bluetooth_manager import BluetoothManager
+from src.adaptive_timing import (
+    P2Quantile, AdaptiveTiming, MIN_MULTI_TAP_WINDOW, MAX_MULTI_TAP_WINDOW
+)
 
 class TestGestureEngine(unittest.TestCase):
     def setUp(self):
         self.config = MagicMock(spec=ConfigManager)
         # Setup default actions
-        self.config.get_gesture.side_effect = lambda x: f"Action_{x}"
+        self.config.get_gesture.side_effect = lambda x, button="play_pause", app=None: f"Action_{x}"
         self.config.get_target_device.return_value = "TestDevice"
+        self.config.get_timing.return_value = None
+        self.config.get_debounce_window.return_value = 0.025
+        self.config.get_chords.return_value = {}
+        self.config.get_option.side_effect = lambda name: DEFAULT_CONFIG["options"].get(name)
+        self.config.get_repeat_options.return_value = {
+            "enabled": False, "rate": 8.0, "max_rate": 30.0, "acceleration": 15.0
+        }
 
         # Mock BluetoothManager
         self.bluetooth_patcher = patch('src.gesture_engine.BluetoothManager')
@@ -29,13 +39,20 @@ class TestGestureEngine(unittest.TestCase):
         self.mock_actions = self.action_patcher.start().return_value
 
         self.engine = GestureEngine(self.config)
+        self.engine.connection.check()  # Cache the connection state, as the watcher would
         self.engine.is_running = True # Force running
 
+        import tempfile
+        from src.usage_stats import UsageStats
+        self.usage_dir = tempfile.TemporaryDirectory()
+        self.engine.usage = UsageStats(self.usage_dir.name)
+
     def tearDown(self):
+        self.engine.usage.stop()
+        self.usage_dir.cleanup()
         self.bluetooth_patcher.stop()
         self.action_patcher.stop()
-        if self.engine.timer:
-            self.engine.timer.cancel()
+        self.engine.scheduler.stop()
 
     def simulate_tap(self):
         # Key Down
@@ -56,6 +73,13 @@ class TestGestureEngine(unittest.TestCase):
         event_up.event_type = "up"
         self.engine._on_key_up(event_up)
 
+    def wait_for_input(self, timeout=1):
+        # Hook callbacks only queue events; wait until the engine has handled them
+        queue = self.engine.input
+        deadline = time.monotonic() + timeout
+        while queue.processed < queue.pushed - queue.collapsed - queue.dropped and time.monotonic() < deadline:
+            time.sleep(0.001)
+
     def test_single_tap(self):
         print("\nTesting Single Tap...")
         self.simulate_tap()
@@ -92,11 +116,1587 @@ class TestGestureEngine(unittest.TestCase):
     def test_device_not_connected(self):
         print("\nTesting Device Not Connected...")
         self.mock_bluetooth.is_device_connected.return_value = False
+        self.engine.connection.check()
 
         self.simulate_tap()
         time.sleep(0.5)
 
         self.mock_actions.execute.assert_not_called()
 
+    def test_hold_repeats_until_key_up(self):
+        print("\nTesting Hold-to-Repeat...")
+        self.config.get_repeat_options.return_value = {
+            "enabled": True, "rate": 50.0, "max_rate": 50.0, "acceleration": 0.0
+        }
+        self.engine._sync_timing_device()
+        self.engine.timing.long_press_threshold = 0.1
+
+        self.engine._on_key_down(MagicMock(event_type="down"))
+        time.sleep(0.3)
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        self.wait_for_input()
+
+        repeats = sum(c.args[1] for c in self.mock_actions.execute_repeat.call_args_list)
+        self.assertGreaterEqual(repeats, 5)
+        self.mock_actions.execute_repeat.assert_called_with("Action_long_press", unittest.mock.ANY)
+
+        # Released: no more repeats, and no long press action on release
+        calls = self.mock_actions.execute_repeat.call_count
+        time.sleep(0.1)
+        self.assertEqual(self.mock_actions.execute_repeat.call_count, calls)
+        self.mock_actions.execute.assert_not_called()
+
+    def hold(self, duration, on_release=False):
+        options = dict(DEFAULT_CONFIG["options"], long_press_2_threshold=0.3, long_press_on_release=on_release)
+        self.config.get_option.side_effect = options.get
+        self.engine._sync_timing_device()
+        self.engine.timing.long_press_threshold = 0.1
+
+        self.engine._on_key_down(MagicMock(event_type="down"))
+        time.sleep(duration)
+        executed_while_held = [c.args[0] for c in self.mock_actions.execute.call_args_list]
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        time.sleep(0.05)
+        return executed_while_held, [c.args[0] for c in self.mock_actions.execute.call_args_list]
+
+    def test_long_press_fires_at_threshold(self):
+        held, executed = self.hold(0.2)
+        self.assertEqual(held, ["Action_long_press"])
+        self.assertEqual(executed, ["Action_long_press"])
+
+    def test_hold_levels_fire_as_reached(self):
+        held, executed = self.hold(0.45)
+        self.assertEqual(held, ["Action_long_press", "Action_long_press_2"])
+        self.assertEqual(executed, held)
+
+    def test_hold_level_on_release_mode(self):
+        # Released between the levels: level one fires on release
+        held, executed = self.hold(0.2, on_release=True)
+        self.assertEqual(held, [])
+        self.assertEqual(executed, ["Action_long_press"])
+
+        # Held past the last level: only that one fires, straight away
+        self.mock_actions.execute.reset_mock()
+        held, executed = self.hold(0.45, on_release=True)
+        self.assertEqual(held, ["Action_long_press_2"])
+        self.assertEqual(executed, ["Action_long_press_2"])
+
+    def test_key_names_resolved_once_with_fallback(self):
+        from src.gesture_engine import keyboard
+
+        def scan_codes(name):
+            if name == "play/pause media":
+                raise ValueError(name)
+            return {"play/pause": [164], "next track": [153]}[name]
+
+        keyboard.reset_mock()
+        keyboard.key_to_scan_codes.side_effect = scan_codes
+        self.config.get_mapped_buttons.return_value = ["next_track"]
+        self.engine.is_running = False
+        try:
+            self.engine.start()
+            self.engine.connection.check()
+        finally:
+            keyboard.key_to_scan_codes.side_effect = None
+
+        self.assertEqual(self.engine.primary.key_name, "play/pause")
+        self.assertEqual(self.engine.states["next_track"].scan_codes, (153,))
+        hooked = [c.args[0] for c in keyboard.on_press_key.call_args_list]
+        self.assertEqual(hooked, [(164,), (153,), "f24"])
+
+        # Re-emitting re-hooks from the resolved scan codes without resolving again
+        resolved = keyboard.key_to_scan_codes.call_count
+        self.engine._re_emit(MagicMock(event_type="down"), self.engine.primary)
+        self.assertEqual(keyboard.key_to_scan_codes.call_count, resolved)
+        keyboard.send.assert_called_with(164, do_press=True, do_release=False)
+
+        self.engine.stop()
+
+    def test_buttons_keep_separate_state(self):
+        from src.gesture_engine import KeyState
+        self.config.get_gesture.side_effect = lambda x, button="play_pause", app=None: f"{button}_{x}"
+        next_track = KeyState("next_track")
+        self.engine.states["next_track"] = next_track
+
+        # Interleave: play/pause tapped twice, next track once
+        self.simulate_tap()
+        self.engine._on_key_down(MagicMock(event_type="down"), next_track)
+        self.engine._on_key_up(MagicMock(event_type="up"), next_track)
+        # Far enough after the first release not to count as chatter
+        time.sleep(0.05)
+        self.simulate_tap()
+
+        time.sleep(0.6)
+
+        executed = sorted(c.args[0] for c in self.mock_actions.execute.call_args_list)
+        self.assertEqual(executed, ["next_track_single_tap", "play_pause_double_tap"])
+
+    def test_unmapped_gesture_sends_native_key(self):
+        from src.gesture_engine import KeyState
+        # Volume up is hooked only for its long press
+        self.config.get_gesture.side_effect = (
+            lambda x, button="play_pause", app=None: "Lock Screen" if button == "play_pause" or x == "long_press" else None)
+        volume_up = KeyState("volume_up")
+        self.engine.states["volume_up"] = volume_up
+
+        self.engine._on_key_down(MagicMock(event_type="down"), volume_up)
+        time.sleep(0.05)
+        self.engine._on_key_up(MagicMock(event_type="up"), volume_up)
+        time.sleep(0.1)
+        self.engine._on_key_down(MagicMock(event_type="down"), volume_up)
+        time.sleep(0.05)
+        self.engine._on_key_up(MagicMock(event_type="up"), volume_up)
+        self.wait_for_input()
+        time.sleep(0.1)
+
+        # Tap windows resolve at once with no double/triple mapped, each one
+        # passing the key on
+        self.assertEqual([c.args[0] for c in self.mock_actions.execute.call_args_list], ["Volume Up", "Volume Up"])
+
+    def test_holding_unmapped_volume_up_ramps_natively(self):
+        from src.gesture_engine import KeyState
+        # Volume up is hooked only for its double tap; its hold does nothing here
+        self.config.get_gesture.side_effect = (
+            lambda x, button="play_pause", app=None: "Lock Screen" if button == "play_pause" or x == "double_tap" else None)
+        volume_up = KeyState("volume_up")
+        self.engine.states["volume_up"] = volume_up
+
+        self.engine._on_key_down(MagicMock(event_type="down"), volume_up)
+        time.sleep(0.1)
+        for _ in range(5):
+            # The OS auto-repeating the held key
+            self.engine._on_key_down(MagicMock(event_type="down"), volume_up)
+            time.sleep(0.03)
+        self.engine._on_key_up(MagicMock(event_type="up"), volume_up)
+        self.wait_for_input()
+        time.sleep(self.engine.timing.multi_tap_window + 0.1)
+
+        # One step for the press and one per repeat, nothing more on release
+        self.assertEqual([c.args[0] for c in self.mock_actions.execute.call_args_list], ["Volume Up"] * 6)
+
+    def test_gesture_follows_foreground_app(self):
+        from src.foreground_app import MockForegroundApp
+        config = ConfigManager.__new__(ConfigManager)
+        config.config = {
+            "gestures": {"double_tap": "Scroll Down"},
+            "app_gestures": {"POWERPNT.EXE": {"play_pause": {"double_tap": "Next Track"}},
+                             "chrome.exe": {"volume_up": {"single_tap": "Lock Screen"}}},
+        }
+        foreground = MockForegroundApp()
+        with patch('src.gesture_engine.BluetoothManager'), patch('src.gesture_engine.ActionManager'):
+            engine = GestureEngine(config, foreground)
+
+        self.assertEqual(engine._gesture("double_tap"), "Scroll Down")
+        foreground.set_app(r"C:\Program Files\Microsoft Office\POWERPNT.EXE")
+        self.assertEqual(engine._gesture("double_tap"), "Next Track")
+        foreground.set_app("chrome.exe")
+        # Apps without an override for a gesture fall back to the global mapping
+        self.assertEqual(engine._gesture("double_tap"), "Scroll Down")
+        self.assertEqual(engine._gesture("single_tap", "volume_up"), "Lock Screen")
+        self.assertEqual(config.get_mapped_buttons(), ["volume_up"])
+
+        # Edits recompile the maps
+        config.set_gesture("double_tap", "Volume Up")
+        self.assertEqual(engine._gesture("double_tap"), "Volume Up")
+
+    def test_hooks_follow_connection_and_mappings(self):
+        from src.gesture_engine import keyboard
+        keyboard.reset_mock()
+        keyboard.key_to_scan_codes.return_value = [164]
+        self.config.get_mapped_buttons.return_value = []
+        self.config.has_mappings.return_value = True
+        self.mock_bluetooth.is_device_connected.return_value = False
+        self.engine.is_running = False
+        self.engine.connection.interval = 60
+        self.engine.connection.check()
+        try:
+            self.engine.start()
+            self.engine.connection.check()
+            # Disconnected: nothing hooked, presses go straight to the OS
+            keyboard.on_press_key.assert_not_called()
+
+            self.mock_bluetooth.is_device_connected.return_value = True
+            self.engine.connection.check()
+            self.assertTrue(self.engine.hooked)
+            self.assertEqual([c.args[0] for c in keyboard.on_press_key.call_args_list], [(164,), "f24"])
+
+            self.mock_bluetooth.is_device_connected.return_value = False
+            self.engine.connection.check()
+            self.assertFalse(self.engine.hooked)
+            self.assertEqual(keyboard.unhook.call_count, 4)
+
+            # Connected but nothing mapped: still not hooked
+            self.config.has_mappings.return_value = False
+            self.mock_bluetooth.is_device_connected.return_value = True
+            self.engine.connection.check()
+            self.assertFalse(self.engine.hooked)
+        finally:
+            self.engine.stop()
+            keyboard.key_to_scan_codes.return_value = MagicMock()
+
+    def test_slow_hook_callback_counts_as_overrun(self):
+        self.engine.watchdog.budget = 0.01
+        self.engine.input.push = lambda state, is_down, timestamp: time.sleep(0.03)
+
+        self.simulate_tap()
+
+        stats = self.engine.watchdog.stats()
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["overruns"], 2)
+        self.assertGreaterEqual(stats["max_ms"], 30)
+
+    def test_event_storm_keeps_hook_latency_flat(self):
+        # 10k events/s from a stuck or resending key into an engine that can
+        # only handle ~1k/s: hook callbacks must stay as fast at the end as at
+        # the start, and the backlog bounded
+        self.engine.filters.process = lambda state, is_down, timestamp: time.sleep(0.001)
+        event = MagicMock()
+        latencies = []
+        interval = 1 / 10000
+        start = time.perf_counter()
+        for i in range(10000):
+            while time.perf_counter() < start + i * interval:
+                pass
+            began = time.perf_counter()
+            if i % 2:
+                self.engine._on_key_up(event)
+            else:
+                self.engine._on_key_down(event)
+            latencies.append(time.perf_counter() - began)
+        self.assertLess(time.perf_counter() - start, 1.5)
+
+        def p99(values):
+            return sorted(values)[int(len(values) * 0.99)]
+
+        first, last = p99(latencies[:1000]), p99(latencies[-1000:])
+        self.assertLess(last, max(first * 3, 0.002))
+        stats = self.engine.input.stats()
+        self.assertLessEqual(stats["high_water"], self.engine.input.size)
+        self.assertGreater(stats["dropped"], 0)
+        self.assertEqual(self.engine.hook_stats()["dropped"], stats["dropped"])
+
+    def test_hold_timed_from_event_timestamps(self):
+        # The press callback ran 0.6s late (e.g. waiting for the GIL), right
+        # before the release: the hold still lasted 0.6s
+        for _ in range(5):
+            self.engine.timebase.map(time.time(), time.monotonic())
+        self.engine._on_key_down(MagicMock(time=time.time() - 0.6))
+        self.engine._on_key_up(MagicMock(time=time.time()))
+        self.wait_for_input()
+        time.sleep(0.05)
+
+        self.mock_actions.execute.assert_called_with("Action_long_press")
+        self.assertGreater(self.engine.hook_stats()["delay_ms"], 0)
+
+    def test_chatter_counts_as_one_tap(self):
+        # Down/up resent 3ms after the real release, as cheap earbuds do
+        for _ in range(5):
+            self.engine.timebase.map(time.time(), time.monotonic())
+        base = time.time() - 0.1
+        for offset, callback in [(0, self.engine._on_key_down), (0.080, self.engine._on_key_up),
+                                 (0.083, self.engine._on_key_down), (0.085, self.engine._on_key_up)]:
+            callback(MagicMock(time=base + offset))
+        self.wait_for_input()
+        time.sleep(0.5)
+
+        self.mock_actions.execute.assert_called_once_with("Action_single_tap")
+        self.assertEqual(self.engine.hook_stats()["filtered"], 2)
+
+    def test_stray_release_fires_nothing(self):
+        # Released after the hooks went in, or after the filters were reset
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        self.wait_for_input()
+        self.engine._on_key_down(MagicMock(event_type="down"))
+        self.wait_for_input()
+        # Unhooked while held; the release comes in after hooking again
+        self.engine._cancel_gestures()
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        self.wait_for_input()
+        time.sleep(0.5)
+
+        self.mock_actions.execute.assert_not_called()
+        self.assertEqual(self.engine.filters.stats()["orphans"], 2)
+
+    def test_gestures_are_counted(self):
+        from src import usage_stats
+        self.engine.usage.start()
+        self.simulate_tap()
+        time.sleep(0.5)
+        self.engine.connection.connected = False
+        self.engine._on_key_down(MagicMock(event_type="down", time=None))
+        self.engine.usage.flush()
+
+        stats = usage_stats.query(self.usage_dir.name)
+        self.assertEqual(stats["Single Tap"]["count"], 1)
+        self.assertEqual(stats["Single Tap"]["actions"], {"Action_single_tap": 1})
+        self.assertEqual(stats["Single Tap"]["devices"], {"TestDevice": 1})
+        # Includes the multi-tap window the tap had to wait out
+        self.assertGreaterEqual(stats["Single Tap"]["p50_ms"], self.engine.timing.multi_tap_window * 1000)
+        self.assertEqual(stats["Passthrough [play_pause]"]["outcomes"], {"passthrough": 1})
+
+    def test_unmapped_hold_is_not_counted_as_reclassified(self):
+        from src import usage_stats
+        # No hold level mapped, so no deadline is armed for the hold
+        self.config.get_gesture.side_effect = (
+            lambda x, button="play_pause", app=None: None if x.startswith("long_press") else f"Action_{x}")
+        self.engine.usage.start()
+        self.engine._on_key_down(MagicMock(event_type="down"))
+        time.sleep(self.engine.timing.long_press_threshold + 0.1)
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        self.wait_for_input()
+        self.engine.usage.flush()
+
+        stats = usage_stats.query(self.usage_dir.name)
+        self.assertEqual(stats["Long Press"]["outcomes"], {"unmapped": 1})
+
+    def configure_chord(self, tolerance=0.08):
+        from src.gesture_engine import KeyState
+        self.volume_up = KeyState("volume_up")
+        self.engine.states["volume_up"] = self.volume_up
+        self.engine.chords.configure({frozenset({"play_pause", "volume_up"}): "Action_chord"}, tolerance)
+
+    def test_chord_fires_once_and_swallows_single_gestures(self):
+        print("\nTesting Chord...")
+        self.configure_chord()
+
+        self.engine._on_key_down(MagicMock(event_type="down"))
+        time.sleep(0.02)
+        self.engine._on_key_down(MagicMock(event_type="down"), self.volume_up)
+        time.sleep(0.02)
+        self.mock_actions.execute.assert_called_once_with("Action_chord")
+
+        time.sleep(0.2)
+        self.engine._on_key_up(MagicMock(event_type="up"), self.volume_up)
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        time.sleep(0.5)
+
+        self.mock_actions.execute.assert_called_once_with("Action_chord")
+        stats = self.engine.chords.stats()
+        self.assertEqual(stats["chords"], 1)
+        self.assertLessEqual(stats["max_latency_ms"], stats["bound_ms"])
+
+    def test_chord_partner_released_early_is_a_tap(self):
+        self.configure_chord()
+        self.map_gestures(double_tap="None", triple_tap="None")
+
+        # Released before any partner: resolved right away, not after the tolerance
+        self.engine._on_key_down(MagicMock(event_type="down"))
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        time.sleep(0.03)
+
+        self.mock_actions.execute.assert_called_once_with("Action_single_tap")
+
+    def test_chord_times_out_into_long_press(self):
+        self.configure_chord(tolerance=0.05)
+        self.engine._sync_timing_device()
+        self.engine.timing.long_press_threshold = 0.2
+
+        self.engine._on_key_down(MagicMock(event_type="down"))
+        time.sleep(0.1)
+        # Partner arrives too late to form a chord
+        self.engine._on_key_down(MagicMock(event_type="down"), self.volume_up)
+        time.sleep(0.2)
+        self.engine._on_key_up(MagicMock(event_type="up"))
+        time.sleep(0.02)
+
+        self.mock_actions.execute.assert_called_with("Action_long_press")
+        self.assertNotIn(unittest.mock.call("Action_chord"), self.mock_actions.execute.call_args_list)
+        self.engine._on_key_up(MagicMock(event_type="up"), self.volume_up)
+
+    def map_gestures(self, **overrides):
+        mapping = {
+            "single_tap": "Action_single_tap",
+            "double_tap": "Action_double_tap",
+            "triple_tap": "Action_triple_tap",
+            "long_press": "Action_long_press",
+        }
+        mapping.update(overrides)
+        self.config.get_gesture.side_effect = lambda x, button="play_pause", app=None: mapping.get(x)
+
+    def test_single_tap_resolves_immediately_when_only_single_mapped(self):
+        print("\nTesting Immediate Single Tap...")
+        self.map_gestures(double_tap="None", triple_tap="None")
+        self.simulate_tap()
+
+        # Well below the 400ms multi-tap window
+        time.sleep(0.05)
+
+        self.mock_actions.execute.assert_called_once_with("Action_single_tap")
+
+    def test_double_tap_resolves_immediately_when_triple_unmapped(self):
+        print("\nTesting Immediate Double Tap...")
+        self.map_gestures(triple_tap=None)
+        self.simulate_tap()
+        time.sleep(0.1)
+        self.simulate_tap()
+
+        time.sleep(0.05)
+
+        self.mock_actions.execute.assert_called_once_with("Action_double_tap")
+
+    def test_single_tap_waits_when_double_mapped(self):
+        self.map_gestures(triple_tap="None")
+        self.simulate_tap()
+
+        time.sleep(0.1)
+        self.mock_actions.execute.assert_not_called()
+
+        time.sleep(0.4)
+        self.mock_actions.execute.assert_called_once_with("Action_single_tap")
+
+class TestAdaptiveTiming(unittest.TestCase):
+    def test_p2_quantile_tracks_distribution(self):
+        import random
+        rng = random.Random(42)
+        sketch = P2Quantile(0.95)
+        samples = [rng.uniform(0.0, 1.0) for _ in range(5000)]
+        for x in samples:
+            sketch.add(x)
+
+        self.assertAlmostEqual(sketch.value(), 0.95, delta=0.02)
+
+    def test_p2_quantile_small_sample_is_exact(self):
+        sketch = P2Quantile(0.5)
+        for x in (0.3, 0.1, 0.2):
+            sketch.add(x)
+        self.assertEqual(sketch.value(), 0.2)
+
+    def test_fast_tapper_shrinks_window(self):
+        timing = AdaptiveTiming(0.4, 0.5)
+        for _ in range(50):
+            timing.observe_gap(0.12)
+
+        self.assertLess(timing.multi_tap_window, 0.4)
+        self.assertGreaterEqual(timing.multi_tap_window, MIN_MULTI_TAP_WINDOW)
+
+    def test_slow_tapper_stretches_window_within_bounds(self):
+        timing = AdaptiveTiming(0.4, 0.5)
+        for _ in range(200):
+            # Second taps that keep just missing the window
+            timing.observe_gap(timing.multi_tap_window + 0.05)
+
+        self.assertGreater(timing.multi_tap_window, 0.4)
+        self.assertLessEqual(timing.multi_tap_window, MAX_MULTI_TAP_WINDOW)
+
+    def test_steady_single_taps_dont_grow_window(self):
+        timing = AdaptiveTiming(0.4, 0.5)
+        for _ in range(200):
+            self.assertFalse(timing.observe_gap(0.6))
+
+        self.assertEqual(timing.multi_tap_window, 0.4)
+        self.assertEqual(timing.tap_gaps.count, 0)
+
+    def test_long_press_threshold_splits_taps_and_holds(self):
+        timing = AdaptiveTiming(0.4, 0.5)
+        for _ in range(30):
+            timing.observe_hold(0.1, False)
+            timing.observe_hold(0.9, True)
+
+        self.assertGreater(timing.long_press_threshold, 0.1)
+        self.assertLess(timing.long_press_threshold, 0.9)
+
+    def test_stored_values_are_clamped(self):
+        timing = AdaptiveTiming.from_dict({"multi_tap_window": 5, "long_press_threshold": 0.01}, 0.4, 0.5)
+        self.assertEqual(timing.multi_tap_window, MAX_MULTI_TAP_WINDOW)
+        self.assertGreater(timing.long_press_threshold, 0.01)
+
+    def test_engine_persists_learned_timing_per_device(self):
+        config = ConfigManager.__new__(ConfigManager)
+        config.config = {"gestures": {}, "target_device": "Buds A"}
+
+        with patch('src.gesture_engine.BluetoothManager'), patch('src.gesture_engine.ActionManager'):
+            engine = GestureEngine(config)
+        engine._sync_timing_device()
+        for _ in range(30):
+            engine.timing.observe_gap(0.1)
+        engine._store_timing()
+
+        self.assertIn("Buds A", config.config["timing"])
+        stored = config.get_timing("Buds A")["multi_tap_window"]
+
+        # Switching device starts from that device's own values
+        config.set_target_device("Buds B")
+        engine._sync_timing_device()
+        self.assertEqual(engine.timing.multi_tap_window, 0.4)
+
+        config.set_target_device("Buds A")
+        engine._sync_timing_device()
+        self.assertEqual(engine.timing.multi_tap_window, stored)
+
+class TestTracing(unittest.TestCase):
+    def test_disabled_tracer_records_nothing(self):
+        from src.tracing import Tracer, span, tracer
+        t = Tracer(capacity=16)
+        t.begin("a")
+        t.end("a")
+        self.assertEqual(t.to_chrome_trace()["traceEvents"], [])
+
+        tracer.disable()
+        self.assertIs(span("x"), span("y"))
+
+    def test_chrome_trace_export(self):
+        import json
+        import os
+        import tempfile
+        import threading
+        from src.tracing import Tracer, _Span
+
+        t = Tracer(capacity=64)
+        t.enable()
+
+        def work():
+            with _Span(t, "engine.work"):
+                pass
+
+        start = t.now()
+        worker = threading.Thread(target=work, name="worker")
+        worker.start()
+        worker.join()
+        t.complete("engine.tap_window", start)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = t.export(os.path.join(tmp, "trace.json"))
+            with open(path) as f:
+                data = json.load(f)
+
+        events = [e for e in data["traceEvents"] if e["ph"] != "M"]
+        phases = [e["ph"] for e in events]
+        self.assertEqual(phases.count("B"), 1)
+        self.assertEqual(phases.count("E"), 1)
+        self.assertEqual(phases.count("X"), 1)
+
+        names = [e["args"]["name"] for e in data["traceEvents"] if e["ph"] == "M"]
+        self.assertIn("worker", names)
+
+    def test_ring_buffer_keeps_newest(self):
+        from src.tracing import Tracer
+        t = Tracer(capacity=4)
+        t.enable()
+        for i in range(10):
+            t.instant(f"event.{i}")
+
+        names = [e["name"] for e in t.to_chrome_trace()["traceEvents"] if e["ph"] != "M"]
+        self.assertEqual(names, ["event.6", "event.7", "event.8", "event.9"])
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        from src.scheduler import Scheduler
+        self.scheduler = Scheduler()
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def on_repeat(self, count):
+        with self.lock:
+            self.count += count
+
+    def test_call_later(self):
+        fired = threading.Event()
+        self.scheduler.call_later(0.05, fired.set)
+        self.assertTrue(fired.wait(1))
+
+    def test_repeat_rate_accuracy(self):
+        job = self.scheduler.repeat(self.on_repeat, rate=100.0)
+        time.sleep(0.5)
+        self.scheduler.cancel(job)
+
+        # 1 immediate + 100/s for 0.5s, batched every 20ms
+        self.assertAlmostEqual(self.count, 51, delta=5)
+
+    def test_repeat_acceleration(self):
+        from src.scheduler import RepeatJob
+        job = RepeatJob(0.0, None, rate=10.0, max_rate=100.0, acceleration=100.0)
+        # 0.9s to reach 100/s: 9 + 40.5 repeats, then 100/s for 0.1s
+        self.assertEqual(job.repeats_due(1.0), 1 + 59)
+        for index in (2, 20, 55, 80):
+            self.assertEqual(job.repeats_due(job.time_of_repeat(index)), index)
+
+    def test_stop_latency(self):
+        job = self.scheduler.repeat(self.on_repeat, rate=200.0)
+        time.sleep(0.2)
+
+        start = time.perf_counter()
+        fired = self.scheduler.cancel(job)
+        stop_latency = time.perf_counter() - start
+
+        self.assertLess(stop_latency, 0.01)
+        with self.lock:
+            self.assertEqual(self.count, fired)
+
+        # Nothing is injected after cancel() returns
+        time.sleep(0.1)
+        self.assertEqual(self.count, fired)
+
+    def test_failing_callback_doesnt_stop_later_jobs(self):
+        def fail(*args):
+            raise RuntimeError("action failed")
+
+        fired = threading.Event()
+        with self.assertLogs("src.scheduler", "ERROR"):
+            self.scheduler.call_later(0, fail)
+            job = self.scheduler.repeat(fail, rate=50.0)
+            time.sleep(0.1)
+            self.scheduler.call_later(0.01, fired.set)
+            self.assertTrue(fired.wait(1))
+        # The repeating job stays armed after its callback raised
+        self.assertGreater(self.scheduler.cancel(job), 1)
+
+class TestActionInjection(unittest.TestCase):
+    def setUp(self):
+        from src.actions import ActionManager
+        from src.injector import Injector, RecordingBackend
+        self.backend = RecordingBackend()
+        self.actions = ActionManager(Injector(self.backend))
+
+    def test_combo_is_one_batch(self):
+        from src.injector import KEY, VK_MENU, VK_TAB
+        self.actions.execute("Alt + Tab")
+
+        self.assertEqual(self.backend.batches, [(
+            (KEY, VK_MENU, False), (KEY, VK_TAB, False), (KEY, VK_TAB, True), (KEY, VK_MENU, True),
+        )])
+
+    def test_repeat_batch(self):
+        from src.injector import WHEEL
+        self.actions.execute_repeat("Scroll Down", 3)
+        self.actions.execute_repeat("Volume Up", 2)
+
+        self.assertEqual(self.backend.batches[0], ((WHEEL, -360),))
+        self.assertEqual(len(self.backend.batches[1]), 4)
+
+    def test_unknown_and_none_inject_nothing(self):
+        self.actions.execute("None")
+        self.actions.execute("Does Not Exist")
+        self.assertEqual(self.backend.batches, [])
+
+    def test_per_action_latency_after_warm_up(self):
+        self.actions._prepare_all()
+
+        runs = 1000
+        start = time.perf_counter()
+        for _ in range(runs):
+            self.actions.execute("Switch Desktop")
+        per_action = (time.perf_counter() - start) / runs
+
+        self.assertEqual(len(self.backend.batches), runs)
+        self.assertLess(per_action, 0.001)
+
+@unittest.skipIf(sys.platform == "win32", "uses /bin/sh workers")
+class TestCommandPool(unittest.TestCase):
+    def setUp(self):
+        from src.command_pool import CommandPool
+        self.lines = []
+        self.logged = threading.Condition()
+        self.pool = CommandPool(size=2, max_queued=2, log=self.log)
+        self.pool.start()
+
+    def tearDown(self):
+        self.pool.stop()
+
+    def log(self, line):
+        with self.logged:
+            self.lines.append((time.perf_counter(), line))
+            self.logged.notify_all()
+
+    def wait_for(self, text, timeout=5):
+        with self.logged:
+            self.logged.wait_for(lambda: any(text in l for _, l in self.lines), timeout)
+        matches = [t for t, l in self.lines if text in l]
+        self.assertTrue(matches, f"{text!r} not logged: {self.lines}")
+        return matches[0]
+
+    def test_output_and_exit_code_logged(self):
+        self.pool.submit("greet", "echo hello; echo oops >&2; exit 3")
+        self.wait_for("Exit code 3")
+        logged = [l for _, l in self.lines]
+        self.assertIn("[Command greet] hello", logged)
+        self.assertIn("[Command greet] oops", logged)
+
+    def test_warm_start_latency(self):
+        # Warm both shells first
+        self.pool.submit("a", "true")
+        self.pool.submit("b", "true")
+        self.wait_for("[Command b] Exit code")
+
+        submitted = time.perf_counter()
+        self.pool.submit("fast", "echo started")
+        started = self.wait_for("[Command fast] started")
+        self.assertLess(started - submitted, 0.05)
+
+    def test_timeout_restarts_worker(self):
+        self.pool.submit("slow", "sleep 5", timeout=0.2)
+        self.wait_for("[Command slow] Timed out")
+
+        self.pool.submit("after", "echo still working")
+        self.wait_for("[Command after] still working")
+
+    def test_concurrency_cap_and_queue_limit(self):
+        self.pool.submit("a", "true")
+        self.pool.submit("b", "true")
+        self.wait_for("[Command b] Exit code")
+
+        start = time.perf_counter()
+        for i in range(4):
+            self.assertTrue(self.pool.submit(f"job{i}", "sleep 0.3"))
+            if i == 1:
+                time.sleep(0.05)  # let both shells pick up their job
+        # Two running, two waiting: the next one is rejected
+        self.assertFalse(self.pool.submit("overflow", "true"))
+
+        self.wait_for("[Command job3] Exit code")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.6)
+        self.assertFalse(any("overflow" in l and "Exit" in l for _, l in self.lines))
+
+    def test_stop_skips_waiting_commands_and_releases_workers(self):
+        self.pool.submit("a", "true")
+        self.pool.submit("b", "true")
+        self.wait_for("[Command b] Exit code")
+
+        self.pool.submit("busy1", "sleep 0.3")
+        self.pool.submit("busy2", "sleep 0.3")
+        time.sleep(0.05)  # both shells busy
+        self.pool.submit("waiting1", "echo late")
+        self.pool.submit("waiting2", "echo late")
+
+        start = time.perf_counter()
+        self.pool.stop()
+        # Only the running commands are waited for
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.wait_for("2 commands still waiting")
+        self.assertFalse(any("waiting" in l and "Exit" in l for _, l in self.lines))
+        self.assertEqual(self.pool.workers, [])
+
+        # Restarting doesn't pile up the old workers
+        self.pool.start()
+        self.pool.submit("again", "true")
+        self.wait_for("[Command again] Exit code")
+        self.assertLessEqual(len(self.pool.workers), 2)
+
+class TestInputQueue(unittest.TestCase):
+    def setUp(self):
+        self.gate = threading.Event()
+        self.handled = []
+
+    def tearDown(self):
+        self.gate.set()
+        self.queue.stop()
+
+    def handler(self, key, is_down, timestamp):
+        # The first event holds the consumer until the test opens the gate
+        self.gate.wait()
+        self.handled.append((key, is_down, timestamp))
+
+    def make_queue(self, policy, size=4):
+        from src.input_queue import InputQueue
+        self.queue = InputQueue(self.handler, size, policy)
+        self.queue.push("a", True, 0)
+        deadline = time.monotonic() + 1
+        while self.queue.stats()["queued"] and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def drain(self):
+        self.gate.set()
+        deadline = time.monotonic() + 1
+        while self.queue.stats()["queued"] and time.monotonic() < deadline:
+            time.sleep(0.001)
+        time.sleep(0.01)
+
+    def test_full_queue_drops_oldest(self):
+        from src.input_queue import DROP_OLDEST
+        self.make_queue(DROP_OLDEST)
+        for t in range(1, 7):
+            self.queue.push("a", t % 2 == 0, t)
+        self.drain()
+
+        self.assertEqual([e[2] for e in self.handled], [0, 3, 4, 5, 6])
+        stats = self.queue.stats()
+        self.assertEqual((stats["pushed"], stats["dropped"], stats["collapsed"]), (7, 2, 0))
+        self.assertEqual(stats["high_water"], 4)
+
+    def test_repeats_collapse(self):
+        from src.input_queue import COLLAPSE_REPEATS
+        self.make_queue(COLLAPSE_REPEATS)
+        for key, is_down, t in [("a", True, 1), ("a", True, 2), ("a", True, 3), ("b", True, 4),
+                                ("a", False, 5), ("a", False, 6)]:
+            self.queue.push(key, is_down, t)
+        self.drain()
+
+        # Each run of the same edge keeps its first (earliest) event
+        self.assertEqual([e[2] for e in self.handled], [0, 1, 4, 5])
+        self.assertEqual(self.queue.stats()["collapsed"], 3)
+
+    def test_unknown_policy(self):
+        from src.input_queue import InputQueue
+        with self.assertRaises(ValueError):
+            InputQueue(self.handler, policy="drop_everything")
+        self.queue = InputQueue(self.handler)
+
+class TestInputFilter(unittest.TestCase):
+    def setUp(self):
+        from src.input_filter import FilterPipeline
+        self.delivered = []
+        self.pipeline = FilterPipeline(lambda key, t: self.delivered.append((key, "down", t)),
+                                       lambda key, t: self.delivered.append((key, "up", t)))
+
+    def play(self, trace):
+        # Traces are (ms, key, "down"/"up"), as recorded from the devices
+        for ms, key, edge in trace:
+            self.pipeline.process(key, edge == "down", ms / 1000.0)
+        return [(key, edge, round(t * 1000)) for key, edge, t in self.delivered]
+
+    def test_resent_pair_is_one_tap(self):
+        delivered = self.play([(0, "a", "down"), (80, "a", "up"), (83, "a", "down"), (85, "a", "up")])
+        self.assertEqual(delivered, [("a", "down", 0), ("a", "up", 80)])
+        self.assertEqual(self.pipeline.stats()["debounce"], 2)
+
+    def test_repeated_edges_are_dropped(self):
+        delivered = self.play([(0, "a", "down"), (4, "a", "down"), (9, "a", "down"),
+                               (90, "a", "up"), (92, "a", "up")])
+        self.assertEqual(delivered, [("a", "down", 0), ("a", "up", 90)])
+        self.assertEqual(self.pipeline.stats()["duplicates"], 3)
+
+    def test_real_double_tap_and_other_keys_pass(self):
+        trace = [(0, "a", "down"), (10, "b", "down"), (80, "a", "up"), (85, "b", "up"),
+                 (200, "a", "down"), (280, "a", "up")]
+        self.assertEqual(self.play(trace), [(key, edge, ms) for ms, key, edge in trace])
+        self.assertEqual(sum(self.pipeline.stats().values()), 0)
+
+    def test_orphan_releases_are_dropped(self):
+        # A release resent 40ms later, past the duplicate window, and one
+        # with no press at all
+        delivered = self.play([(0, "a", "down"), (100, "a", "up"), (140, "a", "up"), (300, "b", "up")])
+        self.assertEqual(delivered, [("a", "down", 0), ("a", "up", 100)])
+        self.assertEqual(self.pipeline.stats()["orphans"], 2)
+
+    def test_device_window(self):
+        config = ConfigManager.__new__(ConfigManager)
+        config.config = {"device_debounce_ms": {"Cheap Buds": 40}}
+        self.assertEqual(config.get_debounce_window("Other Buds"), 0.025)
+        self.pipeline.set_window(config.get_debounce_window("Cheap Buds"))
+
+        # 30ms after the release: chatter for this device
+        delivered = self.play([(0, "a", "down"), (80, "a", "up"), (110, "a", "down"), (120, "a", "up")])
+        self.assertEqual(delivered, [("a", "down", 0), ("a", "up", 80)])
+
+    def test_configure(self):
+        self.play([(0, "a", "down"), (4, "a", "down")])
+        self.pipeline.configure(["duplicates", "debounce", "orphans"], 0.03)
+        self.assertEqual(self.pipeline.stats()["duplicates"], 1)
+
+        self.pipeline.configure(["orphans"], 0.03)
+        self.assertEqual(self.pipeline.stats(), {"orphans": 0})
+        with self.assertRaises(ValueError):
+            self.pipeline.configure(["bounce"], 0.03)
+
+class TestTimebase(unittest.TestCase):
+    def feed(self, timebase, source, delays, start=0.0, step=0.01, rate=1.0, offset=100.0):
+        # Events every `step` seconds of true time; the source clock runs at
+        # `rate` and callbacks see them `delays[i]` late
+        errors = []
+        for i, delay in enumerate(delays):
+            true = start + i * step
+            mapped = timebase.map(source(true * rate), offset + true + delay)
+            errors.append(mapped - (offset + true))
+        return errors
+
+    def test_offset_and_drift(self):
+        import random
+        from src.timebase import Timebase
+        rng = random.Random(1)
+        timebase = Timebase("test")
+        # 100 ppm fast source, 0.2 ms minimum delivery delay plus exponential jitter
+        delays = [0.0002 + rng.expovariate(1 / 0.003) for _ in range(60000)]
+        errors = self.feed(timebase, lambda t: 1.7e9 + t, delays, rate=1 + 100e-6)
+
+        # Jitter no longer shows in mapped times, only the minimum delay does
+        self.assertLess(max(abs(e) for e in errors[-10000:]), 0.001)
+        stats = timebase.stats()
+        self.assertAlmostEqual(stats["drift_ppm"], 100, delta=5)
+        self.assertAlmostEqual(stats["delay_ms"], 3.0, delta=0.5)
+
+    def test_clock_change_resyncs(self):
+        from src.timebase import Timebase
+        timebase = Timebase("test")
+        self.feed(timebase, lambda t: 1.7e9 + t, [0.001] * 100)
+        # Wall clock set back an hour
+        errors = self.feed(timebase, lambda t: 1.7e9 - 3600 + t, [0.001] * 100, start=1.0)
+        self.assertEqual(timebase.stats()["resyncs"], 1)
+        self.assertLess(max(abs(e) for e in errors), 0.002)
+
+    def test_tick_counter_wraps(self):
+        from src.timebase import Timebase
+        timebase = Timebase("ticks", scale=0.001, wrap=2 ** 32)
+        errors = self.feed(timebase, lambda t: int(2 ** 32 - 500 + t * 1000) % 2 ** 32, [0.002] * 200)
+        self.assertEqual(timebase.stats()["resyncs"], 0)
+        self.assertLess(max(abs(e) for e in errors), 0.003)
+
+    def test_events_without_timestamp_map_to_arrival(self):
+        from src.timebase import Timebase
+        self.assertEqual(Timebase("test").map(None, 5.0), 5.0)
+
+class TestBackendBench(unittest.TestCase):
+    def test_stand_ins_deliver_everything(self):
+        from src.backend_bench import compare, format_report
+        report = compare(events=200, rate=5000, settle=1)
+        self.assertEqual(len(report["results"]), 3)
+        for result in report["results"]:
+            self.assertEqual((result["sent"], result["received"], result["drop_rate"]), (200, 200, 0.0))
+            self.assertGreater(result["p50_ms"], 0)
+            self.assertGreaterEqual(result["p99_ms"], result["p50_ms"])
+            self.assertGreaterEqual(result["cpu_ms_per_1k"], 0)
+        self.assertIn(report["recommended"], [r["backend"] for r in report["results"]])
+        self.assertIn("Recommended:", format_report(report))
+
+    def test_drops_are_counted_and_lose_the_recommendation(self):
+        from src.backend_bench import StandInBackend, compare
+
+        class Lossy(StandInBackend):
+            # Misses every tenth event, like a hook Windows timed out
+            def send(self, key, is_down):
+                self.count = getattr(self, "count", 0) + 1
+                if self.count % 10:
+                    super().send(key, is_down)
+
+        report = compare([Lossy("lossy"), StandInBackend("steady", hops=3)], events=200, rate=5000, settle=0.2)
+        lossy = report["results"][0]
+        self.assertEqual(lossy["received"], 180)
+        self.assertAlmostEqual(lossy["drop_rate"], 0.1)
+        self.assertEqual(report["recommended"], "steady")
+
+class TestEngineBench(unittest.TestCase):
+    def test_hook_path_is_timed_up_to_the_queue(self):
+        from src.engine_bench import measure_hook_latency
+        with patch('src.gesture_engine.BluetoothManager'), patch('src.gesture_engine.ActionManager') as actions:
+            result = measure_hook_latency(False, duration=0.3, interval=0.005, config=MagicMock(spec=ConfigManager))
+        self.assertGreater(result["samples"], 10)
+        self.assertGreaterEqual(result["p99_ms"], result["p50_ms"])
+        self.assertGreaterEqual(result["max_ms"], result["p99_ms"])
+        # Queued events are discarded, never turned into actions
+        actions.return_value.execute.assert_not_called()
+
+class TestUsageStats(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        from src.usage_stats import UsageStats
+        self.tmp = tempfile.TemporaryDirectory()
+        self.now = 1_750_000_000.0  # mid-June 2025
+        self.usage = UsageStats(self.tmp.name, max_raw_bytes=20 * 100, max_days=30, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.usage.stop()
+        self.tmp.cleanup()
+
+    def file_size(self, name):
+        import os
+        return os.path.getsize(os.path.join(self.tmp.name, name))
+
+    def test_query_counts_and_percentiles(self):
+        from src import usage_stats
+        self.usage.start()
+        for i in range(100):
+            self.usage.record("Double Tap", "Next Track", "Buds", (i + 1) / 1000, usage_stats.ACTION)
+        self.usage.record("Double Tap", "None", "Buds", 0.01, usage_stats.UNMAPPED)
+        self.usage.record("Long Press", "Switch Desktop", "Buds", 0.6, usage_stats.RECLASSIFIED)
+        self.usage.flush()
+
+        stats = usage_stats.query(self.tmp.name)
+        self.assertEqual(stats["Double Tap"]["count"], 101)
+        self.assertEqual(stats["Double Tap"]["outcomes"], {"action": 100, "unmapped": 1})
+        # Histogram buckets are 2^(1/4) apart, so percentiles are within ~19%
+        self.assertAlmostEqual(stats["Double Tap"]["p50_ms"], 50, delta=10)
+        self.assertAlmostEqual(stats["Double Tap"]["p95_ms"], 95, delta=19)
+        self.assertEqual(stats["Long Press"]["outcomes"], {"reclassified": 1})
+
+    def test_storage_stays_bounded(self):
+        from src import usage_stats
+        self.usage.start()
+        # A year of use, 150 gestures a day
+        for day in range(365):
+            for i in range(150):
+                self.usage.record("Single Tap", "Play/Pause", "Buds", 0.3, usage_stats.ACTION)
+            self.usage.flush()
+            self.assertLessEqual(self.file_size(usage_stats.RAW_FILE), 20 * 100 + 20 * 150)
+            self.now += 86400
+        self.usage.stop()
+
+        self.assertLess(self.file_size(usage_stats.DAILY_FILE), 31 * 1024)
+        stats = usage_stats.query(self.tmp.name)
+        # Only the days still kept, all counted once
+        self.assertLessEqual(stats["Single Tap"]["count"], 31 * 150)
+        self.assertEqual(stats["Single Tap"]["count"] % 150, 0)
+
+    def test_compaction_keeps_totals(self):
+        import datetime
+        from src import usage_stats
+        self.usage.start()
+        for i in range(250):
+            self.usage.record("Triple Tap", "Lock Screen", "Buds", 0.05, usage_stats.ACTION)
+        self.usage.flush()
+        # Past the raw size limit: folded into the day's aggregate
+        self.assertLess(self.file_size(usage_stats.RAW_FILE), 20 * 100)
+        today = datetime.date.fromtimestamp(self.now)
+        self.assertEqual(usage_stats.query(self.tmp.name, days=1, today=today)["Triple Tap"]["count"], 250)
+
+    def test_query_waits_out_a_half_done_compaction(self):
+        from src import usage_stats
+        self.usage.start()
+        for i in range(10):
+            self.usage.record("Double Tap", "Next Track", "Buds", 0.2, usage_stats.ACTION)
+        self.usage.flush()
+
+        # daily.json already holds the records but the log isn't emptied yet
+        emptied = []
+        with patch.object(self.usage, "_reset_raw", side_effect=emptied.append):
+            self.usage.compact()
+        reset = usage_stats.UsageStats._reset_raw.__get__(self.usage)
+        with patch('src.usage_stats.time.sleep', side_effect=lambda delay: reset(emptied.pop())) as sleep:
+            stats = usage_stats.query(self.tmp.name)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(stats["Double Tap"]["count"], 10)
+
+class TestSoak(unittest.TestCase):
+    def test_virtual_scheduler_fires_at_deadlines(self):
+        from src.soak import VirtualClock, VirtualScheduler
+        clock = VirtualClock()
+        scheduler = VirtualScheduler(clock)
+        fired = []
+        scheduler.call_later(2.0, lambda: fired.append(("b", clock())))
+        scheduler.call_later(0.5, lambda: fired.append(("a", clock())))
+        job = scheduler.repeat(lambda count: fired.append(("repeat", count)), rate=10, delay=3.0)
+
+        scheduler.run_until(1.0)
+        self.assertEqual(fired, [("a", 0.5)])
+        self.assertEqual(clock(), 1.0)
+        scheduler.run_until(4.0)
+        scheduler.cancel(job)
+        self.assertEqual(fired[1], ("b", 2.0))
+        self.assertEqual(sum(count for name, count in fired[2:]), 11)
+
+    def test_short_soak_stays_flat(self):
+        from src.soak import run_soak
+        report = run_soak(hours=1, snapshot_interval=600, warmup=1200)
+
+        self.assertTrue(report["passed"], report["failures"])
+        self.assertEqual(report["virtual_hours"], 1)
+        self.assertGreater(report["gestures"], 50)
+        self.assertEqual(len(report["snapshots"]), 7)
+        self.assertEqual(report["growth"]["hooks"], 0)
+
+    def test_leak_fails_the_run(self):
+        from src.soak import run_soak
+        leaked = []
+        resolve_taps = GestureEngine._resolve_taps
+
+        def leaky_resolve_taps(engine, state):
+            leaked.append(bytearray(4096))
+            resolve_taps(engine, state)
+
+        with patch.object(GestureEngine, "_resolve_taps", leaky_resolve_taps):
+            report = run_soak(hours=1, snapshot_interval=600, warmup=1200, limits={"memory_kb": 100})
+
+        self.assertFalse(report["passed"])
+        self.assertTrue(any(f.startswith("memory_kb") for f in report["failures"]), report["failures"])
+        self.assertTrue(any("test_logic.py" in line for line in report["top_growth"]), report["top_growth"])
+
+    def test_debug_log_drops_oldest_when_behind(self):
+        from src.debug_log import DebugLogBuffer
+        flushes = []
+        log = DebugLogBuffer(lambda: flushes.append(1), max_pending=3)
+        for i in range(5):
+            log.append(f"{i}\n")
+
+        self.assertEqual(len(flushes), 1)
+        self.assertEqual(log.drain(), "[Debug] 2 messages dropped\n2\n3\n4\n")
+        log.append("5\n")
+        self.assertEqual((len(flushes), log.drain()), (2, "5\n"))
+
+    def test_thread_growth_fails(self):
+        from src.soak import check_growth
+        snapshots = [{"virtual_s": t * 600, "memory_kb": 100, "threads": 5 + (t == 3), "handles": None, "hooks": 8}
+                     for t in range(4)]
+        baseline, failures = check_growth(snapshots, warmup=600)
+        self.assertEqual(baseline["virtual_s"], 600)
+        self.assertEqual(len(failures), 1)
+        self.assertTrue(failures[0].startswith("threads grew by 1"))
+
+class TestHookWatchdog(unittest.TestCase):
+    def setUp(self):
+        from src.hook_watchdog import HookWatchdog
+        self.alive = True
+        self.reinstalled = threading.Event()
+        self.watchdog = HookWatchdog(self.send_probe, self.reinstall, budget=0.01,
+                                     probe_interval=60, probe_timeout=0.1)
+
+    def tearDown(self):
+        self.watchdog.stop()
+
+    def send_probe(self):
+        if self.alive:
+            self.watchdog.probe_seen()
+
+    def reinstall(self):
+        self.alive = True
+        self.reinstalled.set()
+
+    def test_live_hook_passes_probe(self):
+        self.assertTrue(self.watchdog.check())
+        self.assertEqual(self.watchdog.stats()["recoveries"], 0)
+
+    def test_dead_hook_is_reinstalled(self):
+        self.alive = False
+        self.assertFalse(self.watchdog.check())
+        self.assertTrue(self.reinstalled.is_set())
+        self.assertEqual(self.watchdog.stats()["recoveries"], 1)
+        self.assertTrue(self.watchdog.check())
+
+    def test_overrun_triggers_probe(self):
+        self.watchdog.start()
+        self.alive = False
+
+        self.watchdog.record(0.005)
+        self.watchdog.record(0.02)
+
+        # Checked right away rather than after the 60s probe interval
+        self.assertTrue(self.reinstalled.wait(1))
+        stats = self.watchdog.stats()
+        self.assertEqual(stats["calls"], 2)
+        self.assertEqual(stats["overruns"], 1)
+
+    def test_silent_dead_hook_is_still_checked(self):
+        # A removed hook delivers no callbacks, so nothing calls record()
+        self.watchdog.idle_probe_interval = 0.1
+        self.alive = False
+        self.watchdog.start()
+
+        self.assertTrue(self.reinstalled.wait(1))
+        self.assertEqual(self.watchdog.stats()["recoveries"], 1)
+
+    def test_idle_user_is_not_probed(self):
+        # Injected probes would keep resetting the system's idle timers
+        last_input = [1000]
+        self.watchdog.last_input = lambda: last_input[0]
+        self.watchdog.idle_probe_interval = 0.05
+        self.watchdog.start()
+        time.sleep(0.3)
+        self.assertEqual(self.watchdog.stats()["probes"], 0)
+        self.assertGreater(self.watchdog.stats()["idle_skips"], 0)
+
+        # The user is back: the next idle check probes again
+        last_input[0] = 2000
+        time.sleep(0.2)
+        self.assertGreaterEqual(self.watchdog.stats()["probes"], 1)
+
+class TestNotifier(unittest.TestCase):
+    def setUp(self):
+        from src.notifications import Notifier, RecordingBackend
+        self.backend = RecordingBackend()
+        self.notifier = Notifier(self.backend, min_interval=0.2)
+        self.notifier.start()
+
+    def tearDown(self):
+        self.notifier.stop()
+
+    def test_burst_is_coalesced_and_rate_limited(self):
+        self.notifier.notify("repeat:Volume Up", "Hold: Volume Up")
+        time.sleep(0.05)
+        for _ in range(49):
+            self.notifier.notify("repeat:Volume Up", "Hold: Volume Up")
+        time.sleep(0.1)
+        # Still inside the rate limit: only the first one so far
+        self.assertEqual(len(self.backend.shown), 1)
+
+        time.sleep(0.2)
+        messages = [m for _, _, m in self.backend.shown]
+        self.assertEqual(messages, ["Hold: Volume Up", "Hold: Volume Up (x49)"])
+
+    def test_notify_never_waits_for_the_backend(self):
+        shown = threading.Event()
+        self.backend.show = lambda key, title, message: time.sleep(0.3) or shown.set()
+
+        start = time.perf_counter()
+        for i in range(100):
+            self.notifier.notify(f"action:{i % 3}", "Double Tap: Scroll Down")
+        self.assertLess(time.perf_counter() - start, 0.05)
+        self.assertTrue(shown.wait(1))
+
+    def test_disabled_notifier_shows_nothing(self):
+        self.notifier.enabled = False
+        self.notifier.notify("connection", "Buds connected")
+        time.sleep(0.05)
+        self.assertEqual(self.backend.shown, [])
+
+    def test_backend_is_closed_on_the_notifier_thread(self):
+        closed_on = []
+        self.backend.close = lambda: closed_on.append(threading.current_thread().name)
+        self.notifier.notify("connection", "Buds connected")
+        time.sleep(0.05)
+        self.notifier.stop()
+        self.assertEqual(closed_on, ["Notifier"])
+
+def _push_from_child(name, count):
+    from src.event_ring import EventRing, GESTURE
+    ring = EventRing(name)
+    for i in range(count):
+        ring.push(GESTURE, i, text=f"Double Tap: {i}")
+    ring.close()
+
+class TestEventRing(unittest.TestCase):
+    def setUp(self):
+        from src.event_ring import EventRing
+        self.ring = EventRing(capacity=8)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_host_reports_from_many_threads_arrive_intact(self):
+        from src.event_ring import EventRing, GESTURE
+        from src.engine_process import EngineHost
+        # Room for every record, so any shortfall was overwritten, not dropped
+        ring = EventRing(capacity=16384)
+        self.addCleanup(ring.close)
+        calls = iter(range(10 ** 6))
+        engine = MagicMock()
+        engine.hook_stats.side_effect = lambda: {"calls": next(calls), "overruns": 0, "max_ms": 0.0, "recoveries": 0,
+                                                 "connected": True, "dropped": 0, "collapsed": 0, "delay_ms": 0.0}
+        host = EngineHost(engine, ring)
+
+        def produce(name):
+            for i in range(2000):
+                host.gesture(name, str(i)) if i % 2 else host.publish_stats()
+
+        # Switch threads as often as possible, so unsynchronised pushes would collide
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        threads = [threading.Thread(target=produce, args=(f"t{n}",)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        records = ring.pop_all()
+
+        gestures = [r[3] for r in records if r[0] == GESTURE]
+        stats = [r[1] for r in records if r[0] != GESTURE]
+        # 1000 gestures (plus their stats) and 1000 stats updates per thread
+        self.assertEqual(len(records), 4 * 3000)
+        self.assertEqual(len(set(gestures)), len(gestures))
+        for n in range(4):
+            mine = [int(g.split(": ")[1]) for g in gestures if g.startswith(f"t{n}:")]
+            self.assertEqual(mine, sorted(mine))
+        self.assertEqual(stats, sorted(stats))
+
+    def test_records_cross_processes_in_order(self):
+        import multiprocessing
+        from src.event_ring import GESTURE
+        child = multiprocessing.Process(target=_push_from_child, args=(self.ring.name, 5))
+        child.start()
+        child.join(5)
+
+        records = self.ring.pop_all()
+        self.assertEqual([r[3] for r in records], [f"Double Tap: {i}" for i in range(5)])
+        self.assertEqual({r[0] for r in records}, {GESTURE})
+        self.assertEqual(self.ring.pop_all(), [])
+
+    def test_full_ring_drops_instead_of_blocking(self):
+        from src.event_ring import STATS
+        results = [self.ring.push(STATS, i) for i in range(10)]
+        self.assertEqual(results, [True] * 8 + [False] * 2)
+        self.assertEqual(self.ring.dropped, 2)
+        self.assertEqual([r[1] for r in self.ring.pop_all()], list(range(8)))
+        # Space frees up once the consumer has read
+        self.assertTrue(self.ring.push(STATS, 8))
+
+    def test_learned_timing_survives_repeated_saves_from_the_ui(self):
+        import json
+        import os
+        import tempfile
+        from src.engine_process import reload_engine
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "config.json")
+        with patch('src.config_manager.CONFIG_FILE', path):
+            ui_config = ConfigManager()
+            engine_config = ConfigManager()
+            engine = MagicMock(timing_device="Buds A", timing_dirty=False)
+            engine.timing.to_dict.return_value = {"multi_tap_window": 0.3, "long_press_threshold": 0.45}
+
+            def engine_reload():
+                # stop() saves learned thresholds and clears the flag
+                if engine.timing_dirty:
+                    engine_config.save_config()
+                    engine.timing_dirty = False
+            engine.reload.side_effect = engine_reload
+
+            learned = {}
+            for _ in range(3):
+                # The UI's copy never saw the learned thresholds
+                ui_config.save_config()
+                reload_engine(engine, engine_config, learned)
+                with open(path) as f:
+                    self.assertEqual(json.load(f)["timing"]["Buds A"]["multi_tap_window"], 0.3)
+
+    def test_client_reads_engine_reports(self):
+        from src.engine_process import EngineClient, EngineHost
+        engine = MagicMock()
+        engine.hook_stats.return_value = {"calls": 12, "overruns": 1, "max_ms": 61.5,
+                                          "recoveries": 0, "connected": True, "dropped": 3, "collapsed": 40,
+                                          "delay_ms": 1.25}
+        ready = threading.Event()
+        host = EngineHost(engine, self.ring, ready)
+        host.gesture("Long Press", "Switch Desktop")
+        self.assertTrue(ready.is_set())
+        ready.clear()
+        host.publish_stats()  # unchanged, not sent again
+        self.assertFalse(ready.is_set())
+
+        with patch('src.engine_process.ActionManager'):
+            client = EngineClient(MagicMock())
+        client.events = self.ring
+        self.assertEqual(client.poll_events(), ["Long Press: Switch Desktop"])
+        self.assertEqual(client.hook_stats(), engine.hook_stats.return_value)
+        self.assertEqual(self.ring.pop_all(), [])
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestSessionAnalysis(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_session(self, name, device, gestures, long_hold=0.8, seed=0):
+        # Taps of ~0.12 s, one in five held ~long_hold; multi-tap gaps of ~0.15 s,
+        # gaps between gestures of 0.6 s or more
+        import json
+        from src.session_analysis import RECORD_DTYPE
+        rng = np.random.default_rng(seed)
+        holds = np.where(rng.random(gestures) < 0.2,
+                         rng.lognormal(np.log(long_hold), 0.2, gestures),
+                         rng.lognormal(np.log(0.12), 0.3, gestures))
+        gaps = np.where(rng.random(gestures) < 0.4,
+                        rng.lognormal(np.log(0.15), 0.3, gestures),
+                        0.6 + rng.exponential(1.0, gestures))
+        press = np.cumsum(holds + gaps) - holds
+        records = np.empty(gestures * 2, RECORD_DTYPE)
+        records["t"][0::2] = press
+        records["t"][1::2] = press + holds
+        records["button"] = 0
+        records["down"][0::2] = 1
+        records["down"][1::2] = 0
+        path = f"{self.tmp.name}/{name}.bin"
+        header = {"format": 1, "device": device, "user": "tester", "buttons": ["play_pause"]}
+        with open(path, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n" + records.tobytes())
+        return path
+
+    def test_recorder_round_trip(self):
+        from src.session_recorder import SessionRecorder
+        from src.session_analysis import read_session
+        recorder = SessionRecorder(self.tmp.name)
+        recorder.open("Buds A", ["play_pause", "next_track"])
+        recorder.record("next_track", True, 10.0)
+        recorder.record("next_track", False, 10.25)
+        recorder.close()
+
+        header, records = read_session(recorder.path)
+        self.assertEqual(header["device"], "Buds A")
+        self.assertEqual(records["button"].tolist(), [1, 1])
+        self.assertEqual(records["down"].tolist(), [1, 0])
+        self.assertEqual(records["t"].tolist(), [10.0, 10.25])
+
+    def test_recommends_timing_per_device(self):
+        from src.session_analysis import load_sessions, analyze
+        paths = [self.write_session("a", "Buds A", 5000, long_hold=0.8, seed=1),
+                 self.write_session("b", "Buds B", 5000, long_hold=0.5, seed=2)]
+        result = analyze(*load_sessions(paths))
+
+        a, b = result["timing"]["Buds A"], result["timing"]["Buds B"]
+        self.assertTrue(0.2 <= a["long_press_threshold"] <= 0.5)
+        self.assertTrue(0.2 <= b["long_press_threshold"] <= 0.35)
+        self.assertTrue(0.25 <= a["multi_tap_window"] <= 0.6)
+        report = result["report"]["Buds A"]["tester"]
+        self.assertLess(report["long_press_error"], 0.02)
+        self.assertLess(report["multi_tap_error"], 0.05)
+
+    def test_threshold_weighs_overlapping_populations(self):
+        from src.session_analysis import recommend
+        # Mostly taps around 0.15s, a few holds around 0.45s, overlapping: the
+        # best threshold sits past the geometric midpoint (0.26s), towards
+        # the rarer holds, and still misclassifies some presses
+        rng = np.random.default_rng(3)
+        n = 20000
+        holds = np.where(rng.random(n) < 0.9, rng.lognormal(np.log(0.15), 0.35, n),
+                         rng.lognormal(np.log(0.45), 0.35, n))
+        threshold, error = recommend(holds, 0.05, 1.0)
+
+        self.assertTrue(0.3 <= threshold <= 0.36, threshold)
+        self.assertTrue(0.02 < error < 0.06, error)
+
+    def test_millions_of_events_in_seconds(self):
+        from src.session_analysis import load_sessions, analyze
+        paths = [self.write_session(f"s{i}", f"Buds {i % 2}", 250000, seed=i) for i in range(4)]
+        start = time.perf_counter()
+        result = analyze(*load_sessions(paths))
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(set(result["timing"]), {"Buds 0", "Buds 1"})
+
+class TestLogPipeline(unittest.TestCase):
+    def setUp(self):
+        import logging
+        import tempfile
+        from src.log_setup import LogPipeline
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = f"{self.tmp.name}/debug.log"
+        self.root_level = logging.getLogger().level
+        self.pipeline = LogPipeline(self.path, logging.INFO, max_bytes=2000, backup_count=2)
+        self.pipeline.start()
+        # Only the pipeline's handler, so pytest's capture doesn't format records here
+        self.logger = logging.getLogger("test.pipeline")
+        self.logger.propagate = False
+        self.logger.addHandler(self.pipeline.handler)
+
+    def tearDown(self):
+        import logging
+        self.logger.removeHandler(self.pipeline.handler)
+        self.logger.propagate = True
+        self.pipeline.stop()
+        logging.getLogger().setLevel(self.root_level)
+        self.tmp.cleanup()
+
+    def test_records_reach_the_file(self):
+        self.logger.info("Detected: %s", "Single Tap")
+        self.pipeline.stop()
+        with open(self.path, encoding="utf-8") as f:
+            self.assertIn("Detected: Single Tap", f.read())
+
+    def test_rotation_keeps_files_bounded(self):
+        import os
+        for i in range(500):
+            self.logger.info("Executing action: %d", i)
+        self.pipeline.stop()
+
+        files = sorted(os.listdir(self.tmp.name))
+        self.assertEqual(files, ["debug.log", "debug.log.1", "debug.log.2"])
+        for name in files:
+            self.assertLessEqual(os.path.getsize(f"{self.tmp.name}/{name}"), 2000)
+
+    def test_formatting_happens_off_the_calling_thread(self):
+        threads = []
+
+        class Arg:
+            def __str__(self):
+                threads.append(threading.current_thread().name)
+                return "arg"
+
+        self.logger.debug("skipped %s", Arg())
+        self.logger.info("written %s", Arg())
+        self.pipeline.stop()
+
+        # Disabled levels never format; enabled ones format on the writer thread
+        self.assertEqual(threads, ["LogWriter"])
+
+class TestIdleWakeups(unittest.TestCase):
+    """With nothing happening, no background thread should wake up on a timer."""
+
+    def setUp(self):
+        self.wakeups = []
+        # Timed waits still in progress: thread -> timeout
+        self.armed = {}
+        original_wait = threading.Condition.wait
+        original_sleep = time.sleep
+        wakeups, armed = self.wakeups, self.armed
+
+        def counting_wait(cond, timeout=None):
+            thread = threading.current_thread()
+            if thread is threading.main_thread():
+                return original_wait(cond, timeout)
+            if timeout is not None:
+                armed[thread] = timeout
+            try:
+                return original_wait(cond, timeout)
+            finally:
+                armed.pop(thread, None)
+                wakeups.append(("wait", thread.name, timeout))
+
+        def counting_sleep(seconds):
+            if threading.current_thread() is not threading.main_thread():
+                wakeups.append(("sleep", threading.current_thread().name, seconds))
+            original_sleep(seconds)
+
+        self.patchers = [
+            patch.object(threading.Condition, "wait", counting_wait),
+            patch("time.sleep", counting_sleep),
+            patch("src.bluetooth_manager.DEVICE_CHANGE_SETTLE", 0),
+            patch("src.gesture_engine.BluetoothManager"),
+            patch("src.gesture_engine.ActionManager"),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+
+    def test_idle_controller_does_not_wake(self):
+        import logging
+        import tempfile
+        from src.gesture_engine import GestureEngine, keyboard
+        from src.log_setup import LogPipeline
+        keyboard.key_to_scan_codes.return_value = [164]
+
+        config = MagicMock(spec=ConfigManager)
+        config.get_gesture.return_value = "Play/Pause"
+        config.get_target_device.return_value = "TestDevice"
+        config.get_timing.return_value = None
+        config.get_debounce_window.return_value = 0.025
+        config.get_chords.return_value = {}
+        config.get_mapped_buttons.return_value = []
+        config.has_mappings.return_value = True
+        config.get_option.side_effect = lambda name: DEFAULT_CONFIG["options"].get(name)
+        config.get_repeat_options.return_value = {
+            "enabled": False, "rate": 8.0, "max_rate": 30.0, "acceleration": 15.0
+        }
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pipeline = LogPipeline(f"{tmp}/debug.log", logging.INFO)
+            pipeline.start()
+            engine = GestureEngine(config)
+            engine.usage.directory = tmp
+            engine.bluetooth.is_device_connected.return_value = True
+            engine.notifier.backend = MagicMock()
+            try:
+                engine.start()
+                # Startup: initial connection check, hooks installed
+                deadline = time.monotonic() + 2
+                while not engine.hooked and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertTrue(engine.hooked)
+                time.sleep(0.2)
+
+                del self.wakeups[:]
+                window = 1.5
+                time.sleep(window)
+                idle = list(self.wakeups)
+                armed = {thread.name: timeout for thread, timeout in list(self.armed.items())}
+            finally:
+                engine.stop()
+                pipeline.stop()
+
+        # The hook watchdog's slow liveness probe is the one timer allowed
+        from src.hook_watchdog import IDLE_PROBE_INTERVAL
+        self.assertEqual(armed.get("HookWatchdog"), IDLE_PROBE_INTERVAL)
+        budget = 0.1 + 60 / IDLE_PROBE_INTERVAL
+
+        # Wakeups seen, plus those that timers still pending will cause
+        per_minute = len(idle) * 60 / window + sum(60 / max(t, window) for t in armed.values())
+        self.assertLess(per_minute, budget, f"idle wakeups: {idle}, pending timers: {armed}")
+
 if __name__ == '__main__':
     unittest.main()